@@ -0,0 +1,139 @@
+"""Price-drop alerts.
+
+A watch asks to be told when one platform's price for a product reaches a
+target, given either as a price or as a percent drop from the price when the
+watch was created. Both forms are stored as a single `trigger_price`, and
+`price_watches` is indexed on (product_id, platform, active, trigger_price),
+so evaluating a price change is a range scan over exactly the armed watches
+it fires; the total number of watches does not matter.
+
+Writers that change prices (the refresher, the importer) call `fire_watches`
+with the changed product ids inside their transaction and hand the returned
+notifications to `alert_dispatcher` once it commits. A watch fires once and
+is then disarmed.
+
+Notifications go to a pluggable sink chosen by the ALERT_SINK setting:
+`file:<path>` appends JSON lines (default: instance/alerts.jsonl), `queue`
+keeps them on an in-process queue for a worker to drain.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from queue import Queue
+
+from models import db, PLATFORMS, Product, PriceWatch
+
+logger = logging.getLogger(__name__)
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, notifications):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as fh:
+            for notification in notifications:
+                fh.write(json.dumps(notification) + '\n')
+
+
+class QueueSink:
+    def __init__(self, queue=None):
+        self.queue = queue or Queue()
+
+    def send(self, notifications):
+        for notification in notifications:
+            self.queue.put(notification)
+
+
+def create_sink(spec):
+    if spec == 'queue':
+        return QueueSink()
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    raise ValueError(f'Unknown alert sink: {spec}')
+
+
+class AlertDispatcher:
+    def __init__(self, sink=None):
+        self.sink = sink
+
+    def init_app(self, app):
+        spec = app.config.get('ALERT_SINK') or f"file:{os.path.join(app.instance_path, 'alerts.jsonl')}"
+        if spec.startswith('file:'):
+            os.makedirs(os.path.dirname(os.path.abspath(spec[len('file:'):])), exist_ok=True)
+        self.sink = create_sink(spec)
+        app.extensions['alert_dispatcher'] = self
+
+    def send(self, notifications):
+        if not notifications or self.sink is None:
+            return
+        try:
+            self.sink.send(notifications)
+        except Exception:
+            # Sent from request handlers and the refresher alike; a broken
+            # sink must not fail the write that fired the alerts.
+            logger.exception('Failed sending %d price alerts', len(notifications))
+
+
+alert_dispatcher = AlertDispatcher()
+
+
+def trigger_price(reference_price, target_price=None, drop_percent=None):
+    if target_price is not None:
+        return target_price
+    return round(reference_price * (1 - drop_percent / 100), 2)
+
+
+def fire_watches(connection, product_ids):
+    # product_ids: a list or a select of the products whose prices changed.
+    # Returns the notifications for the watches that fired, now disarmed.
+    watches = PriceWatch.__table__
+    products = Product.__table__
+    now = datetime.utcnow()
+    notifications = []
+
+    for platform in PLATFORMS:
+        price = products.c[f'{platform}_price']
+        rows = connection.execute(
+            db.select(
+                watches.c.id, watches.c.product_id, watches.c.target_price, watches.c.drop_percent,
+                watches.c.reference_price, watches.c.trigger_price, watches.c.contact,
+                products.c.product_name, price
+            )
+            .join_from(watches, products, watches.c.product_id == products.c.id)
+            .where(
+                watches.c.product_id.in_(product_ids),
+                watches.c.platform == platform,
+                watches.c.active == True,
+                watches.c.trigger_price >= price
+            )
+        ).all()
+        notifications.extend(
+            {
+                'watchId': row.id,
+                'productId': row.product_id,
+                'productName': row.product_name,
+                'platform': platform,
+                'price': row[-1],
+                'triggerPrice': row.trigger_price,
+                'targetPrice': row.target_price,
+                'dropPercent': row.drop_percent,
+                'referencePrice': row.reference_price,
+                'contact': row.contact,
+                'triggeredAt': now.isoformat()
+            }
+            for row in rows
+        )
+
+    if notifications:
+        connection.execute(
+            watches.update()
+            .where(watches.c.id == db.bindparam('watch_id'))
+            .values(active=False, triggered_at=now, triggered_price=db.bindparam('fired_price')),
+            [{'watch_id': n['watchId'], 'fired_price': n['price']} for n in notifications]
+        )
+    return notifications
+
@@ -0,0 +1,289 @@
+"""Columnar analytics snapshots of products and price history.
+
+`write_snapshot` copies the catalog and `price_history` out of the database
+into NumPy column files, with history partitioned by month:
+
+  analytics/
+    manifest.json                  category/brand dictionaries, partitions
+    products/{id,category,brand,amazon_price,flipkart_price}.npy
+    history/2025-01/{product_id,recorded_at,amazon_price,flipkart_price}.npy
+
+Arrays are stored uncompressed so `Snapshot` can memory-map them: a query
+touches only the columns and months it needs and never opens the database.
+Runs are incremental: months before the newest partition are immutable
+(raw history only grows, and compaction removing old rows from the database
+should not remove them from the archive), so each run rewrites the newest
+partition and appends later ones.
+
+`Snapshot` computes per-category statistics with vectorized grouping:
+average discount from the observed peak price, platform win rate and price
+volatility.
+
+  python analytics.py snapshot            # e.g. nightly after the refresh
+  python analytics.py report --since 2025-01
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from models import db, Product, PriceHistory
+from history import EPOCH, ONE_SECOND
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'analytics')
+
+PRODUCT_COLUMNS = ('id', 'category', 'brand', 'amazon_price', 'flipkart_price')
+HISTORY_COLUMNS = ('product_id', 'recorded_at', 'amazon_price', 'flipkart_price')
+HISTORY_DTYPES = {'product_id': np.int64, 'recorded_at': np.int64, 'amazon_price': np.float64, 'flipkart_price': np.float64}
+
+CHUNK_SIZE = 50000
+
+
+def month_start(key):
+    year, month = key.split('-')
+    return datetime(int(year), int(month), 1)
+
+
+def load_manifest(path):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return {'months': {}}
+    with open(manifest_path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def save_columns(directory, columns):
+    # Written next to the target and swapped in, so readers never see a
+    # partition with some columns missing.
+    tmp_dir = f'{directory}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), values)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def write_products(connection, path):
+    products = Product.__table__
+    rows = connection.execute(
+        db.select(
+            products.c.id, products.c.category, db.func.coalesce(products.c.brand, ''),
+            products.c.amazon_price, products.c.flipkart_price
+        ).order_by(products.c.id)
+    ).all()
+    ids, categories, brands, amazon, flipkart = zip(*rows) if rows else ((),) * 5
+    category_names, category_codes = np.unique(np.array(categories, dtype=object).astype(str), return_inverse=True)
+    brand_names, brand_codes = np.unique(np.array(brands, dtype=object).astype(str), return_inverse=True)
+    save_columns(os.path.join(path, 'products'), {
+        'id': np.array(ids, dtype=np.int64),
+        'category': category_codes.astype(np.int32),
+        'brand': brand_codes.astype(np.int32),
+        'amazon_price': np.array(amazon, dtype=np.float64),
+        'flipkart_price': np.array(flipkart, dtype=np.float64),
+    })
+    return category_names.tolist(), brand_names.tolist(), len(ids)
+
+
+def write_history(connection, path, since=None):
+    # Streams history in recorded_at order and writes one partition per month.
+    history = PriceHistory.__table__
+    query = (
+        db.select(history.c.product_id, history.c.recorded_at, history.c.amazon_price, history.c.flipkart_price)
+        .where(history.c.recorded_at.is_not(None))
+        .order_by(history.c.recorded_at, history.c.id)
+    )
+    if since is not None:
+        query = query.where(history.c.recorded_at >= since)
+
+    written = {}
+    month, parts = None, []
+
+    def flush():
+        if parts:
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in HISTORY_COLUMNS}
+            save_columns(os.path.join(path, 'history', month), columns)
+            written[month] = len(columns['product_id'])
+
+    result = connection.execute(query, execution_options={'yield_per': CHUNK_SIZE})
+    for rows in result.partitions():
+        product_ids, stamps, amazon, flipkart = zip(*rows)
+        chunk = {
+            'product_id': np.array(product_ids, dtype=np.int64),
+            'recorded_at': np.array([(stamp - EPOCH) // ONE_SECOND for stamp in stamps], dtype=np.int64),
+            'amazon_price': np.array(amazon, dtype=np.float64),
+            'flipkart_price': np.array(flipkart, dtype=np.float64),
+        }
+        months = np.array([stamp.year * 12 + stamp.month - 1 for stamp in stamps])
+        bounds = [0, *(np.flatnonzero(np.diff(months)) + 1), len(rows)]
+        for start, end in zip(bounds, bounds[1:]):
+            key = f'{months[start] // 12:04d}-{months[start] % 12 + 1:02d}'
+            if key != month:
+                flush()
+                month, parts = key, []
+            parts.append({name: values[start:end] for name, values in chunk.items()})
+    flush()
+    return written
+
+
+def write_snapshot(connection, path=DEFAULT_DIR):
+    os.makedirs(os.path.join(path, 'history'), exist_ok=True)
+    manifest = load_manifest(path)
+    months = manifest.get('months', {})
+    # The newest partition may have been written mid-month; start over from it.
+    since = month_start(max(months)) if months else None
+
+    categories, brands, product_count = write_products(connection, path)
+    written = write_history(connection, path, since)
+    months.update(written)
+
+    manifest = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'categories': categories,
+        'brands': brands,
+        'products': product_count,
+        'months': dict(sorted(months.items())),
+    }
+    tmp_path = os.path.join(path, 'manifest.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(tmp_path, os.path.join(path, 'manifest.json'))
+    return manifest, written
+
+
+class Snapshot:
+    def __init__(self, path=DEFAULT_DIR):
+        self.path = path
+        self.manifest = load_manifest(path)
+        self.categories = self.manifest.get('categories', [])
+        self.products = {
+            name: np.load(os.path.join(path, 'products', f'{name}.npy'), mmap_mode='r')
+            for name in PRODUCT_COLUMNS
+        }
+
+    def months(self, since=None, until=None):
+        return [
+            month for month in self.manifest.get('months', {})
+            if (since is None or month >= since) and (until is None or month <= until)
+        ]
+
+    def history(self, since=None, until=None, columns=HISTORY_COLUMNS):
+        parts = {name: [] for name in columns}
+        for month in self.months(since, until):
+            for name in columns:
+                parts[name].append(np.load(os.path.join(self.path, 'history', month, f'{name}.npy'), mmap_mode='r'))
+        return {
+            name: np.concatenate(arrays) if arrays else np.empty(0, dtype=HISTORY_DTYPES[name])
+            for name, arrays in parts.items()
+        }
+
+    def product_index(self, product_ids):
+        # Positions of history product ids in the product columns; rows of
+        # products deleted since are masked out.
+        ids = self.products['id']
+        index = np.searchsorted(ids, product_ids)
+        index = np.minimum(index, max(len(ids) - 1, 0))
+        valid = (ids[index] == product_ids) if len(ids) else np.zeros(len(product_ids), dtype=bool)
+        return index[valid], valid
+
+    def by_category(self, values, codes):
+        sums = np.bincount(codes, weights=values, minlength=len(self.categories))
+        counts = np.bincount(codes, minlength=len(self.categories))
+        return {
+            category: float(sums[code] / counts[code])
+            for code, category in enumerate(self.categories) if counts[code]
+        }
+
+    def average_discount(self, since=None, until=None):
+        # Per product: how far its current best price sits below the highest
+        # price either platform asked in the period, averaged per category.
+        history = self.history(since, until)
+        index, valid = self.product_index(history['product_id'])
+        peak = np.zeros(len(self.products['id']))
+        np.maximum.at(peak, index, np.maximum(history['amazon_price'], history['flipkart_price'])[valid])
+        best = np.minimum(self.products['amazon_price'], self.products['flipkart_price'])
+        seen = peak > 0
+        discount = 1 - best[seen] / peak[seen]
+        return self.by_category(np.clip(discount, 0, None) * 100, self.products['category'][seen])
+
+    def platform_win_rate(self, since=None, until=None):
+        # Share of snapshots in which each platform was strictly cheaper.
+        history = self.history(since, until)
+        index, valid = self.product_index(history['product_id'])
+        codes = self.products['category'][index]
+        amazon = history['amazon_price'][valid]
+        flipkart = history['flipkart_price'][valid]
+        size = len(self.categories)
+        totals = np.bincount(codes, minlength=size)
+        amazon_wins = np.bincount(codes, weights=amazon < flipkart, minlength=size)
+        flipkart_wins = np.bincount(codes, weights=flipkart < amazon, minlength=size)
+        return {
+            category: {
+                'amazon': float(amazon_wins[code] / totals[code]),
+                'flipkart': float(flipkart_wins[code] / totals[code]),
+                'tie': float(1 - (amazon_wins[code] + flipkart_wins[code]) / totals[code]),
+            }
+            for code, category in enumerate(self.categories) if totals[code]
+        }
+
+    def volatility(self, since=None, until=None):
+        # Coefficient of variation of each product's best price over the
+        # period (std / mean, in percent), averaged per category.
+        history = self.history(since, until)
+        index, valid = self.product_index(history['product_id'])
+        best = np.minimum(history['amazon_price'], history['flipkart_price'])[valid]
+        size = len(self.products['id'])
+        counts = np.bincount(index, minlength=size)
+        sums = np.bincount(index, weights=best, minlength=size)
+        squares = np.bincount(index, weights=best * best, minlength=size)
+        enough = counts >= 2
+        mean = sums[enough] / counts[enough]
+        variance = np.maximum(squares[enough] / counts[enough] - mean * mean, 0)
+        cv = np.sqrt(variance) / mean * 100
+        return self.by_category(cv, self.products['category'][enough])
+
+
+def print_report(snapshot, since=None, until=None):
+    months = snapshot.months(since, until)
+    print(f"📊 Snapshot {snapshot.manifest.get('generated_at')}: {snapshot.manifest.get('products', 0)} products, "
+          f"{sum(snapshot.manifest['months'][month] for month in months)} history rows in {len(months)} months")
+    discount = snapshot.average_discount(since, until)
+    wins = snapshot.platform_win_rate(since, until)
+    volatility = snapshot.volatility(since, until)
+    print(f"{'Category':<20} {'Avg discount':>12} {'Amazon wins':>12} {'Flipkart wins':>14} {'Volatility':>11}")
+    for category in snapshot.categories:
+        win = wins.get(category, {})
+        print(f"{category:<20} {discount.get(category, 0):>11.1f}% {win.get('amazon', 0) * 100:>11.1f}% "
+              f"{win.get('flipkart', 0) * 100:>13.1f}% {volatility.get(category, 0):>10.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write or query columnar analytics snapshots')
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot = commands.add_parser('snapshot', help='Copy products and price history into the snapshot')
+    report = commands.add_parser('report', help='Print per-category statistics from the snapshot')
+    report.add_argument('--since', help='First month, YYYY-MM')
+    report.add_argument('--until', help='Last month, YYYY-MM')
+    for command in (snapshot, report):
+        command.add_argument('--dir', default=os.environ.get('ANALYTICS_DIR', DEFAULT_DIR))
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        print_report(Snapshot(args.dir), args.since, args.until)
+        return
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as connection:
+            manifest, written = write_snapshot(connection, args.dir)
+    print(f"✅ Snapshot written to {args.dir}: {manifest['products']} products, "
+          f"{sum(written.values())} history rows rewritten in {len(written)} month partitions")
+
+
+if __name__ == '__main__':
+    main()
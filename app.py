@@ -1,19 +1,33 @@
 from flask import Flask, render_template
 from flask_cors import CORS
-import os
+from config import get_config
+from database import configure_database, install_sqlite_pragmas
 from models import db
+from migrations import LATEST_VERSION, current_version
+from cache import response_cache
+from alerts import alert_dispatcher
+from serialization import FastJSONProvider
 
-def create_app():
+def create_app(config_name=None, overrides=None):
     app = Flask(__name__)
-    app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///pricepulse.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.from_object(get_config(config_name))
+    app.config.update(overrides or {})
+    app.json = FastJSONProvider(app)
     
+    configure_database(app)
     db.init_app(app)
-    CORS(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count', 'ETag'])
+    response_cache.init_app(app)
+    alert_dispatcher.init_app(app)
     
     with app.app_context():
-        db.create_all()
+        install_sqlite_pragmas(app, db)
+        # Schema changes are a deploy step (python migrations.py), not a startup one.
+        version = current_version(db.engine)
+        if version < LATEST_VERSION:
+            app.logger.warning(
+                'Database schema is at version %s, latest is %s: run python migrations.py', version, LATEST_VERSION
+            )
     
     from routes import register_routes
     register_routes(app)
@@ -26,4 +40,4 @@ def create_app():
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
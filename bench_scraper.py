@@ -0,0 +1,121 @@
+"""Offline benchmark for the scraping engine.
+
+Serves synthetic Amazon/Flipkart product pages from a local HTTP server (with
+an artificial per-request latency) and times a batch of price lookups, so
+pool sizes and concurrency limits can be tuned without touching the real
+sites. Two loopback hostnames stand in for the two marketplaces so the
+per-host limits apply.
+
+  python bench_scraper.py --products 200 --latency 0.2 --workers 8
+  python bench_scraper.py --mode selenium --products 20
+  python bench_scraper.py --passes 2 --cache-ttl 0    # second pass revalidates (304)
+
+The tiered mode (default) exercises the static HTML fast path and only
+needs the network stack; selenium mode skips it and needs Chrome. Static
+fetches go through a throwaway HTTP cache; the fixture pages carry ETags, so
+repeated passes show cache hits or, once stale, 304 revalidations.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_cache import HTTPCache
+from scraper import PriceComparisonScraper, tier_stats
+
+AMAZON_PAGE = """<html><body><div id="ppd">
+<span class="a-price"><span class="a-offscreen">&#8377;{price:,}</span><span class="a-price-whole">{price:,}</span></span>
+</div></body></html>"""
+
+FLIPKART_PAGE = """<html><body><div class="_1YokD2">
+<div class="_30jeq3 _16Jk6d">&#8377;{price:,}</div>
+</div></body></html>"""
+
+
+def fixture_price(path):
+    return 1000 + sum(path.encode()) % 50000
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        etag = f'"{fixture_price(self.path)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        template = AMAZON_PAGE if self.path.startswith('/amazon/') else FLIPKART_PAGE
+        body = template.format(price=fixture_price(self.path)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(latency):
+    FixtureHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_scraper(pairs, args, cache):
+    with PriceComparisonScraper(
+        pool_size=args.pool_size,
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        static_first=args.mode == 'tiered',
+        cache=cache
+    ) as scraper:
+        return scraper.get_price_comparisons(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraping engine against a local fixture server')
+    parser.add_argument('--mode', choices=['tiered', 'selenium'], default='tiered',
+                        help='tiered tries the static HTML fast path before Selenium')
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.1, help='Artificial server latency per request (seconds)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--per-host', type=int, default=4)
+    parser.add_argument('--passes', type=int, default=1, help='Times the batch is fetched (default 1)')
+    parser.add_argument('--cache-ttl', type=int, default=900, help='HTTP cache TTL in seconds, 0 to always revalidate')
+    args = parser.parse_args()
+
+    server = start_fixture_server(args.latency)
+    port = server.server_address[1]
+    pairs = [
+        (f'http://127.0.0.1:{port}/amazon/{i}', f'http://localhost:{port}/flipkart/{i}')
+        for i in range(args.products)
+    ]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = HTTPCache(path=os.path.join(cache_dir, 'http_cache.sqlite'), ttl=args.cache_ttl)
+        for run in range(1, args.passes + 1):
+            started = time.perf_counter()
+            results = run_scraper(pairs, args, cache)
+            elapsed = time.perf_counter() - started
+
+            found = sum(1 for r in results for v in r.values() if v is not None)
+            print(f"pass={run} mode={args.mode} products={len(pairs)} fetches={len(pairs) * 2} prices_found={found}")
+            print(f"elapsed={elapsed:.2f}s  {len(pairs) / elapsed:.1f} products/s  {len(pairs) * 2 / elapsed:.1f} fetches/s")
+        cache.close()
+    server.shutdown()
+
+    print(tier_stats.report())
+    print(cache.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Brand recognition in product titles.
+
+The brand dictionary is a data table (data/brands.csv, or the file named by
+BRANDS_FILE) mapping each alias to its canonical brand, e.g. `Moto` to
+Motorola or `MacBook` to Apple. `BrandMatcher` compiles the aliases once
+into a trie keyed on words, so matching a title costs a few dict lookups
+per word of the title whatever the size of the dictionary. Matching is
+case-insensitive and on whole words only ("vivo" does not match
+"VivoBook"); when several aliases match, the leftmost wins and, at the same
+position, the longest ("Boult Audio" over "Boult"). Aliases that are also
+common words ("Nothing", "Noise", "Honor") are flagged `leading` in the
+table and only match at the start of a title, so "Something Nothing Case"
+has no brand while "Nothing Phone 2a" is Nothing.
+
+  brand_matcher().find('Moto G85 5G')            # 'Motorola'
+  brand_matcher().find_all(titles)               # one brand (or None) per title
+"""
+import csv
+import os
+import re
+from functools import lru_cache
+
+BRANDS_FILE = os.environ.get(
+    'BRANDS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'brands.csv')
+)
+
+WORD = re.compile(r'\w+')
+# Trie end marker of leading-only aliases; never a word, since words are \w+.
+LEADING = '^'
+
+
+def load_brand_table(path=BRANDS_FILE):
+    # (alias -> canonical brand, aliases that only match at the start of a title)
+    aliases, leading = {}, set()
+    with open(path, 'r', encoding='utf-8', newline='') as fh:
+        for row in csv.DictReader(fh):
+            alias, brand = (row.get('alias') or '').strip(), (row.get('brand') or '').strip()
+            if alias and brand:
+                aliases[alias] = brand
+                if (row.get('leading') or '').strip().lower() in ('yes', 'true', '1'):
+                    leading.add(alias)
+    return aliases, leading
+
+
+def words(text):
+    return WORD.findall(text.casefold())
+
+
+class BrandMatcher:
+    def __init__(self, aliases, leading=()):
+        # A trie over the words of each alias; the key None marks the end of
+        # an alias and holds its canonical brand. Aliases in `leading` end in
+        # the key LEADING instead, which is only read for a title's first word.
+        self.root = {}
+        for alias, brand in aliases.items():
+            node = self.root
+            for word in words(alias):
+                node = node.setdefault(word, {})
+            if node is not self.root:
+                node[LEADING if alias in leading else None] = brand
+
+    def find(self, title):
+        # The canonical brand of the leftmost, then longest, alias in `title`.
+        return self.find_words(words(title)) if title else None
+
+    def find_words(self, tokens):
+        # As `find`, for a title already split by `words`.
+        root = self.root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            found = None
+            position = start
+            while node is not None:
+                found = node.get(None, found)
+                if start == 0:
+                    found = node.get(LEADING, found)
+                position += 1
+                if position == len(tokens):
+                    break
+                node = node.get(tokens[position])
+            if found is not None:
+                return found
+        return None
+
+    def find_all(self, titles):
+        return [self.find(title) for title in titles]
+
+
+@lru_cache(maxsize=None)
+def brand_matcher(path=BRANDS_FILE):
+    return BrandMatcher(*load_brand_table(path))
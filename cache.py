@@ -0,0 +1,118 @@
+"""In-process response cache for the read-only catalog endpoints.
+
+Entries are keyed on the request path plus normalized query arguments and
+tagged with the catalog version they were rendered at, so a bump of the
+version (any write to products) makes every older entry a miss. Eviction is
+LRU under both an entry count and a byte budget. The same version/key pair
+doubles as the ETag, letting browsers revalidate with a 304 and skip the body.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, current_app
+
+from catalog import current_catalog_version
+
+CACHED_HEADERS = ('X-Next-Cursor', 'X-Total-Count')
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=10000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', self.max_bytes)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        app.extensions['response_cache'] = self
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, headers):
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (version, body, headers)
+            self._size += size
+            while self._entries and (self._size > self.max_bytes or len(self._entries) > self.max_entries):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def normalized_cache_key():
+    args = sorted(
+        (name, tuple(sorted(value for value in request.args.getlist(name) if value != '')))
+        for name in request.args
+    )
+    return request.path + '?' + '&'.join(f'{name}={",".join(values)}' for name, values in args if values)
+
+
+def tee_into_cache(chunks, key, version, headers):
+    # Streamed bodies are cached once they have been sent in full.
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    response_cache.put(key, version, b''.join(body), headers)
+
+
+def cached_catalog_response(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = current_catalog_version()
+        key = normalized_cache_key()
+        etag = f'{version}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]}'
+
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            entry = response_cache.get(key, version)
+            if entry is not None:
+                _, body, headers = entry
+                response = current_app.response_class(body, mimetype='application/json', headers=headers)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                if response.is_streamed:
+                    response.response = tee_into_cache(response.response, key, version, headers)
+                else:
+                    response_cache.put(key, version, response.get_data(), headers)
+
+        response.set_etag(etag)
+        # Browsers may keep the body but must revalidate it on every use.
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
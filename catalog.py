@@ -0,0 +1,34 @@
+"""Catalog version counter.
+
+Every write to products bumps `catalog_state.version` inside the writing
+transaction. Anything derived from the catalog (response caches, ETags) keys
+on the version and is invalidated by the bump. ORM flushes bump it
+automatically; Core bulk writers call `bump_catalog_version` themselves.
+"""
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Product, CatalogState
+
+def bump_catalog_version(connection=None):
+    connection = connection or db.session.connection()
+    table = CatalogState.__table__
+    now = datetime.utcnow()
+    result = connection.execute(
+        table.update().where(table.c.id == 1).values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=1, version=1, updated_at=now))
+
+def current_catalog_version():
+    version = db.session.execute(db.select(CatalogState.version).where(CatalogState.id == 1)).scalar()
+    return version or 0
+
+@event.listens_for(Session, 'after_flush')
+def bump_on_product_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product) and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+            bump_catalog_version(session.connection())
+            return
@@ -0,0 +1,82 @@
+"""Structured coupons and effective (post-coupon) prices.
+
+Marketplace coupons arrive as free text, e.g. "10% off on HDFC CC (up to
+₹1000)" or "₹500 off on orders above ₹5,000". `parse_coupon` turns the text
+into a `Coupon` (type, amount, cap, minimum order) once, when the importer or
+an ORM write stores it, and the parts are kept in their own product columns.
+Price writers compute effective prices from those parts, never from the
+text, and store them beside the list prices, so sorting and filtering by
+post-coupon price can use an index. Reward points (SuperCoins) are not money
+off and are ignored.
+"""
+import re
+from typing import NamedTuple, Optional
+
+COUPON_TYPES = ('percent', 'flat')
+COUPON_PARTS = ('type', 'amount', 'cap', 'min_order')
+
+RUPEES = r'(?:₹|rs\.?|inr)\s*([\d,]+(?:\.\d+)?)'
+DISCOUNT_WORDS = r'\s*(?:off|cashback|instant discount|discount)'
+
+PERCENT = re.compile(r'(\d+(?:\.\d+)?)\s*%' + DISCOUNT_WORDS, re.IGNORECASE)
+FLAT = re.compile(RUPEES + DISCOUNT_WORDS, re.IGNORECASE)
+CAP = re.compile(r'(?:up\s*to|max(?:imum)?)\s*' + RUPEES, re.IGNORECASE)
+MIN_ORDER = re.compile(
+    r'(?:min(?:imum)?\.?\s*(?:order|purchase|spend|cart)(?:\s*value)?|orders?|purchases?|spends?)'
+    r'\s*(?:of|above|over|worth|value)?\s*' + RUPEES,
+    re.IGNORECASE
+)
+
+
+class Coupon(NamedTuple):
+    type: str
+    amount: float
+    cap: Optional[float] = None
+    min_order: Optional[float] = None
+
+    def discount(self, price):
+        if price is None or (self.min_order is not None and price < self.min_order):
+            return 0.0
+        if self.type == 'percent':
+            saving = price * self.amount / 100
+            if self.cap is not None:
+                saving = min(saving, self.cap)
+        else:
+            saving = self.amount
+        return round(min(saving, price), 2)
+
+
+def rupees(match):
+    return float(match.group(1).replace(',', '')) if match else None
+
+
+def parse_coupon(text):
+    # Returns a Coupon, or None for empty text and offers with no money off.
+    if not text:
+        return None
+    min_order = rupees(MIN_ORDER.search(text))
+    percent = PERCENT.search(text)
+    if percent:
+        return Coupon('percent', float(percent.group(1)), rupees(CAP.search(text)), min_order)
+    flat = FLAT.search(text)
+    if flat:
+        return Coupon('flat', rupees(flat), None, min_order)
+    return None
+
+
+def coupon_columns(platform, coupon):
+    # Product column values for one platform's parsed coupon.
+    values = coupon if coupon is not None else (None,) * len(COUPON_PARTS)
+    return {f'{platform}_coupon_{part}': value for part, value in zip(COUPON_PARTS, values)}
+
+
+def stored_coupon(values, platform):
+    # The Coupon held in a row's (or mapping's) coupon columns.
+    parts = [values[f'{platform}_coupon_{part}'] for part in COUPON_PARTS]
+    return Coupon(*parts) if parts[0] is not None else None
+
+
+def effective_price(price, coupon):
+    if coupon is None:
+        return price
+    return round(price - coupon.discount(price), 2)
@@ -0,0 +1,80 @@
+"""Engine setup: connection pragmas, pool options and read-replica routing.
+
+SQLite connections get their pragmas on connect: WAL journaling so readers
+are not blocked by the refresher's writes, a busy timeout so writers queue
+instead of failing, and a memory-mapped read window. When READ_REPLICA_URL is
+set, a `replica` bind is created and `RoutingSession` sends the queries of
+GET/HEAD requests to it; everything else (scripts, writes, flushes) uses the
+primary.
+"""
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and request.method in READ_METHODS:
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def engine_options(config, url):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def configure_database(app):
+    # Called before db.init_app: fills in the engine options and binds.
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    if config.get('READ_REPLICA_URL'):
+        config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = {
+            'url': config['READ_REPLICA_URL'],
+            **engine_options(config, config['READ_REPLICA_URL'])
+        }
+
+
+def install_sqlite_pragmas(app, db):
+    # Called in an app context after db.init_app, before the engines connect.
+    config = app.config
+    for key, engine in db.engines.items():
+        if engine.dialect.name != 'sqlite':
+            continue
+        pragmas = [
+            f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+            f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+            f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+            f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        ]
+        if key == REPLICA_BIND:
+            pragmas.append('PRAGMA query_only=ON')
+        event.listen(engine, 'connect', sqlite_pragma_listener(pragmas))
+
+
+def sqlite_pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return set_pragmas
@@ -0,0 +1,253 @@
+"""Deal scores: how good a buy each product is right now.
+
+`recompute_deals` scores the whole catalog in one NumPy batch from four
+signals:
+
+  median   how far the best price sits below its 30-day median
+  low      how far it sits from its 30-day low (positive at a new low)
+  gap      the saving from buying on the cheaper platform
+  coupon   the extra saving coupons give, from the stored effective price
+
+The 30-day figures come from the daily rollups (the median is over daily
+closing best prices), so the cost follows products x days, not snapshots.
+Only the top `DEAL_TOP_K` products per category are stored in `deal_scores`,
+indexed on (category, score), and GET /api/deals reads them back with an
+index scan. The refresher recomputes after every run and the importer after
+every merge; like other Core writers they bump the catalog version
+themselves, so cached responses follow. A rollback, which changes a known
+set of products, calls `rescore_deals` instead: it scores just those and
+merges them into the stored top K, rescoring a whole category only when a
+deal drops out of one that may have more behind it.
+
+  python deals.py            # recompute and print the best deals
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from models import db, Product, PriceRollup, DealScore
+from catalog import bump_catalog_version
+from history import bucket_start
+
+DEAL_WINDOW_DAYS = 30
+DEAL_TOP_K = 100
+
+DEAL_WEIGHTS = {
+    'median': 0.4,
+    'low': 0.2,
+    'gap': 0.2,
+    'coupon': 0.2,
+}
+
+# API fields of a deal; product fields are added through Product.API_FIELDS.
+DEAL_FIELDS = {
+    'dealScore': DealScore.score,
+    'effectivePrice': DealScore.effective_price,
+    'low30d': DealScore.low_30d,
+    'median30d': DealScore.median_30d,
+    'platformGap': DealScore.platform_gap,
+    'couponSavings': DealScore.coupon_savings,
+}
+
+
+def load_catalog(connection, where=None):
+    products = Product.__table__
+    query = db.select(
+        products.c.id, products.c.category, products.c.amazon_price, products.c.flipkart_price,
+        db.func.coalesce(products.c.effective_price, products.c.best_price)
+    ).order_by(products.c.id)
+    if where is not None:
+        query = query.where(where)
+    rows = connection.execute(query).all()
+    ids, categories, amazon, flipkart, effective = zip(*rows) if rows else ((),) * 5
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'category': np.array(categories, dtype=object),
+        'amazon_price': np.array(amazon, dtype=np.float64),
+        'flipkart_price': np.array(flipkart, dtype=np.float64),
+        'effective_price': np.array(effective, dtype=np.float64),
+    }
+
+
+def window_stats(connection, ids, since, where=None):
+    # 30-day low and median of the daily closing best price per product,
+    # aligned with `ids`; NaN where a product has no rollups in the window.
+    rollups = PriceRollup.__table__
+    query = (
+        db.select(rollups.c.product_id, db.func.min(rollups.c.min_price), db.func.min(rollups.c.last_price))
+        .where(rollups.c.resolution == 'day', rollups.c.bucket_start >= since)
+        .group_by(rollups.c.product_id, rollups.c.bucket_start)
+    )
+    if where is not None:
+        query = query.where(rollups.c.product_id.in_(db.select(Product.__table__.c.id).where(where)))
+    rows = connection.execute(query).all()
+    low = np.full(len(ids), np.nan)
+    median = np.full(len(ids), np.nan)
+    if not rows:
+        return low, median
+
+    product_ids, lows, closes = (np.array(column) for column in zip(*rows))
+    order = np.lexsort((closes, product_ids))
+    product_ids, lows, closes = product_ids[order], lows[order], closes[order]
+    starts = np.flatnonzero(np.r_[True, product_ids[1:] != product_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(product_ids)])
+
+    positions = np.minimum(np.searchsorted(ids, product_ids[starts]), max(len(ids) - 1, 0))
+    found = ids[positions] == product_ids[starts] if len(ids) else np.zeros(len(starts), dtype=bool)
+    low[positions[found]] = np.minimum.reduceat(lows, starts)[found]
+    median[positions[found]] = ((closes[starts + (counts - 1) // 2] + closes[starts + counts // 2]) / 2)[found]
+    return low, median
+
+
+def score_catalog(catalog, low, median):
+    amazon, flipkart = catalog['amazon_price'], catalog['flipkart_price']
+    best = np.minimum(amazon, flipkart)
+    effective = np.minimum(catalog['effective_price'], best)
+    seen = ~np.isnan(median)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        signals = {
+            'median': np.where(seen, np.clip((median - best) / median, -1, 1), 0),
+            'low': np.where(seen, np.clip((low - best) / low, -1, 1), 0),
+            'gap': np.abs(amazon - flipkart) / np.maximum(amazon, flipkart),
+            'coupon': np.clip((best - effective) / best, 0, 1),
+        }
+    score = 100 * sum(DEAL_WEIGHTS[name] * np.nan_to_num(values) for name, values in signals.items())
+    return {
+        'score': np.round(score, 2),
+        'effective_price': np.round(effective, 2),
+        'platform_gap': np.round(np.nan_to_num(signals['gap']) * 100, 2),
+        'coupon_savings': np.round(best - effective, 2),
+    }
+
+
+def top_per_category(categories, scores, ids, k):
+    # Positions of the k best scores in each category, ties broken by id.
+    if not len(ids):
+        return np.empty(0, dtype=np.int64)
+    _, codes = np.unique(categories.astype(str), return_inverse=True)
+    order = np.lexsort((ids, -scores, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order[rank < k]
+
+
+def deal_rows(connection, now, where=None):
+    # Deal columns of the products matching `where` (default: all of them),
+    # as arrays in product id order.
+    catalog = load_catalog(connection, where)
+    since = bucket_start(now - timedelta(days=DEAL_WINDOW_DAYS), 'day')
+    low, median = window_stats(connection, catalog['id'], since, where)
+    return {
+        'product_id': catalog['id'],
+        'category': catalog['category'],
+        'low_30d': low,
+        'median_30d': median,
+        **score_catalog(catalog, low, median),
+    }
+
+
+def store_deals(connection, rows, keep, now):
+    columns = {name: values[keep].tolist() for name, values in rows.items()}
+    for name in ('low_30d', 'median_30d'):
+        columns[name] = [None if np.isnan(value) else value for value in columns[name]]
+    if len(keep):
+        connection.execute(DealScore.__table__.insert(), [
+            dict(zip(columns, values), computed_at=now) for values in zip(*columns.values())
+        ])
+
+
+def recompute_deals(connection, top_k=DEAL_TOP_K, now=None, categories=None):
+    # Score the catalog, or just `categories`, and replace their stored deals.
+    now = now or datetime.utcnow()
+    table = DealScore.__table__
+    where = None if categories is None else Product.__table__.c.category.in_(categories)
+    rows = deal_rows(connection, now, where)
+    keep = top_per_category(rows['category'], rows['score'], rows['product_id'], top_k)
+
+    delete = table.delete()
+    if categories is not None:
+        delete = delete.where(table.c.category.in_(categories))
+    connection.execute(delete)
+    store_deals(connection, rows, keep, now)
+    return len(keep)
+
+
+def rescore_deals(connection, product_ids, top_k=DEAL_TOP_K, now=None):
+    # Rescore only `product_ids` (a SELECT of ids whose prices changed, not
+    # their categories) and merge them into the stored top K. Other products
+    # keep their scores, and every unstored one ranks below its category's
+    # old K-th deal; a category whose new K-th deal ranks lower than that
+    # could be missing one of them, so it is rescored in full instead.
+    now = now or datetime.utcnow()
+    table = DealScore.__table__
+    changed = deal_rows(connection, now, Product.__table__.c.id.in_(product_ids))
+    if not len(changed['product_id']):
+        return 0
+
+    affected = sorted(set(changed['category'].tolist()))
+    changed_ids = set(changed['product_id'].tolist())
+    ranks = {category: [] for category in affected}
+    for product_id, category, score in connection.execute(
+        db.select(table.c.product_id, table.c.category, table.c.score).where(table.c.category.in_(affected))
+    ):
+        ranks[category].append((-score, product_id))
+    # The old K-th deal of each category that had K of them.
+    cutoffs = {category: max(rows) for category, rows in ranks.items() if len(rows) >= top_k}
+
+    unchanged = [(key, category) for category, rows in ranks.items() for key in rows if key[1] not in changed_ids]
+    ids = np.r_[np.array([key[1] for key, _ in unchanged], dtype=np.int64), changed['product_id']]
+    categories = np.r_[np.array([category for _, category in unchanged], dtype=object), changed['category']]
+    scores = np.r_[np.array([-key[0] for key, _ in unchanged], dtype=np.float64), changed['score']]
+    kept = np.zeros(len(ids), dtype=bool)
+    kept[top_per_category(categories, scores, ids, top_k)] = True
+
+    full = [
+        category for category, cutoff in cutoffs.items()
+        if max(zip(-scores[kept & (categories == category)], ids[kept & (categories == category)])) > cutoff
+    ]
+    merged = kept | np.isin(categories, full)
+    dropped = ids[:len(unchanged)][~merged[:len(unchanged)]]
+    connection.execute(table.delete().where(table.c.product_id.in_(product_ids)))
+    if len(dropped):
+        connection.execute(table.delete().where(table.c.product_id.in_(dropped.tolist())))
+    store_deals(connection, changed, np.flatnonzero((kept & ~np.isin(categories, full))[len(unchanged):]), now)
+    if full:
+        recompute_deals(connection, top_k, now, full)
+    return len(changed_ids)
+
+
+def top_deals(fields, category=None, limit=20):
+    query = (
+        db.select(*fields, *DEAL_FIELDS.values())
+        .join_from(DealScore, Product, DealScore.product_id == Product.id)
+        .order_by(DealScore.score.desc(), DealScore.product_id)
+        .limit(limit)
+    )
+    if category:
+        query = query.where(DealScore.category == category)
+    return db.session.execute(query).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute deal scores for the whole catalog')
+    parser.add_argument('--top-k', type=int, default=DEAL_TOP_K, help=f'Deals kept per category (default {DEAL_TOP_K})')
+    parser.add_argument('--show', type=int, default=10, help='Best deals to print (default 10)')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        stored = recompute_deals(db.session.connection(), args.top_k)
+        bump_catalog_version()
+        db.session.commit()
+        print(f"✅ Scored the catalog, kept {stored} deals")
+        for row in top_deals([Product.id, Product.product_name, Product.best_price], limit=args.show):
+            print(f"   {row.score:>6.1f}  ₹{row.best_price:<10,.0f} {row.product_name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Streaming export of products and price history as NDJSON or CSV.
+
+Rows are read with `yield_per` (a server-side cursor on PostgreSQL) and
+encoded a chunk at a time, so memory stays flat however many rows are
+exported. Products are filtered exactly like GET /api/products; history
+rows follow the same product filters plus an optional recorded_at range.
+
+  GET /api/export?format=csv&type=products&category=Phones
+  GET /api/export?format=ndjson&type=history&from=2025-01-01
+
+  python export.py products --format csv --category Phones -o phones.csv
+  python export.py history --format ndjson --from 2025-01-01 > history.ndjson
+"""
+import argparse
+import csv
+import io
+import sys
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from models import db, Product, PriceHistory
+from query_args import parse_fields, parse_timestamp, product_filters
+from serialization import product_columns
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_TYPES = ('products', 'history')
+
+CHUNK_SIZE = 1000
+
+HISTORY_FIELDS = {
+    'id': PriceHistory.id,
+    'productId': PriceHistory.product_id,
+    'amazonPrice': PriceHistory.amazon_price,
+    'flipkartPrice': PriceHistory.flipkart_price,
+    'recordedAt': PriceHistory.recorded_at,
+    'source': PriceHistory.source,
+}
+
+
+def export_query(export_type, args, fields=None):
+    # Returns (field names, select) for an export; `args` are request-style
+    # arguments holding the product filters and, for history, from/to.
+    filters = list(product_filters(args).values())
+    if export_type == 'products':
+        fields = parse_fields(fields)
+        query = db.select(*product_columns(fields)).where(*filters).order_by(Product.id)
+        return fields, query
+
+    fields = list(HISTORY_FIELDS)
+    query = db.select(*HISTORY_FIELDS.values()).order_by(PriceHistory.id)
+    if filters:
+        query = query.where(PriceHistory.product_id.in_(db.select(Product.id).where(*filters)))
+    start = parse_timestamp(args.get('from'), 'from')
+    end = parse_timestamp(args.get('to'), 'to')
+    if start is not None:
+        query = query.where(PriceHistory.recorded_at >= start)
+    if end is not None:
+        query = query.where(PriceHistory.recorded_at <= end)
+    return fields, query
+
+
+def stream_rows(query):
+    result = db.session.execute(query, execution_options={'yield_per': CHUNK_SIZE})
+    yield from result.partitions()
+
+
+def encode_ndjson(fields, chunks, dump):
+    for rows in chunks:
+        yield b''.join(dump(dict(zip(fields, row))) + b'\n' for row in rows)
+
+
+def encode_csv(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in chunks:
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def export_chunks(export_format, fields, query):
+    chunks = stream_rows(query)
+    if export_format == 'csv':
+        return encode_csv(fields, chunks)
+    return encode_ndjson(fields, chunks, current_app.json.dump_bytes)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Export products or price history as NDJSON or CSV')
+    p.add_argument('type', choices=EXPORT_TYPES)
+    p.add_argument('--format', choices=list(FORMATS), default='ndjson')
+    p.add_argument('-o', '--output', help='Output file (default: stdout)')
+    p.add_argument('--fields', default='', help='Comma-separated API fields for products (default: all)')
+    p.add_argument('--category')
+    p.add_argument('--brand', action='append', dest='brands', default=[], help='Repeat for several brands')
+    p.add_argument('--search')
+    p.add_argument('--min-price', type=float)
+    p.add_argument('--max-price', type=float)
+    p.add_argument('--from', dest='start', help='History recorded at or after (ISO timestamp)')
+    p.add_argument('--to', dest='end', help='History recorded at or before (ISO timestamp)')
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    filters = MultiDict([
+        (name, value) for name, value in (
+            ('category', args.category), ('search', args.search),
+            ('min_price', args.min_price), ('max_price', args.max_price),
+            ('from', args.start), ('to', args.end),
+        ) if value is not None
+    ] + [('brands', brand) for brand in args.brands])
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        fields, query = export_query(args.type, filters, args.fields)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(args.format, fields, query):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Materialized facet counts for the catalog filters.
+
+`facet_counts` holds the number of products per (category, brand, price
+bucket), where the bucket is taken from the product's best price. Writers
+keep it current with deltas: ORM flushes through an after_flush hook, the
+importer, the price refresher and snapshot rollbacks explicitly. Facet requests then sum over
+this small table instead of scanning products.
+"""
+from bisect import bisect_right
+from collections import Counter
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Product, FacetCount
+
+# Lower bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = [0, 1000, 2000, 5000, 10000, 20000, 50000, 100000]
+
+FACET_COLUMNS = ('category', 'brand', 'amazon_price', 'flipkart_price')
+
+def price_bucket(amazon_price, flipkart_price):
+    best_price = min(amazon_price, flipkart_price)
+    return PRICE_BUCKETS[max(bisect_right(PRICE_BUCKETS, best_price) - 1, 0)]
+
+def bucket_upper(bucket):
+    index = PRICE_BUCKETS.index(bucket)
+    return PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None
+
+def facet_key(category, brand, amazon_price, flipkart_price):
+    return (category, brand or '', price_bucket(amazon_price, flipkart_price))
+
+def price_bucket_expr(best_price):
+    return db.case(
+        *[(best_price >= lower, lower) for lower in reversed(PRICE_BUCKETS[1:])],
+        else_=PRICE_BUCKETS[0]
+    )
+
+def bucket_expr(products):
+    return price_bucket_expr(products.c.best_price)
+
+def grouped_counts(connection, where):
+    # (category, brand, bucket) -> count for the products matching `where`.
+    products = Product.__table__
+    bucket = bucket_expr(products)
+    brand = db.func.coalesce(products.c.brand, '')
+    rows = connection.execute(
+        db.select(products.c.category, brand, bucket, db.func.count())
+        .where(where)
+        .group_by(products.c.category, brand, bucket)
+    )
+    return Counter({(category, brand, bucket): count for category, brand, bucket, count in rows})
+
+def apply_facet_deltas(connection, deltas):
+    table = FacetCount.__table__
+    for (category, brand, bucket), delta in deltas.items():
+        if not delta:
+            continue
+        key = (table.c.category == category) & (table.c.brand == brand) & (table.c.price_bucket == bucket)
+        result = connection.execute(
+            table.update().where(key).values(product_count=table.c.product_count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                category=category, brand=brand, price_bucket=bucket, product_count=delta
+            ))
+    connection.execute(table.delete().where(table.c.product_count <= 0))
+
+def repricing_deltas(connection, prices):
+    # Deltas for moving products to new prices, read in one pass before the
+    # write: `prices` has product_id and best_price columns. Only the
+    # products that change bucket count.
+    products = Product.__table__
+    brand = db.func.coalesce(products.c.brand, '')
+    old_bucket = bucket_expr(products)
+    new_bucket = price_bucket_expr(prices.c.best_price)
+    rows = connection.execute(
+        db.select(products.c.category, brand, old_bucket, new_bucket, db.func.count())
+        .join_from(products, prices, products.c.id == prices.c.product_id)
+        .where(old_bucket != new_bucket)
+        .group_by(products.c.category, brand, old_bucket, new_bucket)
+    )
+    deltas = Counter()
+    for category, brand, old, new, count in rows:
+        deltas[(category, brand, old)] -= count
+        deltas[(category, brand, new)] += count
+    return deltas
+
+def rebuild_facets(connection):
+    connection.execute(FacetCount.__table__.delete())
+    apply_facet_deltas(connection, grouped_counts(connection, db.true()))
+
+def product_change_deltas(changes):
+    # changes: iterable of (old_values, new_values) dicts keyed by FACET_COLUMNS;
+    # either side may be None for inserts and deletes.
+    deltas = Counter()
+    for old, new in changes:
+        if old is not None:
+            deltas[facet_key(*(old[column] for column in FACET_COLUMNS))] -= 1
+        if new is not None:
+            deltas[facet_key(*(new[column] for column in FACET_COLUMNS))] += 1
+    return deltas
+
+def committed_values(obj):
+    state = inspect(obj)
+    values = {}
+    for column in FACET_COLUMNS:
+        history = state.attrs[column].history
+        if history.deleted:
+            values[column] = history.deleted[0]
+        elif history.unchanged:
+            values[column] = history.unchanged[0]
+        else:
+            values[column] = getattr(obj, column)
+    return values
+
+def current_values(obj):
+    return {column: getattr(obj, column) for column in FACET_COLUMNS}
+
+@event.listens_for(Session, 'after_flush')
+def update_facets_on_flush(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Product):
+            changes.append((None, current_values(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            changes.append((committed_values(obj), None))
+    for obj in session.dirty:
+        if isinstance(obj, Product) and obj not in session.deleted:
+            old = committed_values(obj)
+            new = current_values(obj)
+            if old != new:
+                changes.append((old, new))
+    
+    if changes:
+        apply_facet_deltas(session.connection(), product_change_deltas(changes))
+
+def facet_filter(category=None, brands=None, min_bucket=None, skip=None):
+    table = FacetCount.__table__
+    conditions = []
+    if category and skip != 'category':
+        conditions.append(table.c.category == category)
+    if brands and skip != 'brand':
+        conditions.append(table.c.brand.in_(brands))
+    if min_bucket is not None and skip != 'price':
+        conditions.append(table.c.price_bucket >= min_bucket)
+    return db.and_(db.true(), *conditions)
+
+def aggregates_cover(min_price, max_price):
+    # Price filters can be answered from the aggregates only when the lower
+    # bound falls on a bucket boundary; otherwise the caller falls back to a
+    # live count. `max_price` is inclusive, like the listing's, and a product
+    # priced exactly at a boundary sits in the bucket above it, so an upper
+    # bound always needs a live count.
+    return max_price is None and (min_price is None or min_price in PRICE_BUCKETS)
+
+def facet_counts(category=None, brands=None, min_price=None, max_price=None):
+    if not aggregates_cover(min_price, max_price):
+        return None
+    
+    table = FacetCount.__table__
+    total = db.func.sum(table.c.product_count)
+    
+    def counts(column, skip):
+        rows = db.session.execute(
+            db.select(column, total)
+            .where(facet_filter(category, brands, min_price, skip))
+            .group_by(column)
+            .having(total > 0)
+        )
+        return {value: count for value, count in rows}
+    
+    return {
+        'categories': counts(table.c.category, 'category'),
+        'brands': counts(table.c.brand, 'brand'),
+        'prices': counts(table.c.price_bucket, 'price')
+    }
+
+def live_facet_counts(filters):
+    # Exact counts straight from products, for filter sets the aggregates
+    # cannot answer (free-text search, unaligned price bounds, effective
+    # price bounds). `filters` maps 'category', 'brands', 'price',
+    # 'effective_price' and 'search' to filter clauses.
+    connection = db.session.connection()
+    result = {}
+    for position, (name, own_filter) in enumerate((('categories', 'category'), ('brands', 'brands'), ('prices', 'price'))):
+        clauses = [clause for key, clause in filters.items() if key != own_filter]
+        merged = Counter()
+        for key, count in grouped_counts(connection, db.and_(db.true(), *clauses)).items():
+            merged[key[position]] += count
+        result[name] = dict(merged)
+    return result
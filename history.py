@@ -0,0 +1,252 @@
+"""Price history storage: raw snapshots plus hourly and daily rollups.
+
+Every write to `price_history` also folds the new samples into
+`price_rollups`, one row per (product, resolution, platform, bucket) holding
+min, max and last price and the sample count. Charts read the rollups, whose
+primary key is ordered for a per-product range scan, so their cost follows
+the number of buckets shown rather than the number of snapshots stored.
+Raw rows older than the retention window are deleted by `compact_history`;
+the rollups already cover them. Daily rollups are kept for good, hourly
+ones for a configurable period. `price_series` serves chart data from the
+finest rollup that covers the range, downsampled with numpy to a point budget.
+
+Writers: the refresher and the importer call `record_price_history` /
+`rollup_history` themselves, ORM inserts are rolled up by an after_flush hook.
+
+  python history.py compact --retention-days 90 --hourly-retention-days 365
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, PLATFORMS, PriceHistory, PriceRollup, dialect_insert
+from catalog import bump_catalog_version
+
+RESOLUTIONS = ('hour', 'day')
+
+RAW_RETENTION_DAYS = 90
+HOURLY_RETENTION_DAYS = 365
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+DEFAULT_CHART_POINTS = 500
+MAX_CHART_POINTS = 5000
+
+ROLLUP_FLUSH_KEYS = 5000
+
+def bucket_start(recorded_at, resolution):
+    hour = recorded_at.replace(minute=0, second=0, microsecond=0)
+    return hour if resolution == 'hour' else hour.replace(hour=0)
+
+def fold_samples(rollups, samples):
+    # samples: (product_id, amazon_price, flipkart_price, recorded_at) tuples.
+    for product_id, amazon_price, flipkart_price, recorded_at in samples:
+        for platform, price in zip(PLATFORMS, (amazon_price, flipkart_price)):
+            for resolution in RESOLUTIONS:
+                key = (product_id, platform, resolution, bucket_start(recorded_at, resolution))
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollups[key] = {
+                        'product_id': product_id, 'platform': platform,
+                        'resolution': resolution, 'bucket_start': key[3],
+                        'min_price': price, 'max_price': price,
+                        'last_price': price, 'last_at': recorded_at, 'sample_count': 1
+                    }
+                    continue
+                rollup['min_price'] = min(rollup['min_price'], price)
+                rollup['max_price'] = max(rollup['max_price'], price)
+                if recorded_at >= rollup['last_at']:
+                    rollup['last_price'] = price
+                    rollup['last_at'] = recorded_at
+                rollup['sample_count'] += 1
+    return rollups
+
+def absorb_rollups(stmt):
+    # ON CONFLICT clause for an INSERT into price_rollups: an existing bucket
+    # absorbs the new partial aggregate.
+    table = PriceRollup.__table__
+    new = stmt.excluded
+    newer = new.last_at >= table.c.last_at
+    return stmt.on_conflict_do_update(
+        index_elements=['product_id', 'resolution', 'platform', 'bucket_start'],
+        set_={
+            'min_price': db.case((new.min_price < table.c.min_price, new.min_price), else_=table.c.min_price),
+            'max_price': db.case((new.max_price > table.c.max_price, new.max_price), else_=table.c.max_price),
+            'last_price': db.case((newer, new.last_price), else_=table.c.last_price),
+            'last_at': db.case((newer, new.last_at), else_=table.c.last_at),
+            'sample_count': table.c.sample_count + new.sample_count
+        }
+    )
+
+def merge_rollups(connection, rollups):
+    # Upsert partial aggregates.
+    if not rollups:
+        return
+    connection.execute(absorb_rollups(dialect_insert(PriceRollup.__table__)), list(rollups.values()))
+
+def rollup_samples_at(connection, samples, recorded_at):
+    # Set-based rollup of one sample per product, all taken at `recorded_at`:
+    # `samples` selects (product_id, amazon_price, flipkart_price). Each
+    # product then lands in one bucket per resolution and platform, so no
+    # folding is needed and the rows never leave the database.
+    samples = samples.subquery('samples')
+    columns = ['product_id', 'resolution', 'platform', 'bucket_start',
+               'min_price', 'max_price', 'last_price', 'last_at', 'sample_count']
+    for resolution in RESOLUTIONS:
+        for platform in PLATFORMS:
+            price = samples.c[f'{platform}_price']
+            rows = db.select(
+                samples.c.product_id, db.literal(resolution), db.literal(platform),
+                db.literal(bucket_start(recorded_at, resolution), db.DateTime),
+                price, price, price, db.literal(recorded_at, db.DateTime), db.literal(1)
+            ).where(db.true())  # SQLite needs a WHERE to tell ON CONFLICT from a join
+            connection.execute(absorb_rollups(dialect_insert(PriceRollup.__table__).from_select(columns, rows)))
+
+def record_price_history(connection, rows, source):
+    # rows: dicts with product_id, amazon_price, flipkart_price, recorded_at.
+    if not rows:
+        return
+    connection.execute(db.insert(PriceHistory.__table__), [dict(row, source=source) for row in rows])
+    merge_rollups(connection, fold_samples({}, (
+        (row['product_id'], row['amazon_price'], row['flipkart_price'], row['recorded_at']) for row in rows
+    )))
+
+def rollup_history(connection, where):
+    # Fold raw rows already in price_history (bulk INSERT ... SELECT writers,
+    # backfills) into the rollups, streaming in product order.
+    history = PriceHistory.__table__
+    result = connection.execute(
+        db.select(history.c.product_id, history.c.amazon_price, history.c.flipkart_price, history.c.recorded_at)
+        .where(where, history.c.recorded_at.is_not(None))
+        .order_by(history.c.product_id, history.c.recorded_at),
+        execution_options={'yield_per': ROLLUP_FLUSH_KEYS}
+    )
+    rollups = {}
+    count = 0
+    for partition in result.partitions():
+        fold_samples(rollups, partition)
+        count += len(partition)
+        if len(rollups) >= ROLLUP_FLUSH_KEYS:
+            merge_rollups(connection, rollups)
+            rollups = {}
+    merge_rollups(connection, rollups)
+    return count
+
+def compact_history(connection, retention_days=RAW_RETENTION_DAYS, hourly_retention_days=HOURLY_RETENTION_DAYS):
+    now = datetime.utcnow()
+    history = PriceHistory.__table__
+    rollups = PriceRollup.__table__
+    raw = connection.execute(
+        db.delete(history).where(history.c.recorded_at < now - timedelta(days=retention_days))
+    ).rowcount
+    hourly = connection.execute(
+        db.delete(rollups).where(
+            rollups.c.resolution == 'hour',
+            rollups.c.bucket_start < now - timedelta(days=hourly_retention_days)
+        )
+    ).rowcount
+    # Cached history responses and their ETags key on the catalog version.
+    if raw or hourly:
+        bump_catalog_version(connection)
+    return {'raw': raw, 'hourly': hourly}
+
+def chart_resolution(product_id, start=None, end=None, points=DEFAULT_CHART_POINTS):
+    # The coarsest rollup that still gives `points` buckets over the range:
+    # daily when the range spans that many days, otherwise hourly as long as
+    # hourly buckets still reach back to its start. Compaction drops them,
+    # so a product may have none left; the daily ones then serve.
+    rollups = PriceRollup.__table__
+    first = dict(db.session.execute(
+        db.select(rollups.c.resolution, db.func.min(rollups.c.bucket_start))
+        .where(rollups.c.product_id == product_id)
+        .group_by(rollups.c.resolution)
+    ).all())
+    start = start or first.get('day')
+    if start is None:
+        return 'hour'
+    if ((end or datetime.utcnow()) - start).days >= points:
+        return 'day'
+    if first.get('hour') is not None and bucket_start(first['hour'], 'day') <= bucket_start(start, 'day'):
+        return 'hour'
+    return 'day'
+
+def downsample(times, mins, maxs, lasts, points):
+    # Min/max bucketing: split the range into `points` equal time slices and
+    # keep each slice's low, high and closing price, so spikes survive.
+    if len(times) <= points:
+        return times, mins, maxs, lasts
+    offsets = times - times[0]
+    slices = offsets * points // (offsets[-1] + 1)
+    starts = np.flatnonzero(np.diff(slices, prepend=-1))
+    ends = np.append(starts[1:], len(times)) - 1
+    return times[starts], np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts), lasts[ends]
+
+def price_series(product_id, start=None, end=None, points=DEFAULT_CHART_POINTS, resolution=None):
+    resolution = resolution or chart_resolution(product_id, start, end, points)
+    rollups = PriceRollup.__table__
+    query = (
+        db.select(
+            rollups.c.platform, rollups.c.bucket_start,
+            rollups.c.min_price, rollups.c.max_price, rollups.c.last_price
+        )
+        .where(rollups.c.product_id == product_id, rollups.c.resolution == resolution)
+        .order_by(rollups.c.platform, rollups.c.bucket_start)
+    )
+    if start is not None:
+        query = query.where(rollups.c.bucket_start >= bucket_start(start, resolution))
+    if end is not None:
+        query = query.where(rollups.c.bucket_start <= end)
+
+    rows = {platform: [] for platform in PLATFORMS}
+    for row in db.session.execute(query).all():
+        rows[row[0]].append(row[1:])
+
+    series = {}
+    for platform, samples in rows.items():
+        if not samples:
+            series[platform] = []
+            continue
+        at, low, high, last = zip(*samples)
+        times = np.array([(stamp - EPOCH) // ONE_SECOND for stamp in at], dtype=np.int64)
+        times, low, high, last = downsample(times, np.array(low), np.array(high), np.array(last), points)
+        stamps = np.datetime_as_string(times.astype('datetime64[s]')).tolist()
+        series[platform] = [
+            {'at': stamp, 'min': lo, 'max': hi, 'last': close}
+            for stamp, lo, hi, close in zip(stamps, low.tolist(), high.tolist(), last.tolist())
+        ]
+    return resolution, series
+
+@event.listens_for(Session, 'after_flush')
+def update_rollups_on_flush(session, flush_context):
+    samples = [
+        (obj.product_id, obj.amazon_price, obj.flipkart_price, obj.recorded_at)
+        for obj in session.new
+        if isinstance(obj, PriceHistory) and obj.recorded_at is not None
+    ]
+    if samples:
+        merge_rollups(session.connection(), fold_samples({}, samples))
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain price history storage')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compact = commands.add_parser('compact', help='Delete raw history and hourly rollups past their retention')
+    compact.add_argument('--retention-days', type=int, default=RAW_RETENTION_DAYS,
+                         help=f'Raw snapshots kept (default {RAW_RETENTION_DAYS} days)')
+    compact.add_argument('--hourly-retention-days', type=int, default=HOURLY_RETENTION_DAYS,
+                         help=f'Hourly rollups kept (default {HOURLY_RETENTION_DAYS} days); daily ones are kept for good')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        stats = compact_history(db.session.connection(), args.retention_days, args.hourly_retention_days)
+        db.session.commit()
+        print(f"✅ Compacted history: removed {stats['raw']} raw snapshots and {stats['hourly']} hourly rollups")
+
+if __name__ == '__main__':
+    main()
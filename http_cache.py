@@ -0,0 +1,279 @@
+"""Persistent HTTP cache for the static scraping tier.
+
+Pages are stored in a SQLite file (instance/http_cache.sqlite by default),
+keyed on the canonical URL, so the refresher, searches, several products
+sharing a listing and developer reruns all reuse one download. Bodies are
+zlib-compressed and kept apart from the small metadata rows that eviction
+scans. An entry is fresh for its host's TTL; a stale one is revalidated
+with If-None-Match / If-Modified-Since when the site sent an ETag or
+Last-Modified, and a 304 keeps the stored body. Only 200 responses are
+stored, and the total size is capped with least-recently-used eviction.
+
+  HTTP_CACHE=off                                          # disable
+  HTTP_CACHE_TTL=900                                      # seconds, every host
+  HTTP_CACHE_HOST_TTLS=www.amazon.in=600,www.flipkart.com=1800
+  HTTP_CACHE_MAX_BYTES=268435456
+
+  python http_cache.py              # entries and size per host
+  python http_cache.py clear
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'http_cache.sqlite')
+DEFAULT_TTL = 900
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS responses ('
+    ' url TEXT PRIMARY KEY, host TEXT NOT NULL, etag TEXT, last_modified TEXT,'
+    ' fetched_at REAL NOT NULL, used_at REAL NOT NULL, size INTEGER NOT NULL, raw_size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS ix_responses_used_at ON responses (used_at)',
+    'CREATE TABLE IF NOT EXISTS bodies (url TEXT PRIMARY KEY, body BLOB NOT NULL)',
+)
+
+
+def cache_key(url: str) -> str:
+    # Same canonical form as models.canonical_url, without importing the ORM.
+    parts = urlsplit((url or '').strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+
+def parse_host_ttls(spec: Optional[str]) -> Dict[str, int]:
+    ttls = {}
+    for item in (spec or '').split(','):
+        host, _, seconds = item.partition('=')
+        if host.strip() and seconds.strip():
+            ttls[host.strip().lower()] = int(seconds)
+    return ttls
+
+
+class CachedPage(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    raw_size: int
+    body: bytes
+
+
+class HTTPCache:
+    def __init__(self, path: str = DEFAULT_PATH, ttl: int = DEFAULT_TTL, host_ttls: Optional[Dict[str, int]] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.host_ttls = host_ttls or {}
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._size = None
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'hits': 0, 'revalidated': 0, 'misses': 0,
+                      'stored': 0, 'evicted': 0, 'bytes_saved': 0, 'bytes_fetched': 0}
+
+    @classmethod
+    def from_env(cls) -> Optional['HTTPCache']:
+        if os.environ.get('HTTP_CACHE', 'on').lower() in ('0', 'off', 'false', 'no'):
+            return None
+        return cls(
+            path=os.environ.get('HTTP_CACHE_PATH', DEFAULT_PATH),
+            ttl=int(os.environ.get('HTTP_CACHE_TTL', DEFAULT_TTL)),
+            host_ttls=parse_host_ttls(os.environ.get('HTTP_CACHE_HOST_TTLS')),
+            max_bytes=int(os.environ.get('HTTP_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        )
+
+    def connection(self) -> sqlite3.Connection:
+        # Opened on first use and shared by the scraper threads under the lock;
+        # WAL lets the app and the refresher use the same file.
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._size = connection.execute('SELECT coalesce(sum(size), 0) FROM responses').fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def host_ttl(self, url: str) -> int:
+        return self.host_ttls.get(urlsplit(url).netloc.lower(), self.ttl)
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self.connection().execute(
+                'SELECT r.etag, r.last_modified, r.fetched_at, r.raw_size, b.body'
+                ' FROM responses r JOIN bodies b ON b.url = r.url WHERE r.url = ?',
+                (cache_key(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return CachedPage(*row[:4], zlib.decompress(row[4]))
+        except zlib.error:
+            self.discard(url)
+            return None
+
+    def store(self, url: str, headers, body: bytes, now: Optional[float] = None):
+        now = now or time.time()
+        key = cache_key(url)
+        compressed = zlib.compress(body, COMPRESSION_LEVEL)
+        with self._lock:
+            connection = self.connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                previous = connection.execute('SELECT size FROM responses WHERE url = ?', (key,)).fetchone()
+                connection.execute(
+                    'INSERT OR REPLACE INTO responses (url, host, etag, last_modified, fetched_at, used_at, size, raw_size)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, urlsplit(key).netloc, headers.get('ETag'), headers.get('Last-Modified'),
+                     now, now, len(compressed), len(body))
+                )
+                connection.execute('INSERT OR REPLACE INTO bodies (url, body) VALUES (?, ?)', (key, compressed))
+                self._size += len(compressed) - (previous[0] if previous else 0)
+                self.stats['stored'] += 1
+                if self._size > self.max_bytes:
+                    self._evict(connection)
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+
+    def _evict(self, connection: sqlite3.Connection):
+        # Least recently used first, down to 90% of the budget so eviction
+        # does not run again on the next store. Re-reads the total, which
+        # other processes sharing the file also change.
+        self._size = connection.execute('SELECT coalesce(sum(size), 0) FROM responses').fetchone()[0]
+        target = self.max_bytes * 0.9
+        victims = []
+        for url, size in connection.execute('SELECT url, size FROM responses ORDER BY used_at'):
+            if self._size <= target:
+                break
+            victims.append((url,))
+            self._size -= size
+        connection.executemany('DELETE FROM responses WHERE url = ?', victims)
+        connection.executemany('DELETE FROM bodies WHERE url = ?', victims)
+        self.stats['evicted'] += len(victims)
+
+    def touch(self, url: str, fetched_at: Optional[float] = None):
+        # Marks a use; a revalidated entry also restarts its TTL.
+        now = time.time()
+        with self._lock:
+            if fetched_at is None:
+                self.connection().execute('UPDATE responses SET used_at = ? WHERE url = ?', (now, cache_key(url)))
+            else:
+                self.connection().execute(
+                    'UPDATE responses SET used_at = ?, fetched_at = ? WHERE url = ?', (now, fetched_at, cache_key(url))
+                )
+
+    def discard(self, url: str):
+        # For pages that parsed to nothing (a captcha or an interstitial
+        # served with 200), so the next fetch goes to the site.
+        key = cache_key(url)
+        with self._lock:
+            connection = self.connection()
+            row = connection.execute('SELECT size FROM responses WHERE url = ?', (key,)).fetchone()
+            if row is None:
+                return
+            connection.execute('DELETE FROM responses WHERE url = ?', (key,))
+            connection.execute('DELETE FROM bodies WHERE url = ?', (key,))
+            self._size -= row[0]
+
+    def clear(self):
+        with self._lock:
+            connection = self.connection()
+            connection.execute('DELETE FROM responses')
+            connection.execute('DELETE FROM bodies')
+            connection.execute('VACUUM')
+            self._size = 0
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def fetch(self, session, url: str, timeout: float) -> Tuple[int, Optional[bytes]]:
+        # (status, body) through the cache; the body is None unless the page
+        # is a 200, fresh from the cache or confirmed by a 304.
+        self.count('requests')
+        cached = self.lookup(url)
+        if cached is not None and time.time() - cached.fetched_at < self.host_ttl(url):
+            self.touch(url)
+            self.count('hits')
+            self.count('bytes_saved', cached.raw_size)
+            return 200, cached.body
+
+        headers = {}
+        if cached is not None and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+        response = session.get(url, timeout=timeout, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            self.touch(url, fetched_at=time.time())
+            self.count('revalidated')
+            self.count('bytes_saved', cached.raw_size)
+            return 200, cached.body
+        self.count('misses')
+        self.count('bytes_fetched', len(response.content))
+        if response.status_code != 200:
+            return response.status_code, None
+        self.store(url, response.headers, response.content)
+        return 200, response.content
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+        served = stats['hits'] + stats['revalidated']
+        stats['hit_ratio'] = round(served / stats['requests'], 3) if stats['requests'] else 0.0
+        return stats
+
+    def report(self) -> str:
+        stats = self.snapshot()
+        return (f"http cache: {stats['hits'] + stats['revalidated']}/{stats['requests']} served "
+                f"({stats['hit_ratio']:.0%}, {stats['revalidated']} revalidated), "
+                f"{stats['bytes_saved'] / 1e6:.1f} MB saved, {stats['bytes_fetched'] / 1e6:.1f} MB fetched, "
+                f"{stats['evicted']} evicted")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the scrapers\' HTTP cache')
+    parser.add_argument('command', nargs='?', choices=['stats', 'clear'], default='stats')
+    args = parser.parse_args()
+
+    cache = HTTPCache.from_env()
+    if cache is None:
+        print("❌ HTTP cache is disabled (HTTP_CACHE=off)")
+        return
+    if args.command == 'clear':
+        cache.clear()
+        print(f"✅ Cleared {cache.path}")
+        return
+
+    rows = cache.connection().execute(
+        'SELECT host, count(*), sum(size), sum(raw_size), min(fetched_at) FROM responses GROUP BY host ORDER BY host'
+    ).fetchall()
+    now = time.time()
+    for host, entries, size, raw_size, oldest in rows:
+        print(f"{host:<30} {entries:>7} pages  {size / 1e6:>8.1f} MB ({raw_size / 1e6:.1f} MB raw)  "
+              f"ttl {cache.host_ttls.get(host, cache.ttl)}s, oldest {(now - oldest) / 60:.0f} min")
+    print(f"📦 {sum(row[1] for row in rows)} pages, {sum(row[2] for row in rows) / 1e6:.1f} MB of "
+          f"{cache.max_bytes / 1e6:.0f} MB in {cache.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,86 +1,245 @@
+import argparse
 import csv
+from collections import Counter
 import os
+import time
+from datetime import datetime
 from app import create_app
-from models import db, Product
+from models import (db, Product, PriceHistory, COUPON_COLUMNS, delete_product_dependents, derived_price_fields,
+                    make_listing_key, upsert)
+from coupons import coupon_columns, parse_coupon
+from brands import brand_matcher
+from catalog import bump_catalog_version
+from facets import apply_facet_deltas, grouped_counts
+from history import rollup_history
+from alerts import alert_dispatcher, fire_watches
+from deals import recompute_deals
+from snapshots import take_snapshot
+
+BATCH_SIZE = 5000
+
+DEFAULT_CSV = 'attached_assets/Pasted-Category-Product-Name-Amazon-Price-Amazon-URL-Flipkart-Price-Flipkart-URL-Phones-Samsung-Galaxy-M05-1759997348000_1759997348001_1760789852407.txt'
+
+MERGE_COLUMNS = [
+    'category', 'product_name', 'brand',
+    'amazon_price', 'amazon_coupon', 'amazon_url',
+    'flipkart_price', 'flipkart_coupon', 'flipkart_url'
+]
+
+# Follow the prices and coupon text; written alongside MERGE_COLUMNS but never compared.
+DERIVED_COLUMNS = [
+    'best_price', 'best_platform', 'price_diff',
+    'amazon_effective_price', 'flipkart_effective_price', 'effective_price',
+    *COUPON_COLUMNS
+]
+
+# The feed is loaded here first, in batches, and then merged into products in
+# one transaction, so readers never see a half-imported catalog.
+staging_metadata = db.MetaData()
+import_staging = db.Table(
+    'import_staging', staging_metadata,
+    db.Column('listing_key', db.String(40), primary_key=True),
+    db.Column('category', db.String(50), nullable=False),
+    db.Column('product_name', db.String(255), nullable=False),
+    db.Column('brand', db.String(100)),
+    db.Column('amazon_price', db.Float, nullable=False),
+    db.Column('amazon_coupon', db.String(255)),
+    db.Column('amazon_url', db.Text, nullable=False),
+    db.Column('flipkart_price', db.Float, nullable=False),
+    db.Column('flipkart_coupon', db.String(255)),
+    db.Column('flipkart_url', db.Text, nullable=False),
+    db.Column('best_price', db.Float, nullable=False),
+    db.Column('best_platform', db.String(20), nullable=False),
+    db.Column('price_diff', db.Float, nullable=False),
+    db.Column('amazon_effective_price', db.Float, nullable=False),
+    db.Column('flipkart_effective_price', db.Float, nullable=False),
+    db.Column('effective_price', db.Float, nullable=False),
+    *[db.Column(name, Product.__table__.c[name].type) for name in COUPON_COLUMNS]
+)
 
 def extract_brand(product_name):
-    brands = [
-        'Samsung', 'Apple', 'OnePlus', 'Xiaomi', 'Redmi', 'POCO', 'Realme', 'iQOO', 'vivo', 
-        'Oppo', 'Motorola', 'Moto', 'Nothing', 'CMF', 'Infinix', 'Tecno', 'Honor', 'Google',
-        'Pixel', 'Lava', 'HP', 'Dell', 'Lenovo', 'ASUS', 'Acer', 'Microsoft', 'boAt', 
-        'Sony', 'JBL', 'Bose', 'Sennheiser'
-    ]
-    
-    for brand in brands:
-        if brand.lower() in product_name.lower():
-            return brand
-    
-    return product_name.split()[0] if product_name.split() else 'Unknown'
+    return brand_matcher().find(product_name) or (product_name.split()[0] if product_name.split() else 'Unknown')
 
-def import_products_from_csv(csv_file):
-    app = create_app()
+def parse_row(row):
+    product_name = row['Product_Name'].strip()
+    amazon_coupon = (row.get('Amazon_Coupon') or '').strip()
+    flipkart_coupon = (row.get('Flipkart_Coupon') or '').strip()
+    amazon_price = float(row['Amazon_Price'].replace(',', ''))
+    flipkart_price = float(row['Flipkart_Price'].replace(',', ''))
+    amazon_parsed = parse_coupon(amazon_coupon)
+    flipkart_parsed = parse_coupon(flipkart_coupon)
     
-    with app.app_context():
-        Product.query.delete()
+    return {
+        'category': row['Category'].strip(),
+        'product_name': product_name,
+        'brand': extract_brand(product_name),
+        'amazon_price': amazon_price,
+        'amazon_coupon': amazon_coupon if amazon_coupon else None,
+        'amazon_url': row['Amazon_URL'].strip(),
+        'flipkart_price': flipkart_price,
+        'flipkart_coupon': flipkart_coupon if flipkart_coupon else None,
+        'flipkart_url': row['Flipkart_URL'].strip(),
+        'listing_key': make_listing_key(row['Amazon_URL'], row['Flipkart_URL']),
+        **coupon_columns('amazon', amazon_parsed),
+        **coupon_columns('flipkart', flipkart_parsed),
+        **derived_price_fields(amazon_price, flipkart_price, amazon_parsed, flipkart_parsed)
+    }
+
+def iter_product_rows(csv_file):
+    with open(csv_file, 'r', encoding='utf-8', newline='') as file:
+        for line_number, row in enumerate(csv.DictReader(file), start=2):
+            try:
+                yield parse_row(row)
+            except Exception as e:
+                print(f"Error processing row {line_number}: {e}")
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stage_rows(csv_file, batch_size):
+    import_staging.drop(db.engine, checkfirst=True)
+    import_staging.create(db.engine)
+    
+    count = 0
+    started = time.perf_counter()
+    # Later rows for the same listing win, within a chunk and across chunks.
+    insert_staged = upsert(import_staging, ['listing_key'], MERGE_COLUMNS + DERIVED_COLUMNS)
+    
+    # Rows are parsed lazily and written one executemany per chunk, so
+    # memory stays bounded by batch_size however large the feed is.
+    for chunk in chunked(iter_product_rows(csv_file), batch_size):
+        rows = list({row['listing_key']: row for row in chunk}.values())
+        db.session.execute(insert_staged, rows)
         db.session.commit()
+        count += len(chunk)
         
-        count = 0
+        elapsed = time.perf_counter() - started
+        print(f"   ... staged {count} rows ({count / elapsed:,.0f} rows/s)")
+    
+    return count
+
+def merge_staged_products(prune=True):
+    products = Product.__table__
+    staged = import_staging
+    now = datetime.utcnow()
+    matched = products.c.listing_key == staged.c.listing_key
+    
+    price_changed = db.or_(
+        products.c.amazon_price != staged.c.amazon_price,
+        products.c.flipkart_price != staged.c.flipkart_price
+    )
+    changed = db.or_(*[products.c[column].is_distinct_from(staged.c[column]) for column in MERGE_COLUMNS])
+    gone = db.or_(
+        products.c.listing_key.is_(None),
+        ~db.exists().where(staged.c.listing_key == products.c.listing_key)
+    )
+    
+    # Facet deltas: take out the rows about to change or disappear now, and
+    # add back everything this merge touched (stamped with `now`) at the end.
+    connection = db.session.connection()
+    take_snapshot(connection, source='import', now=now)
+    leaving = db.exists().where(matched, changed)
+    leaving_counts = grouped_counts(connection, db.or_(leaving, gone) if prune else leaving)
+    facet_deltas = Counter({key: -count for key, count in leaving_counts.items()})
+    
+    history = db.session.execute(
+        db.insert(PriceHistory.__table__).from_select(
+            ['product_id', 'amazon_price', 'flipkart_price', 'recorded_at', 'source'],
+            db.select(
+                products.c.id, staged.c.amazon_price, staged.c.flipkart_price,
+                db.literal(now, db.DateTime), db.literal('import')
+            ).where(matched, price_changed)
+        )
+    ).rowcount
+    if history:
+        recorded = PriceHistory.__table__.c
+        rollup_history(connection, db.and_(recorded.recorded_at == now, recorded.source == 'import'))
+    
+    updated = db.session.execute(
+        db.update(products)
+        .where(matched, changed)
+        .values({**{column: staged.c[column] for column in MERGE_COLUMNS + DERIVED_COLUMNS}, 'updated_at': now})
+    ).rowcount
+    
+    inserted = db.session.execute(
+        db.insert(products).from_select(
+            ['listing_key', *MERGE_COLUMNS, *DERIVED_COLUMNS, 'created_at', 'updated_at'],
+            db.select(
+                staged.c.listing_key, *[staged.c[column] for column in MERGE_COLUMNS + DERIVED_COLUMNS],
+                db.literal(now, db.DateTime), db.literal(now, db.DateTime)
+            ).where(~db.exists().where(products.c.listing_key == staged.c.listing_key))
+        )
+    ).rowcount
+    
+    removed = 0
+    if prune:
+        gone_ids = db.select(products.c.id).where(gone)
+        delete_product_dependents(connection, gone_ids)
+        removed = db.session.execute(db.delete(products).where(products.c.id.in_(gone_ids))).rowcount
+    
+    if inserted or updated or removed:
+        facet_deltas.update(grouped_counts(connection, products.c.updated_at == now))
+        apply_facet_deltas(connection, facet_deltas)
+        recompute_deals(connection)
+        bump_catalog_version()
+    
+    alerts = fire_watches(connection, db.select(products.c.id).where(products.c.updated_at == now)) if updated else []
+    
+    return {'inserted': inserted, 'updated': updated, 'removed': removed, 'price_changes': history, 'alerts': alerts}
+
+def import_products_from_csv(csv_file, batch_size=BATCH_SIZE, prune=True):
+    app = create_app()
+    
+    with app.app_context():
+        started = time.perf_counter()
+        count = stage_rows(csv_file, batch_size)
         
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            
-            for row in csv_reader:
-                try:
-                    category = row['Category'].strip()
-                    product_name = row['Product_Name'].strip()
-                    amazon_price = float(row['Amazon_Price'].replace(',', ''))
-                    amazon_coupon = row.get('Amazon_Coupon', '').strip()
-                    amazon_url = row['Amazon_URL'].strip()
-                    flipkart_price = float(row['Flipkart_Price'].replace(',', ''))
-                    flipkart_coupon = row.get('Flipkart_Coupon', '').strip()
-                    flipkart_url = row['Flipkart_URL'].strip()
-                    
-                    brand = extract_brand(product_name)
-                    
-                    product = Product(
-                        category=category,
-                        product_name=product_name,
-                        brand=brand,
-                        amazon_price=amazon_price,
-                        amazon_coupon=amazon_coupon if amazon_coupon else None,
-                        amazon_url=amazon_url,
-                        flipkart_price=flipkart_price,
-                        flipkart_coupon=flipkart_coupon if flipkart_coupon else None,
-                        flipkart_url=flipkart_url
-                    )
-                    
-                    db.session.add(product)
-                    count += 1
-                    
-                except Exception as e:
-                    print(f"Error processing row: {e}")
-                    continue
+        if count == 0:
+            import_staging.drop(db.engine, checkfirst=True)
+            print("❌ No valid rows in feed; catalog left unchanged")
+            return
         
-        db.session.commit()
+        try:
+            stats = merge_staged_products(prune=prune)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            import_staging.drop(db.engine, checkfirst=True)
+        alert_dispatcher.send(stats['alerts'])
         
-        print(f"✅ Successfully imported {count} products")
+        elapsed = time.perf_counter() - started
+        print(f"✅ Successfully imported {count} rows in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+        print(f"   inserted={stats['inserted']} updated={stats['updated']} removed={stats['removed']} "
+              f"price_changes={stats['price_changes']} alerts={len(stats['alerts'])}")
         
-        categories = db.session.query(Product.category).distinct().all()
-        brands = db.session.query(Product.brand).distinct().all()
+        category_counts = db.session.query(Product.category, db.func.count(Product.id)).group_by(Product.category).all()
+        brand_count = db.session.query(db.func.count(db.distinct(Product.brand))).scalar()
         
-        print(f"📊 Categories: {[cat[0] for cat in categories]}")
-        print(f"🏷️  Total Brands: {len(brands)}")
+        print(f"📊 Categories: {[category for category, _ in category_counts]}")
+        print(f"🏷️  Total Brands: {brand_count}")
         
-        for category in categories:
-            product_count = Product.query.filter_by(category=category[0]).count()
-            print(f"   {category[0]}: {product_count} products")
+        for category, product_count in category_counts:
+            print(f"   {category}: {product_count} products")
 
 if __name__ == '__main__':
-    csv_file = 'attached_assets/Pasted-Category-Product-Name-Amazon-Price-Amazon-URL-Flipkart-Price-Flipkart-URL-Phones-Samsung-Galaxy-M05-1759997348000_1759997348001_1760789852407.txt'
+    parser = argparse.ArgumentParser(description='Import products from a CSV feed')
+    parser.add_argument('csv_file', nargs='?', default=DEFAULT_CSV)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--keep-missing', action='store_true', help='Keep products that are not in the feed')
+    args = parser.parse_args()
     
-    if not os.path.exists(csv_file):
-        print(f"❌ CSV file not found: {csv_file}")
+    if not os.path.exists(args.csv_file):
+        print(f"❌ CSV file not found: {args.csv_file}")
         exit(1)
     
     print("📥 Importing products from CSV...")
-    import_products_from_csv(csv_file)
+    import_products_from_csv(args.csv_file, batch_size=args.batch_size, prune=not args.keep_missing)
@@ -0,0 +1,221 @@
+"""Matching scraped listings to catalog products.
+
+A title is normalized into a `ListingKey`: its brand (see brands.py), its
+model tokens, its sizes ("64gb", "1tb", however they were spaced) and its
+colours. `CatalogMatcher` indexes the catalog by blocking keys, (brand,
+token) pairs built from the model tokens that carry a digit ("m05", "15",
+"g85") or, for names without any, from all model tokens. A hit is scored
+only against the products in the blocks of its own tokens, so matching costs the
+size of those blocks rather than the size of the catalog. Blocks grown past
+`MAX_BLOCK_SIZE` ("5g", "pro") are dropped from the index: they separate
+nothing.
+
+Candidates with a different brand or with no size in common are rejected.
+The rest are scored by how much of the product's model tokens, weighted by
+IDF, the hit covers; catalog names are short and scraped titles verbose, so
+coverage of the product matters, not of the title. Ties go to the closest
+name overall (weighted Dice), so "Redmi 13 5G" prefers that product over
+"Redmi 13". Colours are ignored: colour variants share a listing. The
+restore tool resolves the attachment rows its URL and name lookups miss
+through the same matcher.
+
+  python matching.py hits.csv > matched.csv    # CSV with a `title` column
+"""
+import argparse
+import csv
+import math
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import NamedTuple, Optional
+
+from brands import brand_matcher, words
+
+MATCH_THRESHOLD = 0.6
+MAX_BLOCK_SIZE = 2000
+
+SIZE = re.compile(r'(\d+(?:\.\d+)?)\s*(gb|tb|mb)\b')
+SIZE_TOKEN = re.compile(r'^\d+(?:\.\d+)?(?:gb|tb|mb)$')
+DIGIT = re.compile(r'\d')
+COLOURS = frozenset((
+    'black', 'white', 'blue', 'green', 'red', 'silver', 'gold', 'grey', 'gray', 'purple', 'pink',
+    'yellow', 'orange', 'violet', 'mint', 'titanium', 'graphite', 'midnight', 'starlight', 'cream',
+    'beige', 'bronze', 'navy', 'teal', 'lavender', 'aqua', 'coral', 'peach', 'space', 'jet', 'dark',
+    'light', 'sky', 'rose',
+))
+STOP_WORDS = frozenset((
+    'with', 'and', 'the', 'for', 'of', 'in', 'by', 'new', 'ram', 'rom', 'storage', 'memory', 'gb',
+    'tb', 'inch', 'inches', 'cm', 'edition', 'version', 'variant',
+))
+NETWORK_TOKENS = frozenset(('3g', '4g', '5g', 'lte', 'wifi'))
+
+
+class ListingKey(NamedTuple):
+    brand: Optional[str]
+    tokens: tuple
+    sizes: frozenset
+    colours: frozenset
+
+
+class Match(NamedTuple):
+    product_id: int
+    score: float
+
+
+def listing_key(title, brand=None):
+    # `brand` is a known brand for the title (a catalog row's brand column);
+    # it is used when the title itself names none.
+    title_words = words(SIZE.sub(r' \1\2 ', (title or '').casefold()))
+    found = brand_matcher().find_words(title_words) or brand
+    brand_words = set(words(found)) if found else set()
+    tokens, sizes, colours = [], set(), set()
+    for word in title_words:
+        if SIZE_TOKEN.match(word):
+            sizes.add(word)
+        elif word in COLOURS:
+            colours.add(word)
+        elif word not in STOP_WORDS and word not in brand_words and word not in tokens:
+            tokens.append(word)
+    return ListingKey(found.casefold() if found else None, tuple(tokens), frozenset(sizes), frozenset(colours))
+
+
+def block_keys(key):
+    identifiers = [token for token in key.tokens if DIGIT.search(token) and token not in NETWORK_TOKENS]
+    return [(key.brand, token) for token in identifiers or key.tokens]
+
+
+class CatalogMatcher:
+    def __init__(self, max_block_size=MAX_BLOCK_SIZE):
+        self.max_block_size = max_block_size
+        self.product_ids = []
+        self.keys = []
+        self.blocks = defaultdict(list)
+        self.brands_by_token = defaultdict(set)
+        self.document_frequency = Counter()
+        self.weights = None
+
+    def add(self, product_id, title, brand=None):
+        key = listing_key(title, brand)
+        position = len(self.product_ids)
+        self.product_ids.append(product_id)
+        self.keys.append(key)
+        self.document_frequency.update(key.tokens)
+        for block in block_keys(key):
+            self.blocks[block].append(position)
+            self.brands_by_token[block[1]].add(block[0])
+        self.weights = None
+
+    def add_many(self, rows):
+        # rows: (product_id, title, brand) tuples.
+        for product_id, title, brand in rows:
+            self.add(product_id, title, brand)
+        return self
+
+    @classmethod
+    def from_connection(cls, connection, chunk_size=10000, **kwargs):
+        from models import db, Product
+
+        products = Product.__table__
+        result = connection.execute(
+            db.select(products.c.id, products.c.product_name, products.c.brand),
+            execution_options={'yield_per': chunk_size}
+        )
+        matcher = cls(**kwargs)
+        for rows in result.partitions():
+            matcher.add_many(rows)
+        return matcher
+
+    def prepare(self):
+        # IDF weights, and the blocks too large to be worth scoring.
+        count = max(len(self.keys), 1)
+        self.weights = {token: math.log(1 + count / frequency) for token, frequency in self.document_frequency.items()}
+        for block in [block for block, positions in self.blocks.items() if len(positions) > self.max_block_size]:
+            del self.blocks[block]
+
+    def weight(self, token):
+        return self.weights.get(token, math.log(1 + max(len(self.keys), 1)))
+
+    def candidates(self, key):
+        # Every model token of the hit is looked up, since a product is indexed
+        # under its identifiers or, having none, under all its tokens. Blocks
+        # of the hit's brand and of unbranded products are searched; a hit of
+        # unknown brand searches the token's blocks of every brand.
+        positions = set()
+        for token in key.tokens:
+            brands = (key.brand, None) if key.brand is not None else self.brands_by_token.get(token, ())
+            for block_brand in brands:
+                positions.update(self.blocks.get((block_brand, token), ()))
+        return positions
+
+    def score(self, key, candidate):
+        if key.brand and candidate.brand and key.brand != candidate.brand:
+            return None
+        if key.sizes and candidate.sizes and not key.sizes & candidate.sizes:
+            return None
+        hit_tokens = set(key.tokens)
+        product_weight = sum(self.weight(token) for token in candidate.tokens)
+        if not product_weight:
+            return None
+        shared = sum(self.weight(token) for token in candidate.tokens if token in hit_tokens)
+        hit_weight = sum(self.weight(token) for token in hit_tokens)
+        return shared / product_weight, 2 * shared / (product_weight + hit_weight)
+
+    def match_key(self, key, threshold=MATCH_THRESHOLD):
+        if self.weights is None:
+            self.prepare()
+        best = None
+        for position in self.candidates(key):
+            scored = self.score(key, self.keys[position])
+            if scored is None or scored[0] < threshold:
+                continue
+            rank = (scored, -self.product_ids[position])
+            if best is None or rank > best[0]:
+                best = (rank, position)
+        if best is None:
+            return None
+        return Match(self.product_ids[best[1]], round(best[0][0][0], 4))
+
+    def match(self, title, brand=None, threshold=MATCH_THRESHOLD):
+        return self.match_key(listing_key(title, brand), threshold)
+
+    def match_many(self, titles, threshold=MATCH_THRESHOLD):
+        return [self.match(title, threshold=threshold) for title in titles]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Match scraped listings (CSV with a title column) to catalog products')
+    parser.add_argument('hits_file')
+    parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD,
+                        help=f'Minimum score to accept a match (default {MATCH_THRESHOLD})')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        with db.engine.connect() as connection:
+            matcher = CatalogMatcher.from_connection(connection)
+        matcher.prepare()
+        indexed = time.perf_counter()
+
+        with open(args.hits_file, 'r', encoding='utf-8', newline='') as fh:
+            reader = csv.DictReader(fh)
+            writer = csv.DictWriter(sys.stdout, fieldnames=[*reader.fieldnames, 'product_id', 'match_score'])
+            writer.writeheader()
+            hits = matched = 0
+            for row in reader:
+                found = matcher.match(row.get('title'), row.get('brand') or None, args.threshold)
+                writer.writerow({**row, 'product_id': found.product_id if found else '', 'match_score': found.score if found else ''})
+                hits += 1
+                matched += found is not None
+        finished = time.perf_counter()
+
+    print(f"✅ Indexed {len(matcher.product_ids)} products in {indexed - started:.2f}s, matched {matched}/{hits} hits "
+          f"in {finished - indexed:.2f}s ({hits / max(finished - indexed, 1e-9):,.0f} hits/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
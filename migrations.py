@@ -0,0 +1,234 @@
+"""Versioned schema migrations.
+
+Run once per deploy, before starting the app or any script:
+
+  python migrations.py            # apply pending migrations
+  python migrations.py status     # show the applied and pending versions
+
+`schema_version` records each applied step, so a database is upgraded
+exactly once and app workers never touch the schema. Step 1 creates every
+missing table from the current models; later steps alter tables that older
+versions created. Those steps still inspect the live schema first, because
+on a fresh database step 1 has already produced their result.
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import inspect, text, true
+
+from models import db, make_listing_key, derived_price_fields, COUPON_COLUMNS, DealScore, CatalogSnapshot, SnapshotPrice
+from coupons import coupon_columns, parse_coupon
+from facets import rebuild_facets
+from history import rollup_history
+from search_index import ensure_search_index
+from deals import recompute_deals
+
+schema_metadata = db.MetaData()
+schema_version = db.Table(
+    'schema_version', schema_metadata,
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('name', db.String(100), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+def column_exists(conn, table, column):
+    return column in {col['name'] for col in inspect(conn).get_columns(table)}
+
+def index_exists(conn, table, name):
+    return name in {index['name'] for index in inspect(conn).get_indexes(table)}
+
+def create_schema(conn):
+    db.metadata.create_all(conn)
+
+def add_listing_key(conn):
+    if not column_exists(conn, 'products', 'listing_key'):
+        print('Adding listing_key column to products...')
+        conn.execute(text('ALTER TABLE products ADD COLUMN listing_key VARCHAR(40)'))
+    
+    missing = conn.execute(text(
+        'SELECT id, amazon_url, flipkart_url FROM products WHERE listing_key IS NULL ORDER BY id'
+    )).all()
+    if missing:
+        seen = {row[0] for row in conn.execute(text('SELECT listing_key FROM products WHERE listing_key IS NOT NULL'))}
+        updates = []
+        for product_id, amazon_url, flipkart_url in missing:
+            key = make_listing_key(amazon_url, flipkart_url)
+            # Legacy duplicates of the same listing pair keep a NULL key; the
+            # next import treats them as gone from the feed.
+            if key in seen:
+                continue
+            seen.add(key)
+            updates.append({'id': product_id, 'key': key})
+        if updates:
+            conn.execute(text('UPDATE products SET listing_key = :key WHERE id = :id'), updates)
+    
+    if not index_exists(conn, 'products', 'ix_products_listing_key'):
+        conn.execute(text('CREATE UNIQUE INDEX ix_products_listing_key ON products (listing_key)'))
+
+def add_derived_price_columns(conn):
+    for column, ddl in (('best_price', 'FLOAT'), ('best_platform', 'VARCHAR(20)'), ('price_diff', 'FLOAT')):
+        if not column_exists(conn, 'products', column):
+            print(f'Adding {column} column to products...')
+            conn.execute(text(f'ALTER TABLE products ADD COLUMN {column} {ddl}'))
+    
+    conn.execute(text("""
+        UPDATE products SET
+            best_price = CASE WHEN amazon_price <= flipkart_price THEN amazon_price ELSE flipkart_price END,
+            best_platform = CASE WHEN amazon_price < flipkart_price THEN 'Amazon' ELSE 'Flipkart' END,
+            price_diff = amazon_price - flipkart_price
+        WHERE best_price IS NULL
+    """))
+    
+    for name, columns in (
+        ('ix_products_best_price', 'best_price'),
+        ('ix_products_price_diff', 'price_diff'),
+        ('ix_products_amazon_price', 'amazon_price'),
+        ('ix_products_flipkart_price', 'flipkart_price'),
+        ('ix_products_category_best_price', 'category, best_price'),
+    ):
+        if not index_exists(conn, 'products', name):
+            conn.execute(text(f'CREATE INDEX {name} ON products ({columns})'))
+
+def populate_facet_counts(conn):
+    has_facets = conn.execute(text('SELECT 1 FROM facet_counts LIMIT 1')).first()
+    has_products = conn.execute(text('SELECT 1 FROM products LIMIT 1')).first()
+    if has_products and not has_facets:
+        print('Building facet counts...')
+        rebuild_facets(conn)
+
+def add_price_history_storage(conn):
+    for name, columns in (
+        ('ix_price_history_product_recorded', 'product_id, recorded_at'),
+        ('ix_price_history_recorded_at', 'recorded_at'),
+    ):
+        if not index_exists(conn, 'price_history', name):
+            conn.execute(text(f'CREATE INDEX {name} ON price_history ({columns})'))
+    
+    has_rollups = conn.execute(text('SELECT 1 FROM price_rollups LIMIT 1')).first()
+    has_history = conn.execute(text('SELECT 1 FROM price_history LIMIT 1')).first()
+    if has_history and not has_rollups:
+        print('Building price history rollups...')
+        rollup_history(conn, true())
+
+def create_search_index(conn):
+    ensure_search_index(conn)
+
+def add_deal_scores(conn):
+    # Filled by add_effective_prices, which the scores read.
+    DealScore.__table__.create(conn, checkfirst=True)
+
+def add_effective_prices(conn):
+    for column, ddl in (
+        *[(name, 'VARCHAR(20)' if name.endswith('_type') else 'FLOAT') for name in COUPON_COLUMNS],
+        ('amazon_effective_price', 'FLOAT'),
+        ('flipkart_effective_price', 'FLOAT'),
+        ('effective_price', 'FLOAT'),
+    ):
+        if not column_exists(conn, 'products', column):
+            print(f'Adding {column} column to products...')
+            conn.execute(text(f'ALTER TABLE products ADD COLUMN {column} {ddl}'))
+    
+    rows = conn.execute(text(
+        'SELECT id, amazon_price, flipkart_price, amazon_coupon, flipkart_coupon FROM products WHERE effective_price IS NULL'
+    )).all()
+    if rows:
+        print(f'Parsing coupons of {len(rows)} products...')
+        parsed = {}
+        updates = []
+        for product_id, amazon_price, flipkart_price, amazon_coupon, flipkart_coupon in rows:
+            for coupon in (amazon_coupon, flipkart_coupon):
+                if coupon not in parsed:
+                    parsed[coupon] = parse_coupon(coupon)
+            fields = derived_price_fields(amazon_price, flipkart_price, parsed[amazon_coupon], parsed[flipkart_coupon])
+            updates.append({
+                'id': product_id,
+                **coupon_columns('amazon', parsed[amazon_coupon]),
+                **coupon_columns('flipkart', parsed[flipkart_coupon]),
+                **{name: fields[name] for name in ('amazon_effective_price', 'flipkart_effective_price', 'effective_price')}
+            })
+        assignments = ', '.join(f'{name} = :{name}' for name in updates[0] if name != 'id')
+        conn.execute(text(f'UPDATE products SET {assignments} WHERE id = :id'), updates)
+    
+    for name, columns in (
+        ('ix_products_amazon_effective_price', 'amazon_effective_price'),
+        ('ix_products_flipkart_effective_price', 'flipkart_effective_price'),
+        ('ix_products_effective_price', 'effective_price'),
+        ('ix_products_category_effective_price', 'category, effective_price'),
+    ):
+        if not index_exists(conn, 'products', name):
+            conn.execute(text(f'CREATE INDEX {name} ON products ({columns})'))
+    
+    if conn.execute(text('SELECT 1 FROM products LIMIT 1')).first():
+        print('Scoring deals...')
+        recompute_deals(conn)
+
+def add_catalog_snapshots(conn):
+    # The first snapshot taken records every product's prices.
+    CatalogSnapshot.__table__.create(conn, checkfirst=True)
+    SnapshotPrice.__table__.create(conn, checkfirst=True)
+
+# Append only: a step's version is its position here.
+MIGRATIONS = [
+    create_schema,
+    add_listing_key,
+    add_derived_price_columns,
+    populate_facet_counts,
+    add_price_history_storage,
+    create_search_index,
+    add_deal_scores,
+    add_effective_prices,
+    add_catalog_snapshots,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+def applied_versions(conn):
+    schema_metadata.create_all(conn)
+    return {row.version: row for row in conn.execute(db.select(schema_version))}
+
+def current_version(engine):
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_version'):
+            return 0
+        return conn.execute(db.select(db.func.max(schema_version.c.version))).scalar() or 0
+
+def run_migrations(engine):
+    applied = []
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        # One transaction per step; a failed step leaves the earlier ones applied.
+        with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                # Serialize concurrent deploys; released at commit.
+                conn.execute(text('SELECT pg_advisory_xact_lock(hashtext(:name))'), {'name': 'schema_version'})
+            if version in applied_versions(conn):
+                continue
+            print(f'Applying migration {version}: {migration.__name__}...')
+            migration(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, name=migration.__name__, applied_at=datetime.utcnow()
+            ))
+            applied.append(version)
+    return applied
+
+def print_status(engine):
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        row = applied.get(version)
+        state = f'applied {row.applied_at:%Y-%m-%d %H:%M}' if row else 'pending'
+        print(f'{version:>3}  {migration.__name__:<28} {state}')
+
+if __name__ == '__main__':
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Apply or inspect database schema migrations')
+    parser.add_argument('command', nargs='?', choices=['upgrade', 'status'], default='upgrade')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        if args.command == 'status':
+            print_status(db.engine)
+        else:
+            applied = run_migrations(db.engine)
+            print(f'✅ Schema at version {LATEST_VERSION} ({len(applied)} migrations applied).')
@@ -1,23 +1,95 @@
+import hashlib
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+from database import RoutingSession
+from coupons import COUPON_PARTS, coupon_columns, effective_price, parse_coupon
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+PLATFORMS = ('amazon', 'flipkart')
+COUPON_COLUMNS = [f'{platform}_coupon_{part}' for platform in PLATFORMS for part in COUPON_PARTS]
+
+def dialect_insert(table):
+    # INSERT supporting ON CONFLICT for the dialects we deploy on.
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def upsert(table, index_elements, update_columns):
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+
+def canonical_url(url):
+    parts = urlsplit((url or '').strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+def make_listing_key(amazon_url, flipkart_url):
+    # A product is identified by the pair of marketplace listings it compares.
+    raw = f'{canonical_url(amazon_url)}\n{canonical_url(flipkart_url)}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def default_listing_key(context):
+    params = context.get_current_parameters()
+    return make_listing_key(params.get('amazon_url'), params.get('flipkart_url'))
+
+def derived_price_fields(amazon_price, flipkart_price, amazon_coupon=None, flipkart_coupon=None):
+    # Stored on the row so sorting and range filters can use an index. The
+    # coupons are parsed `Coupon`s (see coupons.py), not the coupon text.
+    amazon_effective = effective_price(amazon_price, amazon_coupon)
+    flipkart_effective = effective_price(flipkart_price, flipkart_coupon)
+    return {
+        'best_price': min(amazon_price, flipkart_price),
+        'best_platform': 'Amazon' if amazon_price < flipkart_price else 'Flipkart',
+        'price_diff': amazon_price - flipkart_price,
+        'amazon_effective_price': amazon_effective,
+        'flipkart_effective_price': flipkart_effective,
+        'effective_price': min(amazon_effective, flipkart_effective)
+    }
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_category_best_price', 'category', 'best_price'),
+        db.Index('ix_products_category_effective_price', 'category', 'effective_price'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     category = db.Column(db.String(50), nullable=False, index=True)
     product_name = db.Column(db.String(255), nullable=False, index=True)
     brand = db.Column(db.String(100), nullable=True, index=True)
     
-    amazon_price = db.Column(db.Float, nullable=False)
+    amazon_price = db.Column(db.Float, nullable=False, index=True)
     amazon_url = db.Column(db.Text, nullable=False)
     amazon_coupon = db.Column(db.String(255), nullable=True)
+    amazon_coupon_type = db.Column(db.String(20), nullable=True)
+    amazon_coupon_amount = db.Column(db.Float, nullable=True)
+    amazon_coupon_cap = db.Column(db.Float, nullable=True)
+    amazon_coupon_min_order = db.Column(db.Float, nullable=True)
+    amazon_effective_price = db.Column(db.Float, nullable=True, index=True)
     
-    flipkart_price = db.Column(db.Float, nullable=False)
+    flipkart_price = db.Column(db.Float, nullable=False, index=True)
     flipkart_url = db.Column(db.Text, nullable=False)
     flipkart_coupon = db.Column(db.String(255), nullable=True)
+    flipkart_coupon_type = db.Column(db.String(20), nullable=True)
+    flipkart_coupon_amount = db.Column(db.Float, nullable=True)
+    flipkart_coupon_cap = db.Column(db.Float, nullable=True)
+    flipkart_coupon_min_order = db.Column(db.Float, nullable=True)
+    flipkart_effective_price = db.Column(db.Float, nullable=True, index=True)
+    
+    best_price = db.Column(db.Float, nullable=True, index=True)
+    best_platform = db.Column(db.String(20), nullable=True)
+    price_diff = db.Column(db.Float, nullable=True, index=True)
+    effective_price = db.Column(db.Float, nullable=True, index=True)
+    
+    listing_key = db.Column(db.String(40), nullable=True, unique=True, index=True, default=default_listing_key)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -27,31 +99,216 @@ class Product(db.Model):
     def __repr__(self):
         return f'<Product {self.product_name}>'
     
+    API_FIELDS = {
+        'id': 'id',
+        'category': 'category',
+        'productName': 'product_name',
+        'brand': 'brand',
+        'amazonPrice': 'amazon_price',
+        'amazonUrl': 'amazon_url',
+        'amazonCoupon': 'amazon_coupon',
+        'amazonEffectivePrice': 'amazon_effective_price',
+        'flipkartPrice': 'flipkart_price',
+        'flipkartUrl': 'flipkart_url',
+        'flipkartCoupon': 'flipkart_coupon',
+        'flipkartEffectivePrice': 'flipkart_effective_price',
+        'bestPrice': 'best_price',
+        'bestPlatform': 'best_platform',
+        'effectivePrice': 'effective_price',
+        'createdAt': 'created_at',
+        'updatedAt': 'updated_at'
+    }
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'category': self.category,
-            'productName': self.product_name,
-            'brand': self.brand,
-            'amazonPrice': self.amazon_price,
-            'amazonUrl': self.amazon_url,
-            'amazonCoupon': self.amazon_coupon,
-            'flipkartPrice': self.flipkart_price,
-            'flipkartUrl': self.flipkart_url,
-            'flipkartCoupon': self.flipkart_coupon,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
-        }
+        values = {field: getattr(self, column) for field, column in self.API_FIELDS.items()}
+        return {field: value.isoformat() if isinstance(value, datetime) else value for field, value in values.items()}
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def set_derived_price_fields(mapper, connection, target):
+    coupons = {}
+    for platform in PLATFORMS:
+        coupons[platform] = parse_coupon(getattr(target, f'{platform}_coupon'))
+        for name, value in coupon_columns(platform, coupons[platform]).items():
+            setattr(target, name, value)
+    if target.amazon_price is not None and target.flipkart_price is not None:
+        fields = derived_price_fields(target.amazon_price, target.flipkart_price, coupons['amazon'], coupons['flipkart'])
+        for name, value in fields.items():
+            setattr(target, name, value)
 
 class PriceHistory(db.Model):
     __tablename__ = 'price_history'
+    __table_args__ = (
+        db.Index('ix_price_history_product_recorded', 'product_id', 'recorded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     amazon_price = db.Column(db.Float, nullable=False)
     flipkart_price = db.Column(db.Float, nullable=False)
-    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     source = db.Column(db.String(50), default='manual')
     
     def __repr__(self):
         return f'<PriceHistory {self.product_id} - {self.recorded_at}>'
+
+class PriceRollup(db.Model):
+    __tablename__ = 'price_rollups'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    resolution = db.Column(db.String(10), primary_key=True)
+    platform = db.Column(db.String(20), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    min_price = db.Column(db.Float, nullable=False)
+    max_price = db.Column(db.Float, nullable=False)
+    last_price = db.Column(db.Float, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PriceRollup {self.product_id} {self.resolution} {self.platform} {self.bucket_start}>'
+
+class PriceWatch(db.Model):
+    __tablename__ = 'price_watches'
+    __table_args__ = (
+        # Evaluation looks up the armed watches of one product and platform
+        # whose trigger price the new price has reached: a range scan here.
+        db.Index('ix_price_watches_trigger', 'product_id', 'platform', 'active', 'trigger_price'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    platform = db.Column(db.String(20), nullable=False)
+    target_price = db.Column(db.Float, nullable=True)
+    drop_percent = db.Column(db.Float, nullable=True)
+    reference_price = db.Column(db.Float, nullable=False)
+    trigger_price = db.Column(db.Float, nullable=False)
+    contact = db.Column(db.String(255), nullable=True, index=True)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    triggered_at = db.Column(db.DateTime, nullable=True)
+    triggered_price = db.Column(db.Float, nullable=True)
+    
+    def __repr__(self):
+        return f'<PriceWatch {self.product_id} {self.platform} <= {self.trigger_price}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'productId': self.product_id,
+            'platform': self.platform,
+            'targetPrice': self.target_price,
+            'dropPercent': self.drop_percent,
+            'referencePrice': self.reference_price,
+            'triggerPrice': self.trigger_price,
+            'contact': self.contact,
+            'active': self.active,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'triggeredAt': self.triggered_at.isoformat() if self.triggered_at else None,
+            'triggeredPrice': self.triggered_price
+        }
+
+class DealScore(db.Model):
+    __tablename__ = 'deal_scores'
+    __table_args__ = (
+        db.Index('ix_deal_scores_category_score', 'category', 'score'),
+    )
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
+    score = db.Column(db.Float, nullable=False, index=True)
+    low_30d = db.Column(db.Float, nullable=True)
+    median_30d = db.Column(db.Float, nullable=True)
+    effective_price = db.Column(db.Float, nullable=False)
+    platform_gap = db.Column(db.Float, nullable=False)
+    coupon_savings = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<DealScore {self.product_id}: {self.score:.1f}>'
+
+class CatalogSnapshot(db.Model):
+    __tablename__ = 'catalog_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    source = db.Column(db.String(50), nullable=False, default='manual')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    price_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CatalogSnapshot {self.name}>'
+
+class SnapshotPrice(db.Model):
+    # A product's price state (prices, coupons and what derives from them)
+    # where it changed since the previous snapshot; the key is ordered for
+    # the per-product window that reads a snapshot back.
+    __tablename__ = 'snapshot_prices'
+    __table_args__ = (
+        db.Index('ix_snapshot_prices_snapshot', 'snapshot_id'),
+    )
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('catalog_snapshots.id'), primary_key=True)
+    amazon_price = db.Column(db.Float, nullable=False)
+    flipkart_price = db.Column(db.Float, nullable=False)
+    amazon_coupon = db.Column(db.String(255), nullable=True)
+    flipkart_coupon = db.Column(db.String(255), nullable=True)
+    amazon_coupon_type = db.Column(db.String(20), nullable=True)
+    amazon_coupon_amount = db.Column(db.Float, nullable=True)
+    amazon_coupon_cap = db.Column(db.Float, nullable=True)
+    amazon_coupon_min_order = db.Column(db.Float, nullable=True)
+    flipkart_coupon_type = db.Column(db.String(20), nullable=True)
+    flipkart_coupon_amount = db.Column(db.Float, nullable=True)
+    flipkart_coupon_cap = db.Column(db.Float, nullable=True)
+    flipkart_coupon_min_order = db.Column(db.Float, nullable=True)
+    best_price = db.Column(db.Float, nullable=True)
+    best_platform = db.Column(db.String(20), nullable=True)
+    price_diff = db.Column(db.Float, nullable=True)
+    amazon_effective_price = db.Column(db.Float, nullable=True)
+    flipkart_effective_price = db.Column(db.Float, nullable=True)
+    effective_price = db.Column(db.Float, nullable=True)
+    
+    def __repr__(self):
+        return f'<SnapshotPrice {self.product_id}@{self.snapshot_id}>'
+
+class CatalogState(db.Model):
+    __tablename__ = 'catalog_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CatalogState v{self.version}>'
+
+class FacetCount(db.Model):
+    __tablename__ = 'facet_counts'
+    
+    category = db.Column(db.String(50), primary_key=True)
+    brand = db.Column(db.String(100), primary_key=True)
+    price_bucket = db.Column(db.Integer, primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<FacetCount {self.category}/{self.brand}/{self.price_bucket}: {self.product_count}>'
+
+# Tables whose rows reference a product and go with it.
+PRODUCT_DEPENDENTS = (
+    PriceRollup.__table__, PriceHistory.__table__, PriceWatch.__table__,
+    DealScore.__table__, SnapshotPrice.__table__
+)
+
+def delete_product_dependents(connection, product_ids, tables=PRODUCT_DEPENDENTS):
+    # Deleted ahead of the product rows themselves, by the bulk writers and
+    # by ORM flushes; `product_ids` is a list or a select of ids.
+    for table in tables:
+        connection.execute(db.delete(table).where(table.c.product_id.in_(product_ids)))
+
+@event.listens_for(Session, 'before_flush')
+def delete_dependents_before_flush(session, flush_context, instances):
+    # The price_history relationship cascades on its own.
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Product) and obj.id is not None]
+    if deleted:
+        tables = [table for table in PRODUCT_DEPENDENTS if table is not PriceHistory.__table__]
+        delete_product_dependents(session.connection(), deleted, tables)
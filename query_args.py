@@ -0,0 +1,70 @@
+"""Parsing of request arguments shared by the API and the command-line tools.
+
+The CLI tools pass a werkzeug MultiDict built from their options, so the same
+filters apply whichever way the catalog is read.
+"""
+from datetime import datetime
+
+from models import Product, db
+from search_index import search_filter
+
+def parse_fields(raw):
+    if not raw:
+        return list(Product.API_FIELDS)
+    
+    fields = ['id']
+    for field in raw.split(','):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in Product.API_FIELDS:
+            raise ValueError(f'Unknown field: {field}')
+        fields.append(field)
+    return fields
+
+def parse_timestamp(raw, name):
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f'Invalid {name} timestamp: {raw}')
+
+def product_filters(args):
+    # Filter clauses shared by the listing and facet endpoints, keyed by the
+    # facet they belong to so a facet can leave its own filter out.
+    category = args.get('category')
+    search = args.get('search', '').strip()
+    min_price = args.get('min_price', type=float)
+    max_price = args.get('max_price', type=float)
+    min_effective_price = args.get('min_effective_price', type=float)
+    max_effective_price = args.get('max_effective_price', type=float)
+    brands = args.getlist('brands')
+    
+    filters = {}
+    if category and category != 'All':
+        filters['category'] = Product.category == category
+    
+    if search:
+        filters['search'] = search_filter(search)
+    
+    if brands:
+        filters['brands'] = Product.brand.in_(brands)
+    
+    price = []
+    if min_price is not None:
+        price.append(Product.best_price >= min_price)
+    if max_price is not None:
+        price.append(Product.best_price <= max_price)
+    if price:
+        filters['price'] = db.and_(*price)
+    
+    effective_price = []
+    if min_effective_price is not None:
+        effective_price.append(Product.effective_price >= min_effective_price)
+    if max_effective_price is not None:
+        effective_price.append(Product.effective_price <= max_effective_price)
+    if effective_price:
+        filters['effective_price'] = db.and_(*effective_price)
+    
+    return filters
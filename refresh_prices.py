@@ -0,0 +1,250 @@
+"""Refresh marketplace prices for every product.
+
+Products are walked in id order, one batch at a time. Within a batch the
+fetches run concurrently on asyncio (the blocking scrapers run in worker
+threads) under a concurrency cap and a token-bucket rate limit. Each batch is
+then written in a single transaction: one bulk UPDATE of the changed products
+and one bulk INSERT of their PriceHistory rows (plus rollups). After every commit the last
+processed product id is saved to a checkpoint file, so an interrupted run
+resumes where it stopped. Price-drop watches on the changed products are
+evaluated in the same transaction and their alerts sent after the commit.
+Deal scores are recomputed once the whole catalog has been walked. A fresh
+(not resumed) run first takes a catalog snapshot to roll back to (snapshots.py).
+
+  python refresh_prices.py --concurrency 8 --rate 4 --batch-size 200
+  python refresh_prices.py --restart      # ignore an existing checkpoint
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from app import create_app
+from models import db, Product, COUPON_COLUMNS, derived_price_fields
+from coupons import stored_coupon
+from catalog import bump_catalog_version
+from facets import apply_facet_deltas, product_change_deltas
+from history import record_price_history
+from alerts import alert_dispatcher, fire_watches
+from deals import recompute_deals
+from snapshots import take_snapshot
+from scraper import PriceComparisonScraper, shared_http_cache, tier_stats
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def save_checkpoint(path, last_id, totals):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump({'last_id': last_id, 'saved_at': datetime.utcnow().isoformat(), **totals}, fh)
+    os.replace(tmp_path, path)
+
+
+def next_batch(after_id, batch_size):
+    return db.session.execute(
+        db.select(
+            Product.id, Product.category, Product.brand,
+            Product.amazon_url, Product.flipkart_url, Product.amazon_price, Product.flipkart_price,
+            *[getattr(Product, column) for column in COUPON_COLUMNS]
+        )
+        .where(Product.id > after_id)
+        .order_by(Product.id)
+        .limit(batch_size)
+    ).all()
+
+
+async def fetch_batch(scraper, rows, limiter, semaphore):
+    async def fetch(row):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                return await asyncio.to_thread(scraper.get_price_comparison, row.amazon_url, row.flipkart_url)
+            except Exception as e:
+                print(f"Failed fetching product {row.id}: {e}")
+                return None
+
+    return await asyncio.gather(*(fetch(row) for row in rows))
+
+
+def diff_batch(rows, results):
+    changes = []
+    failed = 0
+    for row, result in zip(rows, results):
+        if result is None:
+            failed += 1
+            continue
+
+        new_am = result.get('amazon_price')
+        new_fk = result.get('flipkart_price')
+        new_am = row.amazon_price if new_am is None else new_am
+        new_fk = row.flipkart_price if new_fk is None else new_fk
+
+        if new_am != row.amazon_price or new_fk != row.flipkart_price:
+            changes.append({'id': row.id, 'amazon_price': new_am, 'flipkart_price': new_fk})
+    return changes, failed
+
+
+def write_batch(rows, changes):
+    if not changes:
+        return []
+
+    now = datetime.utcnow()
+    by_id = {row.id: row for row in rows}
+    facet_changes = []
+    for change in changes:
+        row = by_id[change['id']]
+        old = {'category': row.category, 'brand': row.brand,
+               'amazon_price': row.amazon_price, 'flipkart_price': row.flipkart_price}
+        facet_changes.append((old, dict(old, amazon_price=change['amazon_price'], flipkart_price=change['flipkart_price'])))
+
+    # Effective prices follow the new prices through the stored coupons.
+    db.session.execute(
+        db.update(Product),
+        [
+            dict(change, updated_at=now, **derived_price_fields(
+                change['amazon_price'], change['flipkart_price'],
+                stored_coupon(by_id[change['id']]._mapping, 'amazon'),
+                stored_coupon(by_id[change['id']]._mapping, 'flipkart')
+            ))
+            for change in changes
+        ]
+    )
+    connection = db.session.connection()
+    record_price_history(
+        connection,
+        [
+            {
+                'product_id': change['id'],
+                'amazon_price': change['amazon_price'],
+                'flipkart_price': change['flipkart_price'],
+                'recorded_at': now
+            }
+            for change in changes
+        ],
+        source='scraper'
+    )
+    apply_facet_deltas(connection, product_change_deltas(facet_changes))
+    bump_catalog_version()
+    return fire_watches(connection, [change['id'] for change in changes])
+
+
+async def refresh_prices(checkpoint_path, batch_size=200, concurrency=8, rate=4.0, restart=False):
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    last_id = checkpoint.get('last_id', 0)
+    totals = {key: checkpoint.get(key, 0) for key in ('processed', 'updated', 'failed', 'alerts')}
+    if last_id:
+        print(f"Resuming after product {last_id} ({totals['processed']} already processed)")
+    else:
+        # A resumed run keeps the snapshot its first part took.
+        take_snapshot(db.session.connection(), source='refresh')
+        db.session.commit()
+
+    scraper = PriceComparisonScraper(max_workers=concurrency)
+    limiter = RateLimiter(rate, burst=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    resumed_from = totals['processed']
+
+    try:
+        while True:
+            rows = next_batch(last_id, batch_size)
+            db.session.rollback()  # release the read snapshot while fetching
+            if not rows:
+                break
+
+            results = await fetch_batch(scraper, rows, limiter, semaphore)
+            changes, failed = diff_batch(rows, results)
+
+            notifications = write_batch(rows, changes)
+            db.session.commit()
+            alert_dispatcher.send(notifications)
+
+            last_id = rows[-1].id
+            totals['processed'] += len(rows)
+            totals['updated'] += len(changes)
+            totals['failed'] += failed
+            totals['alerts'] += len(notifications)
+            save_checkpoint(checkpoint_path, last_id, totals)
+
+            elapsed = time.perf_counter() - started
+            rate_done = (totals['processed'] - resumed_from) / elapsed
+            print(f"Processed {totals['processed']} products ({rate_done:.1f}/s), "
+                  f"updated={totals['updated']}, failed={totals['failed']}, alerts={totals['alerts']}, checkpoint={last_id}")
+    finally:
+        scraper.close()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    deals = recompute_deals(db.session.connection())
+    bump_catalog_version()
+    db.session.commit()
+
+    print(f"Done. processed={totals['processed']}, updated={totals['updated']}, "
+          f"failed={totals['failed']}, alerts={totals['alerts']}, deals={deals}")
+    print(tier_stats.report())
+    cache = shared_http_cache()
+    if cache is not None:
+        print(cache.report())
+    return totals
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Refresh product prices from Amazon and Flipkart')
+    p.add_argument('--batch-size', type=int, default=200, help='Products fetched and committed per batch (default 200)')
+    p.add_argument('--concurrency', type=int, default=8, help='Products fetched at the same time (default 8)')
+    p.add_argument('--rate', type=float, default=4.0, help='Max products started per second, 0 for unlimited (default 4)')
+    p.add_argument('--checkpoint', help='Checkpoint file (default: refresh_checkpoint.json in the instance folder)')
+    p.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first product')
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+
+    with app.app_context():
+        checkpoint_path = args.checkpoint or os.path.join(app.instance_path, 'refresh_checkpoint.json')
+        asyncio.run(refresh_prices(
+            checkpoint_path,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            restart=args.restart
+        ))
+
+
+if __name__ == '__main__':
+    main()
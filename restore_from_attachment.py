@@ -0,0 +1,344 @@
+"""Restore product prices, URLs and brands from a CSV attachment.
+
+Each row is resolved to a product by, in order: its pair of listing URLs, its
+Amazon URL, its Flipkart URL, its name (case-insensitive), and the closest
+name the catalog matcher finds (see matching.py). The catalog is read once
+into hash maps of listing keys, canonical URLs and case-folded names, so
+resolving costs a few dict lookups per row instead of up to four queries on
+unindexed columns. The matcher is built from the same rows, only when some
+rows are left over.
+
+Changes are applied in one transaction: a bulk UPDATE of the changed
+products, a bulk INSERT of their price history and, with --sync, a bulk
+INSERT of the unmatched rows (those with both prices; the rest are reported
+and skipped) and a DELETE of the products no row matched.
+A catalog snapshot is taken first, and facet counts, watches, deal scores and
+the catalog version follow, as in the importer. Without --yes nothing is
+written.
+
+  python restore_from_attachment.py -f restore.csv               # dry run
+  python restore_from_attachment.py -f restore.csv --yes         # apply
+  python restore_from_attachment.py -f restore.csv --sync --yes  # also create and delete
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from app import create_app
+from models import db, Product, COUPON_COLUMNS, canonical_url, delete_product_dependents, derived_price_fields, make_listing_key
+from coupons import stored_coupon
+from catalog import bump_catalog_version
+from facets import FACET_COLUMNS, apply_facet_deltas, product_change_deltas
+from history import record_price_history
+from alerts import alert_dispatcher, fire_watches
+from deals import recompute_deals
+from snapshots import take_snapshot
+from import_csv import chunked, extract_brand
+from matching import CatalogMatcher
+
+BATCH_SIZE = 5000
+
+UPDATE_COLUMNS = ('amazon_price', 'flipkart_price', 'amazon_url', 'flipkart_url', 'brand')
+
+
+def parse_price(value):
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+
+
+def field(row, *names):
+    for name in names:
+        if row.get(name):
+            return row[name].strip()
+    return ''
+
+
+def read_rows(path):
+    # Attachments come with the feed's headers or lower-case ones.
+    with open(path, 'r', encoding='utf-8', newline='') as fh:
+        return [
+            {
+                'category': field(row, 'Category', 'category'),
+                'product_name': field(row, 'Product_Name', 'Product Name', 'product_name'),
+                'brand': field(row, 'Brand', 'brand'),
+                'amazon_price': parse_price(row.get('Amazon_Price') or row.get('amazon_price')),
+                'amazon_url': field(row, 'Amazon_URL', 'amazon_url'),
+                'flipkart_price': parse_price(row.get('Flipkart_Price') or row.get('flipkart_price')),
+                'flipkart_url': field(row, 'Flipkart_URL', 'flipkart_url'),
+            }
+            for row in csv.DictReader(fh)
+        ]
+
+
+def name_key(name):
+    return ' '.join(name.casefold().split())
+
+
+class CatalogIndex:
+    # Lookups for resolving attachment rows; where several products share a
+    # URL or name the lowest id wins.
+
+    def __init__(self, connection, chunk_size=BATCH_SIZE):
+        products = Product.__table__
+        columns = ['id', 'category', 'product_name', *UPDATE_COLUMNS, 'listing_key', *COUPON_COLUMNS]
+        result = connection.execute(
+            db.select(*[products.c[column] for column in columns]).order_by(products.c.id),
+            execution_options={'yield_per': chunk_size}
+        )
+        self.products = {}
+        self.by_amazon_url = {}
+        self.by_flipkart_url = {}
+        self.by_name = {}
+        self.by_listing_key = {}
+        self.matcher = None
+        for partition in result.partitions():
+            for row in partition:
+                self.products[row.id] = row
+                if row.amazon_url:
+                    self.by_amazon_url.setdefault(canonical_url(row.amazon_url), row.id)
+                if row.flipkart_url:
+                    self.by_flipkart_url.setdefault(canonical_url(row.flipkart_url), row.id)
+                self.by_name.setdefault(name_key(row.product_name), row.id)
+                if row.listing_key:
+                    self.by_listing_key[row.listing_key] = row.id
+
+    def closest(self, row):
+        # The product the catalog matcher pairs the row's name with, if any.
+        if self.matcher is None:
+            self.matcher = CatalogMatcher().add_many(
+                (product_id, product.product_name, product.brand) for product_id, product in self.products.items()
+            )
+        found = self.matcher.match(row['product_name'], row['brand'] or None)
+        return found.product_id if found else None
+
+    def resolve(self, row):
+        # A listing shares one marketplace URL with its variants, so the pair
+        # is tried before either URL alone.
+        if row['amazon_url'] or row['flipkart_url']:
+            found = self.by_listing_key.get(make_listing_key(row['amazon_url'], row['flipkart_url']))
+            if found is not None:
+                return found, 'listing'
+        if row['amazon_url']:
+            found = self.by_amazon_url.get(canonical_url(row['amazon_url']))
+            if found is not None:
+                return found, 'amazon_url'
+        if row['flipkart_url']:
+            found = self.by_flipkart_url.get(canonical_url(row['flipkart_url']))
+            if found is not None:
+                return found, 'flipkart_url'
+        if row['product_name']:
+            found = self.by_name.get(name_key(row['product_name']))
+            if found is not None:
+                return found, 'name'
+        return None, None
+
+    def resolve_all(self, rows):
+        resolved = [self.resolve(row) for row in rows]
+        for position, (found, _) in enumerate(resolved):
+            if found is None and rows[position]['product_name']:
+                found = self.closest(rows[position])
+                if found is not None:
+                    resolved[position] = (found, 'matcher')
+        return resolved
+
+
+def plan_restore(rows, index, sync=False):
+    resolved = index.resolve_all(rows)
+    matched_by = Counter(how or 'none' for _, how in resolved)
+    details = []
+
+    # Later rows for the same product win, as they did when applied one by one.
+    targets = {}
+    unmatched = []
+    for row, (product_id, how) in zip(rows, resolved):
+        if product_id is None:
+            unmatched.append(row)
+            details.append((row['product_name'], 'NO_MATCH'))
+        else:
+            targets[product_id] = row
+
+    updates = []
+    unchanged = conflicts = 0
+    for product_id, row in targets.items():
+        current = index.products[product_id]
+        new = {column: getattr(current, column) for column in UPDATE_COLUMNS}
+        for column in UPDATE_COLUMNS:
+            if row[column] not in (None, ''):
+                new[column] = row[column]
+        if all(new[column] == getattr(current, column) for column in UPDATE_COLUMNS):
+            unchanged += 1
+            details.append((row['product_name'], f'NOCHANGE pid={product_id}'))
+            continue
+        new['listing_key'] = make_listing_key(new['amazon_url'], new['flipkart_url'])
+        if index.by_listing_key.get(new['listing_key'], product_id) != product_id:
+            conflicts += 1
+            details.append((row['product_name'], f'CONFLICT pid={product_id}: URLs belong to another product'))
+            continue
+        updates.append((current, new))
+        details.append((row['product_name'], f'UPDATED pid={product_id}'))
+
+    creates = {}
+    deletes = []
+    incomplete = 0
+    if sync:
+        for row in unmatched:
+            # A new product needs both prices; a made-up one would win every
+            # best-price ranking and fire every watch.
+            if row['amazon_price'] is None or row['flipkart_price'] is None:
+                incomplete += 1
+                details.append((row['product_name'], 'SKIPPED: no price to create it with'))
+                continue
+            listing_key = make_listing_key(row['amazon_url'], row['flipkart_url'])
+            if listing_key not in index.by_listing_key:
+                creates[listing_key] = row
+        deletes = [product_id for product_id in index.products if product_id not in targets]
+
+    return {
+        'index': index,
+        'matched_by': matched_by,
+        'unmatched': len(unmatched),
+        'updates': updates,
+        'unchanged': unchanged,
+        'conflicts': conflicts,
+        'creates': list(creates.items()),
+        'incomplete': incomplete,
+        'deletes': deletes,
+        'details': details,
+    }
+
+
+def apply_restore(plan):
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    take_snapshot(connection, source='restore', now=now)
+    facet_changes = []
+    price_changes = []
+
+    updates = []
+    for current, new in plan['updates']:
+        fields = derived_price_fields(
+            new['amazon_price'], new['flipkart_price'],
+            stored_coupon(current._mapping, 'amazon'), stored_coupon(current._mapping, 'flipkart')
+        )
+        updates.append(dict(new, id=current.id, updated_at=now, **fields))
+        facet_changes.append(({column: getattr(current, column) for column in FACET_COLUMNS},
+                              {column: new.get(column, getattr(current, column)) for column in FACET_COLUMNS}))
+        if (new['amazon_price'], new['flipkart_price']) != (current.amazon_price, current.flipkart_price):
+            price_changes.append({'product_id': current.id, 'amazon_price': new['amazon_price'],
+                                  'flipkart_price': new['flipkart_price'], 'recorded_at': now})
+    if updates:
+        db.session.execute(db.update(Product), updates)
+    record_price_history(connection, price_changes, source='restore_attachment')
+
+    creates = []
+    for listing_key, row in plan['creates']:
+        amazon_price, flipkart_price = row['amazon_price'], row['flipkart_price']
+        creates.append({
+            'category': row['category'] or 'Uncategorized',
+            'product_name': row['product_name'],
+            'brand': row['brand'] or extract_brand(row['product_name']),
+            'amazon_price': amazon_price,
+            'amazon_url': row['amazon_url'],
+            'flipkart_price': flipkart_price,
+            'flipkart_url': row['flipkart_url'],
+            'listing_key': listing_key,
+            'created_at': now,
+            'updated_at': now,
+            **derived_price_fields(amazon_price, flipkart_price)
+        })
+        facet_changes.append((None, creates[-1]))
+    if creates:
+        db.session.execute(db.insert(Product), creates)
+
+    products = Product.__table__
+    removed = 0
+    for chunk in chunked(plan['deletes'], BATCH_SIZE):
+        delete_product_dependents(connection, chunk)
+        removed += connection.execute(db.delete(products).where(products.c.id.in_(chunk))).rowcount
+    facet_changes.extend(
+        ({column: getattr(row, column) for column in FACET_COLUMNS}, None)
+        for row in map(plan['index'].products.get, plan['deletes'])
+    )
+
+    alerts = []
+    for chunk in chunked([change['product_id'] for change in price_changes], BATCH_SIZE):
+        alerts.extend(fire_watches(connection, chunk))
+
+    if updates or creates or removed:
+        apply_facet_deltas(connection, product_change_deltas(facet_changes))
+        recompute_deals(connection)
+        bump_catalog_version()
+
+    return {'updated': len(updates), 'created': len(creates), 'removed': removed,
+            'price_changes': len(price_changes), 'alerts': alerts}
+
+
+def restore_from_file(file_path, commit=False, sync=False):
+    app = create_app()
+
+    with app.app_context():
+        started = time.perf_counter()
+        rows = read_rows(file_path)
+        read = time.perf_counter()
+        index = CatalogIndex(db.session.connection())
+        loaded = time.perf_counter()
+        plan = plan_restore(rows, index, sync=sync)
+        resolved = time.perf_counter()
+
+        print(f"📚 Read {len(rows)} rows in {read - started:.2f}s, indexed {len(index.products)} products in {loaded - read:.2f}s, "
+              f"resolved {len(rows)} rows in {resolved - loaded:.2f}s "
+              f"({len(rows) / max(resolved - loaded, 1e-9):,.0f} rows/s)")
+        print(f"   matched by: " + ', '.join(f"{how}={count}" for how, count in sorted(plan['matched_by'].items())))
+        print(f"   updates={len(plan['updates'])} unchanged={plan['unchanged']} "
+              f"conflicts={plan['conflicts']} no_match={plan['unmatched']}")
+        if sync:
+            print(f"   creates={len(plan['creates'])} deletes={len(plan['deletes'])} "
+                  f"skipped_without_price={plan['incomplete']}")
+            if plan['deletes']:
+                print(f"   sample deletions: {[(pid, index.products[pid].product_name) for pid in plan['deletes'][:10]]}")
+        for name, outcome in plan['details'][:20]:
+            print(f"   {name} -> {outcome}")
+
+        if not commit:
+            db.session.rollback()
+            print("🔍 Dry run: nothing written (pass --yes to apply)")
+            return plan
+
+        try:
+            stats = apply_restore(plan)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        alert_dispatcher.send(stats['alerts'])
+
+        elapsed = time.perf_counter() - resolved
+        written = stats['updated'] + stats['created'] + stats['removed']
+        print(f"✅ Applied {written} changes in {elapsed:.2f}s ({written / max(elapsed, 1e-9):,.0f} rows/s)")
+        print(f"   updated={stats['updated']} created={stats['created']} removed={stats['removed']} "
+              f"price_changes={stats['price_changes']} alerts={len(stats['alerts'])}")
+        return plan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Restore/update existing products from a CSV attachment')
+    parser.add_argument('--file', '-f', required=True, help='Path to CSV file')
+    parser.add_argument('--yes', action='store_true', help='Apply changes (without --yes the script runs a dry-run)')
+    parser.add_argument('--sync', action='store_true',
+                        help='Synchronize the catalog with the CSV: create missing, update existing, delete extras')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ CSV file not found: {args.file}")
+        sys.exit(2)
+
+    print("📥 Applying changes from" if args.yes else "📥 Dry run of", args.file)
+    restore_from_file(args.file, commit=args.yes, sync=args.sync)
@@ -1,57 +1,108 @@
-from flask import Blueprint, request, jsonify
-from models import Product, PriceHistory, db
+import base64
+import json
+from flask import Blueprint, request, jsonify, stream_with_context
+from models import PLATFORMS, Product, PriceHistory, PriceWatch, db
+from search_index import ranked_product_ids
+from query_args import parse_fields, parse_timestamp, product_filters
+from cache import cached_catalog_response
+from facets import PRICE_BUCKETS, bucket_upper, facet_counts, live_facet_counts
+from history import DEFAULT_CHART_POINTS, MAX_CHART_POINTS, price_series
+from alerts import alert_dispatcher, fire_watches, trigger_price
+from serialization import json_array_response, product_columns, rows_to_dicts
+from export import EXPORT_TYPES, FORMATS, export_chunks, export_query
+from deals import DEAL_FIELDS, DEAL_TOP_K, top_deals
+
+DEFAULT_PAGE_SIZE = 48
+MAX_PAGE_SIZE = 200
+
+COMPARE_FIELDS = [
+    'id', 'category', 'productName', 'brand',
+    'amazonPrice', 'amazonUrl', 'amazonCoupon', 'amazonEffectivePrice',
+    'flipkartPrice', 'flipkartUrl', 'flipkartCoupon', 'flipkartEffectivePrice',
+    'priceDifference', 'bestPrice', 'bestPlatform', 'effectivePrice'
+]
+SEARCH_FIELDS = ['id', 'productName', 'brand', 'category', 'bestPrice']
+DEAL_PRODUCT_FIELDS = [
+    'id', 'category', 'productName', 'brand',
+    'amazonPrice', 'amazonCoupon', 'flipkartPrice', 'flipkartCoupon',
+    'bestPrice', 'bestPlatform'
+]
+
+# Each sort mode is a list of order-by expressions plus a direction. Product.id is
+# appended as a tiebreaker so every ordering is total and can be resumed from a cursor.
+SORT_KEYS = {
+    'name': ([Product.product_name], False),
+    'brand': ([db.func.coalesce(Product.brand, ''), Product.product_name], False),
+    'amazon-low': ([Product.amazon_price], False),
+    'amazon-high': ([Product.amazon_price], True),
+    'flipkart-low': ([Product.flipkart_price], False),
+    'flipkart-high': ([Product.flipkart_price], True),
+    'price-diff': ([Product.price_diff], True),
+    'best-low': ([Product.best_price], False),
+    'best-high': ([Product.best_price], True),
+    'effective-low': ([Product.effective_price], False),
+    'effective-high': ([Product.effective_price], True),
+}
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+def decode_cursor(raw):
+    if not raw:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(raw.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or not all(
+        value is None or isinstance(value, (str, int, float)) for value in values
+    ):
+        raise ValueError('Invalid cursor')
+    return values
 
 def register_routes(app):
     api_bp = Blueprint('api', __name__, url_prefix='/api')
     
     @api_bp.route('/products', methods=['GET'])
+    @cached_catalog_response
     def get_products():
         try:
-            category = request.args.get('category')
-            search = request.args.get('search', '').strip()
             sort_by = request.args.get('sort', 'name')
-            min_price = request.args.get('min_price', type=float)
-            max_price = request.args.get('max_price', type=float)
-            brands = request.args.getlist('brands')
+            limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
             
-            query = Product.query
+            try:
+                fields = parse_fields(request.args.get('fields', ''))
+                cursor = decode_cursor(request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            if category and category != 'All':
-                query = query.filter(Product.category == category)
+            sort_exprs, descending = SORT_KEYS.get(sort_by, SORT_KEYS['name'])
+            sort_exprs = sort_exprs + [Product.id]
             
-            if search:
-                query = query.filter(Product.product_name.ilike(f'%{search}%'))
+            columns = product_columns(fields)
+            keys = [expr.label(f'_k{i}') for i, expr in enumerate(sort_exprs)]
+            query = db.session.query(*columns, *keys).filter(*product_filters(request.args).values())
             
-            if brands:
-                query = query.filter(Product.brand.in_(brands))
+            total = query.order_by(None).count() if request.args.get('total') and cursor is None else None
             
-            if min_price is not None:
-                query = query.filter(
-                    db.or_(Product.amazon_price >= min_price, Product.flipkart_price >= min_price)
-                )
+            if cursor is not None:
+                if len(cursor) != len(sort_exprs):
+                    return jsonify({'error': 'Cursor does not match sort order'}), 400
+                if descending:
+                    query = query.filter(db.tuple_(*sort_exprs) < db.tuple_(*cursor))
+                else:
+                    query = query.filter(db.tuple_(*sort_exprs) > db.tuple_(*cursor))
             
-            if max_price is not None:
-                query = query.filter(
-                    db.or_(Product.amazon_price <= max_price, Product.flipkart_price <= max_price)
-                )
+            query = query.order_by(*[expr.desc() if descending else expr for expr in sort_exprs])
+            rows = query.limit(limit + 1).all()
             
-            if sort_by == 'name':
-                query = query.order_by(Product.product_name)
-            elif sort_by == 'brand':
-                query = query.order_by(Product.brand, Product.product_name)
-            elif sort_by == 'amazon-low':
-                query = query.order_by(Product.amazon_price)
-            elif sort_by == 'amazon-high':
-                query = query.order_by(Product.amazon_price.desc())
-            elif sort_by == 'flipkart-low':
-                query = query.order_by(Product.flipkart_price)
-            elif sort_by == 'flipkart-high':
-                query = query.order_by(Product.flipkart_price.desc())
-            elif sort_by == 'price-diff':
-                query = query.order_by((Product.amazon_price - Product.flipkart_price).desc())
-            
-            products = query.all()
-            return jsonify([product.to_dict() for product in products])
+            page = rows[:limit]
+            response = json_array_response(rows_to_dicts(fields, page))
+            if len(rows) > limit:
+                response.headers['X-Next-Cursor'] = encode_cursor(page[-1][len(fields):])
+            if total is not None:
+                response.headers['X-Total-Count'] = str(total)
+            return response
         
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -59,12 +110,67 @@ def register_routes(app):
     @api_bp.route('/products/<int:product_id>', methods=['GET'])
     def get_product(product_id):
         try:
-            product = Product.query.get_or_404(product_id)
-            return jsonify(product.to_dict())
+            fields = list(Product.API_FIELDS)
+            row = db.session.execute(
+                db.select(*product_columns(fields)).where(Product.id == product_id)
+            ).first()
+            if row is None:
+                return jsonify({'error': 'Product not found'}), 404
+            return jsonify(dict(zip(fields, row)))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @api_bp.route('/products/<int:product_id>/history', methods=['GET'])
+    @cached_catalog_response
+    def get_product_history(product_id):
+        try:
+            points = min(max(request.args.get('points', DEFAULT_CHART_POINTS, type=int), 2), MAX_CHART_POINTS)
+            try:
+                start = parse_timestamp(request.args.get('from'), 'from')
+                end = parse_timestamp(request.args.get('to'), 'to')
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            if db.session.get(Product, product_id) is None:
+                return jsonify({'error': 'Product not found'}), 404
+            
+            resolution, series = price_series(product_id, start, end, points)
+            return jsonify({
+                'productId': product_id,
+                'resolution': resolution,
+                'from': start,
+                'to': end,
+                'series': series
+            })
+        
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @api_bp.route('/export', methods=['GET'])
+    def export_catalog():
+        try:
+            export_format = request.args.get('format', 'ndjson')
+            export_type = request.args.get('type', 'products')
+            if export_format not in FORMATS:
+                return jsonify({'error': f'format must be one of: {", ".join(FORMATS)}'}), 400
+            if export_type not in EXPORT_TYPES:
+                return jsonify({'error': f'type must be one of: {", ".join(EXPORT_TYPES)}'}), 400
+            try:
+                fields, query = export_query(export_type, request.args, request.args.get('fields', ''))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return app.response_class(
+                stream_with_context(export_chunks(export_format, fields, query)),
+                mimetype=FORMATS[export_format],
+                headers={'Content-Disposition': f'attachment; filename={export_type}.{export_format}'}
+            )
+        
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
     @api_bp.route('/brands', methods=['GET'])
+    @cached_catalog_response
     def get_brands():
         try:
             category = request.args.get('category')
@@ -80,6 +186,7 @@ def register_routes(app):
             return jsonify({'error': str(e)}), 500
     
     @api_bp.route('/categories', methods=['GET'])
+    @cached_catalog_response
     def get_categories():
         try:
             categories = db.session.query(Product.category).distinct().all()
@@ -88,6 +195,45 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @api_bp.route('/facets', methods=['GET'])
+    @cached_catalog_response
+    def get_facets():
+        try:
+            category = request.args.get('category')
+            category = category if category and category != 'All' else None
+            search = request.args.get('search', '').strip()
+            
+            filters = product_filters(request.args)
+            counts = None
+            # The aggregates are bucketed by best price; other filters need live counts.
+            if not search and 'effective_price' not in filters:
+                counts = facet_counts(
+                    category=category,
+                    brands=request.args.getlist('brands'),
+                    min_price=request.args.get('min_price', type=float),
+                    max_price=request.args.get('max_price', type=float)
+                )
+            if counts is None:
+                counts = live_facet_counts(filters)
+            
+            return jsonify({
+                'categories': [
+                    {'value': value, 'count': count} for value, count in sorted(counts['categories'].items())
+                ],
+                'brands': [
+                    {'value': value, 'count': count}
+                    for value, count in sorted(counts['brands'].items(), key=lambda item: item[0].lower())
+                    if value
+                ],
+                'priceRanges': [
+                    {'min': bucket, 'max': bucket_upper(bucket), 'count': counts['prices'][bucket]}
+                    for bucket in PRICE_BUCKETS if counts['prices'].get(bucket)
+                ]
+            })
+        
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
     @api_bp.route('/compare', methods=['POST'])
     def compare_products():
         try:
@@ -97,35 +243,123 @@ def register_routes(app):
             if len(product_ids) < 2 or len(product_ids) > 4:
                 return jsonify({'error': 'Please select 2-4 products to compare'}), 400
             
-            products = Product.query.filter(Product.id.in_(product_ids)).all()
+            rows = db.session.execute(
+                db.select(*product_columns(COMPARE_FIELDS)).where(Product.id.in_(product_ids))
+            ).all()
             
-            if len(products) != len(product_ids):
+            if len(rows) != len(product_ids):
                 return jsonify({'error': 'Some products not found'}), 404
             
-            comparison_data = []
-            for product in products:
-                comparison_data.append({
-                    'id': product.id,
-                    'category': product.category,
-                    'productName': product.product_name,
-                    'brand': product.brand,
-                    'amazonPrice': product.amazon_price,
-                    'amazonUrl': product.amazon_url,
-                    'amazonCoupon': product.amazon_coupon,
-                    'flipkartPrice': product.flipkart_price,
-                    'flipkartUrl': product.flipkart_url,
-                    'flipkartCoupon': product.flipkart_coupon,
-                    'priceDifference': abs(product.amazon_price - product.flipkart_price),
-                    'bestPrice': min(product.amazon_price, product.flipkart_price),
-                    'bestPlatform': 'Amazon' if product.amazon_price < product.flipkart_price else 'Flipkart'
-                })
-            
-            return jsonify(comparison_data)
+            return json_array_response(rows_to_dicts(COMPARE_FIELDS, rows))
+        
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @api_bp.route('/deals', methods=['GET'])
+    @cached_catalog_response
+    def get_deals():
+        try:
+            category = request.args.get('category')
+            category = category if category and category != 'All' else None
+            limit = min(max(request.args.get('limit', 20, type=int), 1), DEAL_TOP_K)
+            
+            rows = top_deals(product_columns(DEAL_PRODUCT_FIELDS), category=category, limit=limit)
+            return json_array_response(rows_to_dicts(DEAL_PRODUCT_FIELDS + list(DEAL_FIELDS), rows))
+        
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @api_bp.route('/watches', methods=['POST'])
+    def create_watch():
+        try:
+            data = request.get_json() or {}
+            platform = data.get('platform')
+            target_price = data.get('targetPrice')
+            drop_percent = data.get('dropPercent')
+            
+            if platform not in PLATFORMS:
+                return jsonify({'error': f'platform must be one of: {", ".join(PLATFORMS)}'}), 400
+            if (target_price is None) == (drop_percent is None):
+                return jsonify({'error': 'Give either targetPrice or dropPercent'}), 400
+            if target_price is not None and (not isinstance(target_price, (int, float)) or target_price <= 0):
+                return jsonify({'error': 'targetPrice must be a positive number'}), 400
+            if drop_percent is not None and (not isinstance(drop_percent, (int, float)) or not 0 < drop_percent < 100):
+                return jsonify({'error': 'dropPercent must be between 0 and 100'}), 400
+            
+            product = db.session.get(Product, data.get('productId'))
+            if product is None:
+                return jsonify({'error': 'Product not found'}), 404
+            
+            reference_price = getattr(product, f'{platform}_price')
+            watch = PriceWatch(
+                product_id=product.id,
+                platform=platform,
+                target_price=target_price,
+                drop_percent=drop_percent,
+                reference_price=reference_price,
+                trigger_price=trigger_price(reference_price, target_price, drop_percent),
+                contact=data.get('contact')
+            )
+            db.session.add(watch)
+            db.session.flush()
+            # A target the price already meets fires right away.
+            notifications = fire_watches(db.session.connection(), [product.id])
+            db.session.commit()
+            alert_dispatcher.send(notifications)
+            
+            return jsonify(watch.to_dict()), 201
+        
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+    
+    @api_bp.route('/watches', methods=['GET'])
+    def get_watches():
+        try:
+            limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+            try:
+                cursor = decode_cursor(request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            query = PriceWatch.query
+            product_id = request.args.get('productId', type=int)
+            if product_id is not None:
+                query = query.filter(PriceWatch.product_id == product_id)
+            contact = request.args.get('contact')
+            if contact:
+                query = query.filter(PriceWatch.contact == contact)
+            active = request.args.get('active')
+            if active in ('true', 'false'):
+                query = query.filter(PriceWatch.active == (active == 'true'))
+            if cursor:
+                query = query.filter(PriceWatch.id > cursor[0])
+            
+            watches = query.order_by(PriceWatch.id).limit(limit + 1).all()
+            response = jsonify([watch.to_dict() for watch in watches[:limit]])
+            if len(watches) > limit:
+                response.headers['X-Next-Cursor'] = encode_cursor([watches[limit - 1].id])
+            return response
+        
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @api_bp.route('/watches/<int:watch_id>', methods=['DELETE'])
+    def delete_watch(watch_id):
+        try:
+            watch = db.session.get(PriceWatch, watch_id)
+            if watch is None:
+                return jsonify({'error': 'Watch not found'}), 404
+            db.session.delete(watch)
+            db.session.commit()
+            return jsonify({'id': watch_id, 'deleted': True})
         
         except Exception as e:
+            db.session.rollback()
             return jsonify({'error': str(e)}), 500
     
     @api_bp.route('/search', methods=['GET'])
+    @cached_catalog_response
     def search_products():
         try:
             search_term = request.args.get('q', '').strip()
@@ -133,24 +367,14 @@ def register_routes(app):
             if not search_term:
                 return jsonify([])
             
-            products = Product.query.filter(
-                db.or_(
-                    Product.product_name.ilike(f'%{search_term}%'),
-                    Product.brand.ilike(f'%{search_term}%')
-                )
-            ).limit(20).all()
-            
-            results = []
-            for product in products:
-                results.append({
-                    'id': product.id,
-                    'productName': product.product_name,
-                    'brand': product.brand,
-                    'category': product.category,
-                    'bestPrice': min(product.amazon_price, product.flipkart_price)
-                })
-            
-            return jsonify(results)
+            product_ids = ranked_product_ids(search_term, limit=20)
+            rank = {product_id: position for position, product_id in enumerate(product_ids)}
+            rows = db.session.execute(
+                db.select(*product_columns(SEARCH_FIELDS)).where(Product.id.in_(product_ids))
+            ).all()
+            rows.sort(key=lambda row: rank[row[0]])
+            
+            return json_array_response(rows_to_dicts(SEARCH_FIELDS, rows))
         
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -0,0 +1,178 @@
+"""Concurrency primitives for the scrapers.
+
+`ResourcePool` hands out long-lived, expensive resources (Selenium drivers,
+HTTP sessions) to worker threads, `HostLimiter` caps in-flight requests per
+host, and `ScrapeEngine` fans a batch of fetches out over a thread pool while
+respecting both. `TierStats` counts hits and latency per fetch tier.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class ResourcePool:
+    def __init__(self, factory: Callable, size: int = 2, close: Optional[Callable] = None):
+        self.factory = factory
+        self.size = size
+        self.close_resource = close
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _checkout(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+
+            if create:
+                try:
+                    resource = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._all.append(resource)
+                return resource
+
+            # Pool is at capacity; wait for a release, re-checking capacity in
+            # case a broken resource was discarded meanwhile.
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _discard(self, resource):
+        with self._lock:
+            self._created -= 1
+            if resource in self._all:
+                self._all.remove(resource)
+        self._close(resource)
+
+    def _close(self, resource):
+        if self.close_resource:
+            try:
+                self.close_resource(resource)
+            except Exception as e:
+                logger.warning(f"Error closing pooled resource: {e}")
+
+    @contextmanager
+    def acquire(self):
+        resource = self._checkout()
+        try:
+            yield resource
+        except Exception:
+            # A resource that raised (crashed driver, broken session) is not
+            # trusted again; the next checkout creates a fresh one.
+            self._discard(resource)
+            raise
+        else:
+            self._idle.put(resource)
+
+    def close(self):
+        with self._lock:
+            resources, self._all = self._all, []
+            self._created = 0
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        for resource in resources:
+            self._close(resource)
+
+
+class HostLimiter:
+    def __init__(self, default_limit: int = 2, limits: Optional[Dict[str, int]] = None):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host: str):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.limits.get(host, self.default_limit))
+            return self._semaphores[host]
+
+    @contextmanager
+    def limit(self, url: str):
+        semaphore = self._semaphore(urlsplit(url).netloc.lower())
+        with semaphore:
+            yield
+
+
+class TierStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiers = {}
+
+    def record(self, tier: str, hit: bool, seconds: float):
+        with self._lock:
+            stats = self.tiers.setdefault(tier, {'attempts': 0, 'hits': 0, 'seconds': 0.0})
+            stats['attempts'] += 1
+            stats['hits'] += int(hit)
+            stats['seconds'] += seconds
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                tier: dict(stats, avg_ms=round(stats['seconds'] * 1000 / stats['attempts'], 1) if stats['attempts'] else 0.0)
+                for tier, stats in self.tiers.items()
+            }
+
+    def report(self) -> str:
+        lines = []
+        for tier, stats in self.snapshot().items():
+            lines.append(f"{tier}: {stats['hits']}/{stats['attempts']} hits, avg {stats['avg_ms']} ms")
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.tiers = {}
+
+
+class ScrapeEngine:
+    def __init__(self, max_workers: int = 4, per_host_limit: int = 2, host_limits: Optional[Dict[str, int]] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape')
+        self.limiter = HostLimiter(per_host_limit, host_limits)
+        self.stats = {'requests': 0, 'errors': 0, 'seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _run(self, fetch: Callable, url: str):
+        started = time.perf_counter()
+        error = False
+        try:
+            with self.limiter.limit(url):
+                return fetch(url)
+        except Exception as e:
+            error = True
+            logger.error(f"Error fetching {url}: {e}")
+            return None
+        finally:
+            with self._stats_lock:
+                self.stats['requests'] += 1
+                self.stats['errors'] += int(error)
+                self.stats['seconds'] += time.perf_counter() - started
+
+    def submit(self, fetch: Callable, url: str):
+        return self.executor.submit(self._run, fetch, url)
+
+    def map(self, fetch: Callable, urls: Iterable[str]) -> List:
+        futures = [self.submit(fetch, url) for url in urls]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -1,7 +1,8 @@
 import logging
-import time
 import re
-from typing import Optional, Dict, List
+import time
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple
 from urllib.parse import urljoin
 
 from selenium import webdriver
@@ -9,260 +10,399 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
+
+from scrape_engine import ResourcePool, ScrapeEngine, TierStats
+from http_cache import HTTPCache
+from brands import brand_matcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class AmazonScraper:
-    def __init__(self):
-        self.base_url = "https://www.amazon.in"
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-    
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Shared by every scraper unless one is handed its own instance, so the
+# static-vs-Selenium hit ratio covers the whole process.
+tier_stats = TierStats()
+
+# Default for the scrapers' `cache` argument: the shared HTTP cache. Passing
+# None instead turns caching off for that scraper.
+SHARED_CACHE = object()
+
+@lru_cache(maxsize=None)
+def shared_http_cache() -> Optional[HTTPCache]:
+    # Likewise shared, so the refresher and searches reuse each other's pages;
+    # read from the environment on first use, None when HTTP_CACHE=off.
+    return HTTPCache.from_env()
+
+def resolve_cache(cache) -> Optional[HTTPCache]:
+    return shared_http_cache() if cache is SHARED_CACHE else cache
+
+def parse_price(text: Optional[str]) -> Optional[float]:
+    if not text:
+        return None
+    price_text = text.replace('₹', '').replace(',', '').strip()
+    price_match = re.search(r'\d+(?:\.\d+)?', price_text)
+    if price_match:
+        return float(price_match.group())
+    return None
+
+def setup_driver(headless=True):
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
+
+    try:
+        driver = webdriver.Chrome(options=chrome_options)
+        logger.info("Selenium Chrome driver started")
+        return driver
+    except Exception as e:
+        logger.error(f"Failed to setup Chrome driver: {e}")
+        return None
+
+def create_driver():
+    driver = setup_driver()
+    if driver is None:
+        raise RuntimeError('Chrome driver unavailable')
+    return driver
+
+def create_driver_pool(size: int = 2) -> ResourcePool:
+    return ResourcePool(create_driver, size=size, close=lambda driver: driver.quit())
+
+def create_session(pool_maxsize: int = 10):
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-IN,en;q=0.9'
+    })
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def create_session_pool(size: int = 4) -> ResourcePool:
+    return ResourcePool(create_session, size=size, close=lambda session: session.close())
+
+class PriceScraper:
+    base_url = ''
+    platform = ''
+    price_selectors: List[str] = []
+    results_selector = ''
+
+    def __init__(self, driver_pool: Optional[ResourcePool] = None, session_pool: Optional[ResourcePool] = None,
+                 timeout: float = 10, static_first: bool = True, stats: Optional[TierStats] = None,
+                 cache=SHARED_CACHE):
+        self.headers = {'User-Agent': USER_AGENT}
+        self.timeout = timeout
+        self.static_first = static_first
+        self.stats = stats or tier_stats
+        self.cache = resolve_cache(cache)
+        self.owns_pool = driver_pool is None
+        self.owns_sessions = session_pool is None
+        # Both pools are lazy: Chrome only starts once the static tier misses.
+        # Pools created here are the scraper's to close (close() or a with
+        # block); shared ones are closed by their owner.
+        self.driver_pool = driver_pool or create_driver_pool(size=1)
+        self.session_pool = session_pool or create_session_pool(size=1)
+
     def setup_driver(self, headless=True):
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument(f'user-agent={self.headers["User-Agent"]}')
-        
+        return setup_driver(headless)
+
+    def wait_for_price(self, driver) -> Optional[float]:
+        # Poll the price selectors until one yields a number instead of
+        # sleeping a fixed time and hoping the page has rendered.
+        def find_price(d):
+            for selector in self.price_selectors:
+                for element in d.find_elements(By.CSS_SELECTOR, selector):
+                    price = parse_price(element.text) or parse_price(element.get_attribute('textContent'))
+                    if price is not None:
+                        return price
+            return False
+
         try:
-            driver = webdriver.Chrome(options=chrome_options)
-            logger.info("Selenium Chrome driver started")
-            return driver
-        except Exception as e:
-            logger.error(f"Failed to setup Chrome driver: {e}")
+            return WebDriverWait(driver, self.timeout, poll_frequency=0.2).until(find_price)
+        except TimeoutException:
             return None
-    
-    def get_product_price(self, url: str) -> Optional[float]:
-        driver = self.setup_driver()
-        if not driver:
-            return None
-        
+
+    def wait_for_results(self, driver) -> bool:
         try:
-            driver.get(url)
-            time.sleep(2)
-            
-            price_selectors = [
-                'span.a-price-whole',
-                'span.a-price span.a-offscreen',
-                '.a-price .a-offscreen'
-            ]
-            
-            for selector in price_selectors:
-                try:
-                    price_element = driver.find_element(By.CSS_SELECTOR, selector)
-                    price_text = price_element.text.replace('₹', '').replace(',', '').strip()
-                    price_match = re.search(r'(\d+)', price_text)
-                    if price_match:
-                        return float(price_match.group(1))
-                except NoSuchElementException:
-                    continue
-            
-            logger.warning(f"Could not find price for Amazon URL: {url}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error scraping Amazon price: {e}")
+            WebDriverWait(driver, self.timeout, poll_frequency=0.2).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, self.results_selector))
+            )
+            return True
+        except TimeoutException:
+            return False
+
+    def dismiss_popups(self, driver):
+        pass
+
+    def fetch_static(self, url: str) -> Optional[BeautifulSoup]:
+        with self.session_pool.acquire() as session:
+            if self.cache is not None:
+                status, content = self.cache.fetch(session, url, self.timeout)
+            else:
+                response = session.get(url, timeout=self.timeout)
+                status, content = response.status_code, response.content
+        if status != 200:
+            logger.info(f"Static fetch of {url} returned {status}")
             return None
-        finally:
-            driver.quit()
-    
-    def search_product(self, query: str, max_results: int = 5) -> List[Dict]:
-        driver = self.setup_driver()
-        if not driver:
-            return []
-        
+        return BeautifulSoup(content, HTML_PARSER)
+
+    def discard_static(self, url: str):
+        # A 200 that parses to nothing is a captcha or an interstitial; keep
+        # it out of the cache so the next fetch asks the site again.
+        if self.cache is not None:
+            self.cache.discard(url)
+
+    def find_static_price(self, soup: BeautifulSoup) -> Optional[float]:
+        for selector in self.price_selectors:
+            for element in soup.select(selector):
+                price = parse_price(element.get_text())
+                if price is not None:
+                    return price
+        return None
+
+    def get_static_price(self, url: str) -> Optional[float]:
+        started = time.perf_counter()
+        price = None
         try:
-            search_url = f"{self.base_url}/s?k={query.replace(' ', '+')}"
-            driver.get(search_url)
-            time.sleep(2)
-            
-            products = []
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            product_containers = soup.find_all('div', {'data-component-type': 's-search-result'})
-            
-            for container in product_containers[:max_results]:
-                try:
-                    title_elem = container.select_one('h2 a span')
-                    price_elem = container.select_one('span.a-price span.a-offscreen')
-                    link_elem = container.select_one('h2 a')
-                    
-                    if title_elem and price_elem and link_elem:
-                        title = title_elem.text.strip()
-                        price_text = price_elem.text.replace('₹', '').replace(',', '').strip()
-                        price = float(price_text) if price_text else 0
-                        url = urljoin(self.base_url, link_elem['href'])
-                        
-                        products.append({
-                            'title': title,
-                            'price': price,
-                            'url': url,
-                            'platform': 'Amazon'
-                        })
-                except Exception as e:
-                    logger.warning(f"Error parsing product: {e}")
-                    continue
-            
-            return products
-            
+            soup = self.fetch_static(url)
+            if soup is not None:
+                price = self.find_static_price(soup)
+                if price is None:
+                    self.discard_static(url)
         except Exception as e:
-            logger.error(f"Error searching Amazon: {e}")
-            return []
-        finally:
-            driver.quit()
-
-class FlipkartScraper:
-    def __init__(self):
-        self.base_url = "https://www.flipkart.com"
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-    
-    def setup_driver(self, headless=True):
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument(f'user-agent={self.headers["User-Agent"]}')
-        
+            logger.info(f"Static fetch failed for {self.platform} URL {url}: {e}")
+        self.stats.record('static', price is not None, time.perf_counter() - started)
+        return price
+
+    def get_selenium_price(self, url: str) -> Optional[float]:
+        started = time.perf_counter()
+        price = None
         try:
-            driver = webdriver.Chrome(options=chrome_options)
-            logger.info("Selenium Chrome driver started for Flipkart")
-            return driver
+            with self.driver_pool.acquire() as driver:
+                driver.get(url)
+                self.dismiss_popups(driver)
+                price = self.wait_for_price(driver)
         except Exception as e:
-            logger.error(f"Failed to setup Chrome driver: {e}")
-            return None
-    
+            logger.error(f"Error scraping {self.platform} price: {e}")
+        self.stats.record('selenium', price is not None, time.perf_counter() - started)
+        return price
+
     def get_product_price(self, url: str) -> Optional[float]:
-        driver = self.setup_driver()
-        if not driver:
-            return None
-        
-        try:
-            driver.get(url)
-            time.sleep(3)
-            
+        price = self.get_static_price(url) if self.static_first else None
+        if price is None:
+            price = self.get_selenium_price(url)
+
+        if price is None:
+            logger.warning(f"Could not find price for {self.platform} URL: {url}")
+        return price
+
+    def search_url(self, query: str) -> str:
+        raise NotImplementedError
+
+    def parse_search_results(self, soup: BeautifulSoup, max_results: int) -> List[Dict]:
+        raise NotImplementedError
+
+    def search_product(self, query: str, max_results: int = 5) -> List[Dict]:
+        url = self.search_url(query)
+
+        if self.static_first:
+            started = time.perf_counter()
+            results = []
             try:
-                close_button = driver.find_element(By.CSS_SELECTOR, 'button._2KpZ6l._2doB4z')
-                close_button.click()
-                time.sleep(1)
-            except:
-                pass
-            
-            price_selectors = [
-                'div._30jeq3._16Jk6d',
-                'div._30jeq3',
-                'div._16Jk6d'
-            ]
-            
-            for selector in price_selectors:
-                try:
-                    price_element = driver.find_element(By.CSS_SELECTOR, selector)
-                    price_text = price_element.text.replace('₹', '').replace(',', '').strip()
-                    price_match = re.search(r'(\d+)', price_text)
-                    if price_match:
-                        return float(price_match.group(1))
-                except NoSuchElementException:
-                    continue
-            
-            logger.warning(f"Could not find price for Flipkart URL: {url}")
-            return None
-            
+                soup = self.fetch_static(url)
+                if soup is not None:
+                    results = self.parse_search_results(soup, max_results)
+                    if not results:
+                        self.discard_static(url)
+            except Exception as e:
+                logger.info(f"Static search failed for {self.platform}: {e}")
+            self.stats.record('static', bool(results), time.perf_counter() - started)
+            if results:
+                return results
+
+        started = time.perf_counter()
+        try:
+            with self.driver_pool.acquire() as driver:
+                driver.get(url)
+                self.dismiss_popups(driver)
+                self.wait_for_results(driver)
+                page_source = driver.page_source
         except Exception as e:
-            logger.error(f"Error scraping Flipkart price: {e}")
-            return None
-        finally:
-            driver.quit()
-    
-    def search_product(self, query: str, max_results: int = 5) -> List[Dict]:
-        driver = self.setup_driver()
-        if not driver:
+            logger.error(f"Error searching {self.platform}: {e}")
+            self.stats.record('selenium', False, time.perf_counter() - started)
             return []
-        
-        try:
-            search_url = f"{self.base_url}/search?q={query.replace(' ', '+')}"
-            driver.get(search_url)
-            time.sleep(3)
-            
+
+        results = self.parse_search_results(BeautifulSoup(page_source, HTML_PARSER), max_results)
+        self.stats.record('selenium', bool(results), time.perf_counter() - started)
+        return results
+
+    def close(self):
+        if self.owns_pool:
+            self.driver_pool.close()
+        if self.owns_sessions:
+            self.session_pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class AmazonScraper(PriceScraper):
+    base_url = "https://www.amazon.in"
+    platform = 'Amazon'
+    price_selectors = [
+        'span.a-price-whole',
+        'span.a-price span.a-offscreen',
+        '.a-price .a-offscreen'
+    ]
+    results_selector = 'div[data-component-type="s-search-result"]'
+
+    def search_url(self, query: str) -> str:
+        return f"{self.base_url}/s?k={query.replace(' ', '+')}"
+
+    def parse_search_results(self, soup: BeautifulSoup, max_results: int) -> List[Dict]:
+        products = []
+        product_containers = soup.find_all('div', {'data-component-type': 's-search-result'})
+
+        for container in product_containers[:max_results]:
+            try:
+                title_elem = container.select_one('h2 a span')
+                price_elem = container.select_one('span.a-price span.a-offscreen')
+                link_elem = container.select_one('h2 a')
+
+                if title_elem and price_elem and link_elem:
+                    products.append({
+                        'title': title_elem.text.strip(),
+                        'price': parse_price(price_elem.text) or 0,
+                        'url': urljoin(self.base_url, link_elem['href']),
+                        'platform': 'Amazon'
+                    })
+            except Exception as e:
+                logger.warning(f"Error parsing product: {e}")
+                continue
+
+        return products
+
+class FlipkartScraper(PriceScraper):
+    base_url = "https://www.flipkart.com"
+    platform = 'Flipkart'
+    price_selectors = [
+        'div._30jeq3._16Jk6d',
+        'div._30jeq3',
+        'div._16Jk6d'
+    ]
+    results_selector = 'div._1AtVbE'
+
+    def dismiss_popups(self, driver):
+        for close_button in driver.find_elements(By.CSS_SELECTOR, 'button._2KpZ6l._2doB4z'):
             try:
-                close_button = driver.find_element(By.CSS_SELECTOR, 'button._2KpZ6l._2doB4z')
                 close_button.click()
-                time.sleep(1)
-            except:
+            except Exception:
                 pass
-            
-            products = []
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            product_containers = soup.find_all('div', {'class': '_1AtVbE'})
-            
-            for container in product_containers[:max_results]:
-                try:
-                    title_elem = container.select_one('div._4rR01T, a._1fQZEK')
-                    price_elem = container.select_one('div._30jeq3')
-                    link_elem = container.select_one('a._1fQZEK')
-                    
-                    if title_elem and price_elem and link_elem:
-                        title = title_elem.text.strip()
-                        price_text = price_elem.text.replace('₹', '').replace(',', '').strip()
-                        price = float(price_text) if price_text else 0
-                        url = urljoin(self.base_url, link_elem['href'])
-                        
-                        products.append({
-                            'title': title,
-                            'price': price,
-                            'url': url,
-                            'platform': 'Flipkart'
-                        })
-                except Exception as e:
-                    logger.warning(f"Error parsing product: {e}")
-                    continue
-            
-            return products
-            
-        except Exception as e:
-            logger.error(f"Error searching Flipkart: {e}")
-            return []
-        finally:
-            driver.quit()
+
+    def search_url(self, query: str) -> str:
+        return f"{self.base_url}/search?q={query.replace(' ', '+')}"
+
+    def parse_search_results(self, soup: BeautifulSoup, max_results: int) -> List[Dict]:
+        products = []
+        product_containers = soup.find_all('div', {'class': '_1AtVbE'})
+
+        for container in product_containers[:max_results]:
+            try:
+                title_elem = container.select_one('div._4rR01T, a._1fQZEK')
+                price_elem = container.select_one('div._30jeq3')
+                link_elem = container.select_one('a._1fQZEK')
+
+                if title_elem and price_elem and link_elem:
+                    products.append({
+                        'title': title_elem.text.strip(),
+                        'price': parse_price(price_elem.text) or 0,
+                        'url': urljoin(self.base_url, link_elem['href']),
+                        'platform': 'Flipkart'
+                    })
+            except Exception as e:
+                logger.warning(f"Error parsing product: {e}")
+                continue
+
+        return products
 
 class PriceComparisonScraper:
-    def __init__(self):
-        self.amazon_scraper = AmazonScraper()
-        self.flipkart_scraper = FlipkartScraper()
-    
+    def __init__(self, pool_size: int = 2, max_workers: int = 4, per_host_limit: int = 2,
+                 static_first: bool = True, stats: Optional[TierStats] = None, cache=SHARED_CACHE):
+        self.driver_pool = create_driver_pool(size=pool_size)
+        self.session_pool = create_session_pool(size=max_workers)
+        self.stats = stats or tier_stats
+        self.cache = resolve_cache(cache)
+        self.amazon_scraper = AmazonScraper(self.driver_pool, self.session_pool, static_first=static_first,
+                                            stats=self.stats, cache=self.cache)
+        self.flipkart_scraper = FlipkartScraper(self.driver_pool, self.session_pool, static_first=static_first,
+                                                stats=self.stats, cache=self.cache)
+        self.engine = ScrapeEngine(max_workers=max_workers, per_host_limit=per_host_limit)
+
     def get_price_comparison(self, amazon_url: Optional[str], flipkart_url: Optional[str]) -> Dict:
-        amazon_price = None
-        flipkart_price = None
-        
-        if amazon_url:
-            amazon_price = self.amazon_scraper.get_product_price(amazon_url)
-            time.sleep(2)
-        
-        if flipkart_url:
-            flipkart_price = self.flipkart_scraper.get_product_price(flipkart_url)
-        
-        return {
-            'amazon_price': amazon_price,
-            'flipkart_price': flipkart_price
-        }
-    
+        return self.get_price_comparisons([(amazon_url, flipkart_url)])[0]
+
+    def get_price_comparisons(self, url_pairs: List[Tuple[Optional[str], Optional[str]]]) -> List[Dict]:
+        # Submit every fetch up front; the engine's worker count and per-host
+        # limits decide how many run at once.
+        futures = []
+        for amazon_url, flipkart_url in url_pairs:
+            futures.append((
+                self.engine.submit(self.amazon_scraper.get_product_price, amazon_url) if amazon_url else None,
+                self.engine.submit(self.flipkart_scraper.get_product_price, flipkart_url) if flipkart_url else None
+            ))
+
+        return [
+            {
+                'amazon_price': amazon.result() if amazon else None,
+                'flipkart_price': flipkart.result() if flipkart else None
+            }
+            for amazon, flipkart in futures
+        ]
+
     def search_products(self, query: str, max_results_per_platform: int = 5) -> Dict:
-        amazon_results = self.amazon_scraper.search_product(query, max_results_per_platform)
-        time.sleep(2)
-        flipkart_results = self.flipkart_scraper.search_product(query, max_results_per_platform)
-        
-        return {
-            'amazon': amazon_results,
-            'flipkart': flipkart_results
+        amazon = self.engine.submit(
+            lambda url: self.amazon_scraper.search_product(query, max_results_per_platform),
+            self.amazon_scraper.base_url
+        )
+        flipkart = self.engine.submit(
+            lambda url: self.flipkart_scraper.search_product(query, max_results_per_platform),
+            self.flipkart_scraper.base_url
+        )
+
+        results = {
+            'amazon': amazon.result() or [],
+            'flipkart': flipkart.result() or []
         }
+        hits = results['amazon'] + results['flipkart']
+        for hit, brand in zip(hits, brand_matcher().find_all(hit['title'] for hit in hits)):
+            hit['brand'] = brand
+        return results
+
+    def close(self):
+        self.engine.shutdown()
+        self.driver_pool.close()
+        self.session_pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
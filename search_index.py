@@ -0,0 +1,174 @@
+"""Full-text product search backed by an SQLite FTS5 shadow table.
+
+`products_fts` is an external-content FTS5 table over `products.product_name`
+and `products.brand`. Triggers on `products` keep it in sync, so ORM writes,
+Core bulk inserts and raw SQL all update the index. Backends without FTS5 fall
+back to ILIKE scans; on PostgreSQL those are served by pg_trgm GIN indexes.
+
+As before the index, the product listing's `search` matches the name only
+and /api/search matches name or brand. The index matches words from their
+start: "sams gal" finds "Samsung Galaxy", but "phone" does not find
+"iPhone". A term that starts no indexed word at all falls back to the old
+substring scan, so such searches still find something, more slowly.
+
+  python search_index.py rebuild     # reindex after writes that bypassed the triggers
+"""
+import argparse
+import re
+
+from sqlalchemy import text
+from models import db, Product
+
+FTS_TABLE = 'products_fts'
+
+# bm25 column weights: a hit on the brand counts more than a hit in the name
+RANK_WEIGHTS = 'bm25(1.0, 4.0)'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SEARCH_COLUMNS = ('product_name', 'brand')
+NAME_COLUMNS = ('product_name',)
+
+_supported = {}
+
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        product_name, brand,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='1 2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, product_name, brand)
+        VALUES (new.id, new.product_name, new.brand);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, product_name, brand)
+        VALUES ('delete', old.id, old.product_name, old.brand);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF product_name, brand ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, product_name, brand)
+        VALUES ('delete', old.id, old.product_name, old.brand);
+        INSERT INTO {FTS_TABLE}(rowid, product_name, brand)
+        VALUES (new.id, new.product_name, new.brand);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', '{RANK_WEIGHTS}')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def is_supported(engine):
+    if engine.url not in _supported:
+        supported = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                supported = bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+        _supported[engine.url] = supported
+    return _supported[engine.url]
+
+
+TRIGRAM_SCHEMA = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (product_name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_products_brand_trgm ON products USING gin (brand gin_trgm_ops)',
+]
+
+
+def index_exists(conn):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first() is not None
+
+
+def ensure_search_index(conn):
+    if conn.dialect.name == 'postgresql':
+        for statement in TRIGRAM_SCHEMA:
+            conn.execute(text(statement))
+        return False
+
+    if not is_supported(conn.engine):
+        return False
+
+    if not index_exists(conn):
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+    return True
+
+
+def rebuild_search_index(engine):
+    if not is_supported(engine):
+        return False
+    with engine.begin() as conn:
+        if not index_exists(conn):
+            return False
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def build_match_query(term, columns=SEARCH_COLUMNS):
+    # Every token must match as a word prefix, so typeahead works on partial
+    # words ("sams gal"). Tokens are quoted so FTS5 operators in user input
+    # stay literal.
+    tokens = TOKEN_RE.findall(term.lower())
+    if not tokens:
+        return None
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    return f"{{{' '.join(columns)}}} : ({terms})"
+
+
+def substring_filter(term, columns=SEARCH_COLUMNS):
+    return db.or_(*[getattr(Product, column).ilike(f'%{term}%') for column in columns])
+
+
+def has_match(match):
+    return db.session.execute(
+        text(f'SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match LIMIT 1'), {'match': match}
+    ).first() is not None
+
+
+def search_filter(term, columns=NAME_COLUMNS):
+    """Return a filter clause matching products by name (or the given columns)."""
+    match = build_match_query(term, columns) if is_supported(db.engine) else None
+    if match is None or not has_match(match):
+        return substring_filter(term, columns)
+    fts = db.table(FTS_TABLE, db.column('rowid'))
+    return Product.id.in_(
+        db.select(fts.c.rowid).where(text(f'{FTS_TABLE} MATCH :match').bindparams(match=match))
+    )
+
+
+def ranked_product_ids(term, limit=20):
+    """Return ids of the best matching products by name or brand, best match first."""
+    match = build_match_query(term) if is_supported(db.engine) else None
+    ids = []
+    if match is not None:
+        rows = db.session.execute(
+            text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rank LIMIT :limit'),
+            {'match': match, 'limit': limit}
+        )
+        ids = [row[0] for row in rows]
+    if not ids:
+        rows = db.session.query(Product.id).filter(substring_filter(term)).order_by(Product.id).limit(limit).all()
+        ids = [row[0] for row in rows]
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the product search index')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if not rebuild_search_index(db.engine):
+            print("❌ No FTS5 search index in this database (run python migrations.py); searches use substring scans")
+            return
+        count = db.session.execute(text(f'SELECT count(*) FROM {FTS_TABLE}')).scalar()
+        print(f"✅ Rebuilt the search index ({count} products)")
+
+
+if __name__ == '__main__':
+    main()
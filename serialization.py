@@ -0,0 +1,72 @@
+"""JSON serialization for the API.
+
+Endpoints select plain columns (`product_columns`) and turn the result
+tuples into dicts with `rows_to_dicts`, so no ORM objects are built for a
+response. Values are left as the database returns them: the app's JSON
+provider encodes datetimes as ISO 8601, using orjson when it is installed
+and the stdlib encoder otherwise. Every endpoint returns a bounded page,
+so `json_array_response` encodes its list in one piece; unbounded reads go
+through the streaming export (export.py).
+"""
+import json
+from datetime import date
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+from models import db, Product
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# API fields that are computed rather than stored; the rest map to columns
+# through Product.API_FIELDS.
+COMPUTED_FIELDS = {
+    'priceDifference': db.func.abs(Product.price_diff),
+}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        return json.dumps(obj, **kwargs)
+
+    def dump_bytes(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=self.default)
+        return json.dumps(obj, default=self.default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dump_bytes(obj), mimetype=self.mimetype)
+
+
+def product_columns(fields):
+    return [
+        COMPUTED_FIELDS[field].label(field) if field in COMPUTED_FIELDS
+        else getattr(Product, Product.API_FIELDS[field])
+        for field in fields
+    ]
+
+
+def rows_to_dicts(fields, rows):
+    # Rows may carry trailing columns (sort keys); zip stops at the fields.
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def json_array_response(items, headers=None):
+    return current_app.response_class(current_app.json.dump_bytes(items), mimetype='application/json', headers=headers)
@@ -0,0 +1,308 @@
+"""Named catalog snapshots and set-based rollback.
+
+A snapshot records the catalog's price state under a name: prices, coupons
+and the best and effective prices the writers derived from them. Only the
+products whose prices or coupons differ from the previous snapshot (or that
+are new) get a `snapshot_prices` row, so the importer, the refresher and the
+restore tool take one before every run at the cost of a single INSERT ...
+SELECT. A product's state as of snapshot S is its row with the highest
+snapshot id not above S, found with a seek on the (product_id, snapshot_id)
+primary key.
+
+Only products changed since S can differ from it: those with a row in a
+later snapshot, plus those changed after the latest one. `rollback_to`
+snapshots the current state first (so the rollback can be undone, and so
+the first set covers everything), looks up S's state for just those
+products, and stages the ones that differ. One UPDATE ... FROM restores
+them; history, rollups, facet counts and deal scores follow for just those
+products, so the cost follows the number of changed products. The dry-run
+diff is the same SELECT. Snapshots do not read raw price history, so
+compaction does not affect them. Products created after the snapshot are
+left alone; deleted ones are not brought back.
+
+  python snapshots.py take before-sale
+  python snapshots.py list
+  python snapshots.py rollback before-sale          # dry run: print the diff
+  python snapshots.py rollback before-sale --yes
+  python snapshots.py prune --keep 30
+"""
+import argparse
+import time
+from datetime import datetime
+
+from models import db, Product, PriceHistory, CatalogSnapshot, SnapshotPrice, COUPON_COLUMNS
+from catalog import bump_catalog_version
+from facets import apply_facet_deltas, repricing_deltas
+from history import rollup_samples_at
+from alerts import fire_watches
+from deals import rescore_deals
+
+SNAPSHOT_KEEP = 30
+
+# A product's price state: the first four are compared, the rest follow them.
+STATE_COLUMNS = ['amazon_price', 'flipkart_price', 'amazon_coupon', 'flipkart_coupon']
+SNAPSHOT_COLUMNS = [
+    *STATE_COLUMNS, *COUPON_COLUMNS,
+    'best_price', 'best_platform', 'price_diff',
+    'amazon_effective_price', 'flipkart_effective_price', 'effective_price'
+]
+
+# The products a rollback changes, staged once so the lookup runs once.
+staging_metadata = db.MetaData()
+rollback_staging = db.Table(
+    'rollback_staging', staging_metadata,
+    db.Column('product_id', db.Integer, primary_key=True),
+    *[db.Column(name, SnapshotPrice.__table__.c[name].type) for name in SNAPSHOT_COLUMNS],
+    prefixes=['TEMPORARY']
+)
+
+
+def snapshot_name(source, now):
+    return f'{source}-{now:%Y%m%d-%H%M%S-%f}'
+
+
+def snapshot_prices_as_of(snapshot_id=None, product_ids=None):
+    # Each product's price state as of a snapshot (the latest one when None):
+    # its row with the highest snapshot id not above it, found per product by
+    # a seek on the (product_id, snapshot_id) primary key. `product_ids` (a
+    # select) limits the products looked up.
+    prices = SnapshotPrice.__table__
+    earlier = prices.alias('earlier')
+    as_of = db.select(db.func.max(earlier.c.snapshot_id)).where(earlier.c.product_id == prices.c.product_id)
+    if snapshot_id is not None:
+        as_of = as_of.where(earlier.c.snapshot_id <= snapshot_id)
+    rows = db.select(prices.c.product_id, *[prices.c[name] for name in SNAPSHOT_COLUMNS]).where(
+        prices.c.snapshot_id == as_of.scalar_subquery()
+    )
+    if product_ids is not None:
+        rows = rows.where(prices.c.product_id.in_(product_ids))
+    return rows.subquery('snapshot')
+
+
+def state_differs(products, snapshot):
+    return db.or_(*[products.c[name].is_distinct_from(snapshot.c[name]) for name in STATE_COLUMNS])
+
+
+def take_snapshot(connection, name=None, source='manual', now=None):
+    now = now or datetime.utcnow()
+    snapshots = CatalogSnapshot.__table__
+    products = Product.__table__
+    previous = snapshot_prices_as_of()
+    snapshot_id = connection.execute(
+        snapshots.insert().values(name=name or snapshot_name(source, now), source=source, created_at=now, price_count=0)
+    ).inserted_primary_key[0]
+
+    recorded = connection.execute(
+        db.insert(SnapshotPrice.__table__).from_select(
+            ['snapshot_id', 'product_id', *SNAPSHOT_COLUMNS],
+            db.select(db.literal(snapshot_id, db.Integer), products.c.id, *[products.c[name] for name in SNAPSHOT_COLUMNS])
+            .select_from(products.outerjoin(previous, previous.c.product_id == products.c.id))
+            .where(db.or_(previous.c.product_id.is_(None), state_differs(products, previous)))
+        )
+    ).rowcount
+    connection.execute(snapshots.update().where(snapshots.c.id == snapshot_id).values(price_count=recorded))
+    return snapshot_id, recorded
+
+
+def find_snapshot(connection, name):
+    snapshots = CatalogSnapshot.__table__
+    return connection.execute(db.select(snapshots).where(snapshots.c.name == name)).first()
+
+
+def list_snapshots(connection):
+    snapshots = CatalogSnapshot.__table__
+    return connection.execute(db.select(snapshots).order_by(snapshots.c.id)).all()
+
+
+def recorded_since(snapshot_id):
+    # Products with a row in a later snapshot, read off the snapshot id index.
+    prices = SnapshotPrice.__table__
+    return db.select(prices.c.product_id).where(prices.c.snapshot_id > snapshot_id)
+
+
+def unrecorded_changes():
+    # Products whose price state differs from their latest snapshot row, or
+    # that have none: what the next snapshot records.
+    products = Product.__table__
+    latest = snapshot_prices_as_of()
+    return (
+        db.select(products.c.id)
+        .select_from(products.outerjoin(latest, latest.c.product_id == products.c.id))
+        .where(db.or_(latest.c.product_id.is_(None), state_differs(products, latest)))
+    )
+
+
+def rollback_rows(snapshot_id, product_ids=None, candidates=None):
+    # (product id, snapshot state) of the products whose prices or coupons
+    # differ from the snapshot: what a rollback writes and what its dry run
+    # shows. Only products changed since the snapshot can differ, and those
+    # were either recorded by a later snapshot or changed after the latest
+    # one; `candidates` replaces that set when the caller just snapshotted.
+    products = Product.__table__
+    if candidates is None:
+        candidates = db.union(recorded_since(snapshot_id), unrecorded_changes())
+    snapshot = snapshot_prices_as_of(snapshot_id, candidates)
+    rows = (
+        db.select(products.c.id, *[snapshot.c[name] for name in SNAPSHOT_COLUMNS])
+        .select_from(products.join(snapshot, products.c.id == snapshot.c.product_id))
+        .where(state_differs(products, snapshot))
+    )
+    if product_ids:
+        rows = rows.where(products.c.id.in_(product_ids))
+    return rows
+
+
+def rollback_diff(connection, snapshot_id, product_ids=None, limit=20):
+    # (number of products a rollback would change, the first `limit` of them).
+    products = Product.__table__
+    rows = rollback_rows(snapshot_id, product_ids).subquery('diff')
+    count = connection.execute(db.select(db.func.count()).select_from(rows)).scalar()
+    sample = connection.execute(
+        db.select(
+            products.c.id, products.c.product_name,
+            products.c.amazon_price, rows.c.amazon_price.label('snapshot_amazon_price'),
+            products.c.flipkart_price, rows.c.flipkart_price.label('snapshot_flipkart_price')
+        )
+        .join_from(rows, products, products.c.id == rows.c.id)
+        .order_by(products.c.id).limit(limit)
+    ).all()
+    return count, sample
+
+
+def rollback_to(connection, snapshot, product_ids=None, now=None):
+    # Restore the price state of `snapshot` (a catalog_snapshots row), after
+    # snapshotting the current state so the rollback itself can be undone.
+    now = now or datetime.utcnow()
+    products = Product.__table__
+    undo = snapshot_name('rollback', now)
+    take_snapshot(connection, undo, 'rollback', now)
+
+    targets = rollback_staging
+    targets.drop(connection, checkfirst=True)
+    targets.create(connection)
+    # The undo snapshot has just recorded everything changed since.
+    staged = connection.execute(
+        db.insert(targets).from_select(
+            ['product_id', *SNAPSHOT_COLUMNS], rollback_rows(snapshot.id, product_ids, recorded_since(snapshot.id))
+        )
+    ).rowcount
+    if not staged:
+        targets.drop(connection)
+        return {'restored': 0, 'undo_snapshot': undo, 'alerts': []}
+
+    facet_deltas = repricing_deltas(connection, targets)
+    restored = connection.execute(
+        db.update(products).where(products.c.id == targets.c.product_id).values(
+            {**{name: targets.c[name] for name in SNAPSHOT_COLUMNS}, 'updated_at': now}
+        )
+    ).rowcount
+
+    samples = db.select(targets.c.product_id, targets.c.amazon_price, targets.c.flipkart_price)
+    connection.execute(
+        db.insert(PriceHistory.__table__).from_select(
+            ['product_id', 'amazon_price', 'flipkart_price', 'recorded_at', 'source'],
+            samples.add_columns(db.literal(now, db.DateTime), db.literal(f'rollback:{snapshot.name}'[:50]))
+        )
+    )
+    rollup_samples_at(connection, samples, now)
+
+    apply_facet_deltas(connection, facet_deltas)
+    alerts = fire_watches(connection, db.select(targets.c.product_id))
+    rescore_deals(connection, db.select(targets.c.product_id), now=now)
+    bump_catalog_version(connection)
+    targets.drop(connection)
+    return {'restored': restored, 'undo_snapshot': undo, 'alerts': alerts}
+
+
+def drop_snapshot(connection, snapshot_id):
+    # Rows still in effect at the next snapshot move there; the rest go.
+    snapshots = CatalogSnapshot.__table__
+    prices = SnapshotPrice.__table__
+    following = connection.execute(
+        db.select(db.func.min(snapshots.c.id)).where(snapshots.c.id > snapshot_id)
+    ).scalar()
+    if following is not None:
+        later = prices.alias('later')
+        moved = connection.execute(
+            prices.update()
+            .where(
+                prices.c.snapshot_id == snapshot_id,
+                ~db.exists().where(later.c.snapshot_id == following, later.c.product_id == prices.c.product_id)
+            )
+            .values(snapshot_id=following)
+        ).rowcount
+        connection.execute(
+            snapshots.update().where(snapshots.c.id == following).values(price_count=snapshots.c.price_count + moved)
+        )
+    connection.execute(prices.delete().where(prices.c.snapshot_id == snapshot_id))
+    connection.execute(snapshots.delete().where(snapshots.c.id == snapshot_id))
+
+
+def prune_snapshots(connection, keep=SNAPSHOT_KEEP):
+    snapshots = CatalogSnapshot.__table__
+    ids = connection.execute(db.select(snapshots.c.id).order_by(snapshots.c.id)).scalars().all()
+    dropped = ids[:max(len(ids) - keep, 0)]
+    for snapshot_id in dropped:
+        drop_snapshot(connection, snapshot_id)
+    return len(dropped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Take, list, prune and roll back to named catalog snapshots')
+    commands = parser.add_subparsers(dest='command', required=True)
+    take = commands.add_parser('take', help='Snapshot the current prices')
+    take.add_argument('name', nargs='?', help='Snapshot name (default: manual-<timestamp>)')
+    commands.add_parser('list', help='List snapshots, oldest first')
+    rollback = commands.add_parser('rollback', help='Restore prices to a snapshot (dry run without --yes)')
+    rollback.add_argument('name')
+    rollback.add_argument('--product-ids', nargs='*', type=int, help='Only roll back these products')
+    rollback.add_argument('--show', type=int, default=20, help='Changed products to print (default 20)')
+    rollback.add_argument('--yes', action='store_true', help='Apply the rollback')
+    prune = commands.add_parser('prune', help='Drop the oldest snapshots')
+    prune.add_argument('--keep', type=int, default=SNAPSHOT_KEEP, help=f'Snapshots kept (default {SNAPSHOT_KEEP})')
+    args = parser.parse_args()
+
+    from app import create_app
+    from alerts import alert_dispatcher
+
+    app = create_app()
+    with app.app_context():
+        connection = db.session.connection()
+        started = time.perf_counter()
+
+        if args.command == 'take':
+            snapshot_id, recorded = take_snapshot(connection, args.name)
+            db.session.commit()
+            print(f"✅ Snapshot {snapshot_id} taken in {time.perf_counter() - started:.2f}s ({recorded} changed prices recorded)")
+
+        elif args.command == 'list':
+            for row in list_snapshots(connection):
+                print(f"{row.id:>5}  {row.name:<40} {row.source:<10} {row.created_at:%Y-%m-%d %H:%M:%S}  {row.price_count} prices")
+
+        elif args.command == 'rollback':
+            snapshot = find_snapshot(connection, args.name)
+            if snapshot is None:
+                print(f"❌ No snapshot named {args.name}")
+                exit(1)
+            count, rows = rollback_diff(connection, snapshot.id, args.product_ids, args.show)
+            print(f"🔍 {count} products differ from {snapshot.name} ({time.perf_counter() - started:.2f}s)")
+            for row in rows:
+                print(f"   {row.id:>7} {row.product_name[:40]:<40} amazon {row.amazon_price} -> {row.snapshot_amazon_price}, "
+                      f"flipkart {row.flipkart_price} -> {row.snapshot_flipkart_price}")
+            if not args.yes:
+                print("Dry run: nothing written (pass --yes to apply)")
+                return
+            stats = rollback_to(connection, snapshot, args.product_ids)
+            db.session.commit()
+            alert_dispatcher.send(stats['alerts'])
+            print(f"✅ Rolled back {stats['restored']} products in {time.perf_counter() - started:.2f}s "
+                  f"(undo: rollback {stats['undo_snapshot']}), alerts={len(stats['alerts'])}")
+
+        else:
+            dropped = prune_snapshots(connection, args.keep)
+            db.session.commit()
+            print(f"✅ Dropped {dropped} snapshots")
+
+
+if __name__ == '__main__':
+    main()
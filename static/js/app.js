@@ -13,16 +13,50 @@ class PricePulseApp {
         this.compareProducts = [];
         this.allProducts = [];
         this.allBrands = [];
+        this.pageSize = 48;
+        this.nextCursor = null;
+        this.isLoadingPage = false;
+        this.loadSequence = 0;
+        this.gridFields = [
+            'id', 'category', 'productName', 'brand',
+            'amazonPrice', 'amazonUrl', 'amazonCoupon',
+            'flipkartPrice', 'flipkartUrl', 'flipkartCoupon'
+        ];
 
         this.init();
     }
 
     init() {
         this.setupEventListeners();
+        this.setupInfiniteScroll();
         this.loadProducts();
         this.loadBrands();
     }
 
+    setupInfiniteScroll() {
+        this.sentinel = document.getElementById('loadMoreSentinel');
+        this.scrollMargin = 400;
+        const observer = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                this.loadMoreProducts();
+            }
+        }, { rootMargin: `${this.scrollMargin}px` });
+        observer.observe(this.sentinel);
+    }
+
+    loadMoreIfSentinelVisible() {
+        // The observer only fires when the sentinel enters the viewport; after
+        // a page too short to push it out, it is still visible and no new
+        // event comes, so check again after each page.
+        if (!this.nextCursor) {
+            return;
+        }
+        const rect = this.sentinel.getBoundingClientRect();
+        if (rect.top - this.scrollMargin <= window.innerHeight && rect.bottom + this.scrollMargin >= 0) {
+            this.loadMoreProducts();
+        }
+    }
+
     setupEventListeners() {
         document.querySelectorAll('.category-btn').forEach(btn => {
             btn.addEventListener('click', (e) => {
@@ -66,41 +100,108 @@ class PricePulseApp {
         }, 500));
     }
 
+    buildProductParams() {
+        const params = new URLSearchParams();
+        if (this.currentFilters.category && this.currentFilters.category !== 'All') {
+            params.append('category', this.currentFilters.category);
+        }
+        if (this.currentFilters.search) {
+            params.append('search', this.currentFilters.search);
+        }
+        if (this.currentFilters.sort) {
+            params.append('sort', this.currentFilters.sort);
+        }
+        if (this.currentFilters.brands.length > 0) {
+            this.currentFilters.brands.forEach(brand => params.append('brands', brand));
+        }
+        if (this.currentFilters.minPrice !== null) {
+            params.append('min_price', this.currentFilters.minPrice);
+        }
+        if (this.currentFilters.maxPrice !== null) {
+            params.append('max_price', this.currentFilters.maxPrice);
+        }
+        params.append('fields', this.gridFields.join(','));
+        params.append('limit', this.pageSize);
+        return params;
+    }
+
     async loadProducts() {
+        const sequence = ++this.loadSequence;
+        let loaded = false;
+
         try {
             this.showLoading();
+            this.nextCursor = null;
+            this.allProducts = [];
 
-            const params = new URLSearchParams();
-            if (this.currentFilters.category && this.currentFilters.category !== 'All') {
-                params.append('category', this.currentFilters.category);
-            }
-            if (this.currentFilters.search) {
-                params.append('search', this.currentFilters.search);
-            }
-            if (this.currentFilters.sort) {
-                params.append('sort', this.currentFilters.sort);
-            }
-            if (this.currentFilters.brands.length > 0) {
-                this.currentFilters.brands.forEach(brand => params.append('brands', brand));
-            }
-            if (this.currentFilters.minPrice !== null) {
-                params.append('min_price', this.currentFilters.minPrice);
-            }
-            if (this.currentFilters.maxPrice !== null) {
-                params.append('max_price', this.currentFilters.maxPrice);
-            }
+            const params = this.buildProductParams();
+            params.append('total', '1');
 
+            this.isLoadingPage = true;
             const response = await fetch(`/api/products?${params.toString()}`);
             const products = await response.json();
 
+            if (sequence !== this.loadSequence) {
+                return;
+            }
+
             this.allProducts = products;
+            this.nextCursor = response.headers.get('X-Next-Cursor');
             this.renderProducts(products);
-            this.updateResultsCount(products.length);
+            this.updateResultsCount(parseInt(response.headers.get('X-Total-Count'), 10) || products.length);
             this.hideLoading();
+            loaded = true;
 
         } catch (error) {
             console.error('Error loading products:', error);
             this.showError('Failed to load products. Please try again.');
+        } finally {
+            if (sequence === this.loadSequence) {
+                this.isLoadingPage = false;
+            }
+        }
+
+        if (loaded) {
+            this.loadMoreIfSentinelVisible();
+        }
+    }
+
+    async loadMoreProducts() {
+        if (!this.nextCursor || this.isLoadingPage) {
+            return;
+        }
+
+        const sequence = this.loadSequence;
+        let loaded = false;
+
+        try {
+            this.isLoadingPage = true;
+
+            const params = this.buildProductParams();
+            params.append('cursor', this.nextCursor);
+
+            const response = await fetch(`/api/products?${params.toString()}`);
+            const products = await response.json();
+
+            if (sequence !== this.loadSequence) {
+                return;
+            }
+
+            this.allProducts = this.allProducts.concat(products);
+            this.nextCursor = response.headers.get('X-Next-Cursor');
+            this.renderProducts(products, true);
+            loaded = true;
+
+        } catch (error) {
+            console.error('Error loading more products:', error);
+        } finally {
+            if (sequence === this.loadSequence) {
+                this.isLoadingPage = false;
+            }
+        }
+
+        if (loaded) {
+            this.loadMoreIfSentinelVisible();
         }
     }
 
@@ -111,34 +212,40 @@ class PricePulseApp {
                 params.append('category', this.currentFilters.category);
             }
 
-            const response = await fetch(`/api/brands?${params.toString()}`);
-            const brands = await response.json();
+            const response = await fetch(`/api/facets?${params.toString()}`);
+            const facets = await response.json();
 
-            this.allBrands = brands;
-            this.renderBrandFilter(brands);
+            this.allBrands = facets.brands;
+            this.renderBrandFilter(facets.brands);
 
         } catch (error) {
             console.error('Error loading brands:', error);
         }
     }
 
-    renderProducts(products) {
+    renderProducts(products, append = false) {
         const grid = document.getElementById('productsGrid');
         const noResults = document.getElementById('noResults');
 
-        if (products.length === 0) {
+        if (!append && products.length === 0) {
             grid.innerHTML = '';
             noResults.classList.remove('d-none');
             return;
         }
 
         noResults.classList.add('d-none');
-        grid.innerHTML = products.map(product => this.createProductCard(product)).join('');
+        const cards = products.map(product => this.createProductCard(product)).join('');
+        if (append) {
+            grid.insertAdjacentHTML('beforeend', cards);
+        } else {
+            grid.innerHTML = cards;
+        }
 
-        document.querySelectorAll('.compare-checkbox input[type="checkbox"]').forEach(checkbox => {
+        document.querySelectorAll('.compare-checkbox input[type="checkbox"]:not([data-bound])').forEach(checkbox => {
+            checkbox.dataset.bound = 'true';
             checkbox.addEventListener('change', (e) => {
                 const productName = e.target.dataset.productName;
-                const product = products.find(p => p.productName === productName);
+                const product = this.allProducts.find(p => p.productName === productName);
 
                 if (e.target.checked) {
                     this.addToComparison(product);
@@ -243,7 +350,7 @@ class PricePulseApp {
     renderBrandFilter(brands) {
         const brandFilter = document.getElementById('brandFilter');
         brandFilter.innerHTML = brands.map(brand =>
-            `<option value="${brand}">${brand}</option>`
+            `<option value="${brand.value}">${brand.value} (${brand.count})</option>`
         ).join('');
     }
 
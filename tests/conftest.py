@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from app import create_app
+from cache import response_cache
+from import_csv import DEFAULT_CSV, merge_staged_products, stage_rows
+from migrations import run_migrations
+from models import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_feed(csv_file=os.path.join(ROOT, DEFAULT_CSV), prune=True):
+    stage_rows(csv_file, 50)
+    stats = merge_staged_products(prune=prune)
+    db.session.commit()
+    return stats
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(overrides={
+        'TESTING': True,
+        'ALERT_SINK': 'queue',
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "pricepulse.db"}'
+    })
+    with app.app_context():
+        run_migrations(db.engine)
+        # Catalog versions restart with every database, so entries cached
+        # by an earlier test would look current.
+        response_cache.clear()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def catalog(app):
+    # The sample feed: 146 products, with repeated prices to exercise tiebreaks.
+    import_feed()
@@ -0,0 +1,24 @@
+import logging
+
+from alerts import AlertDispatcher, QueueSink
+
+
+class BrokenSink:
+    def send(self, notifications):
+        raise OSError('disk full')
+
+
+def test_dispatcher_sends_to_its_sink():
+    sink = QueueSink()
+    AlertDispatcher(sink).send([{'watchId': 1}, {'watchId': 2}])
+
+    assert [sink.queue.get_nowait()['watchId'] for _ in range(2)] == [1, 2]
+
+
+def test_failed_send_is_logged_not_raised(caplog):
+    with caplog.at_level(logging.ERROR, logger='alerts'):
+        AlertDispatcher(BrokenSink()).send([{'watchId': 1}])
+
+    record, = caplog.records
+    assert record.getMessage() == 'Failed sending 1 price alerts'
+    assert record.exc_info[1].args == ('disk full',)
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import numpy as np
+
+from analytics import Snapshot, write_snapshot
+from history import EPOCH, ONE_SECOND, record_price_history
+from models import PriceHistory, Product, db
+
+STAMPS = [datetime(2026, 8, 3, 10), datetime(2026, 8, 31, 23, 59, 59), datetime(2026, 9, 1), datetime(2026, 9, 14, 6, 30)]
+
+
+def record(stamps, offset=0):
+    products = db.session.scalars(db.select(Product).order_by(Product.id).limit(4)).all()
+    record_price_history(db.session.connection(), [
+        {'product_id': product.id, 'amazon_price': product.amazon_price + offset + index,
+         'flipkart_price': product.flipkart_price, 'recorded_at': stamp}
+        for index, product in enumerate(products) for stamp in stamps
+    ], source='test')
+    db.session.commit()
+
+
+def stored_month(year, month):
+    rows = db.session.execute(
+        db.select(PriceHistory.product_id, PriceHistory.recorded_at, PriceHistory.amazon_price, PriceHistory.flipkart_price)
+        .where(PriceHistory.recorded_at >= datetime(year, month, 1),
+               PriceHistory.recorded_at < datetime(year + month // 12, month % 12 + 1, 1))
+        .order_by(PriceHistory.recorded_at, PriceHistory.id)
+    ).all()
+    product_ids, stamps, amazon, flipkart = zip(*rows)
+    return {
+        'product_id': np.array(product_ids),
+        'recorded_at': np.array([(stamp - EPOCH) // ONE_SECOND for stamp in stamps]),
+        'amazon_price': np.array(amazon),
+        'flipkart_price': np.array(flipkart),
+    }
+
+
+def assert_month_matches(snapshot, key, year, month):
+    history = snapshot.history(key, key)
+    for name, values in stored_month(year, month).items():
+        np.testing.assert_array_equal(history[name], values)
+
+
+def test_snapshot_round_trip(catalog, tmp_path):
+    record(STAMPS)
+
+    manifest, written = write_snapshot(db.session.connection(), str(tmp_path))
+    snapshot = Snapshot(str(tmp_path))
+
+    assert written == manifest['months'] == {'2026-08': 8, '2026-09': 8}
+    assert_month_matches(snapshot, '2026-08', 2026, 8)
+    assert_month_matches(snapshot, '2026-09', 2026, 9)
+    assert len(snapshot.history()['product_id']) == 16
+    ids = db.session.scalars(db.select(Product.id).order_by(Product.id)).all()
+    np.testing.assert_array_equal(snapshot.products['id'], ids)
+    assert manifest['products'] == len(ids)
+    assert sorted(snapshot.categories) == snapshot.categories
+    categories = dict(db.session.execute(db.select(Product.id, Product.category)).all())
+    assert [snapshot.categories[code] for code in snapshot.products['category']] == [categories[id] for id in ids]
+
+
+def test_incremental_run_rewrites_only_the_newest_month(catalog, tmp_path):
+    record(STAMPS)
+    write_snapshot(db.session.connection(), str(tmp_path))
+    august = (tmp_path / 'history' / '2026-08' / 'product_id.npy').stat().st_mtime_ns
+    # Rows the archive already has are kept even once compaction deletes them.
+    db.session.execute(db.delete(PriceHistory).where(PriceHistory.recorded_at < datetime(2026, 9, 1)))
+    record([datetime(2026, 9, 20), datetime(2026, 10, 2)], offset=100)
+
+    manifest, written = write_snapshot(db.session.connection(), str(tmp_path))
+    snapshot = Snapshot(str(tmp_path))
+
+    assert written == {'2026-09': 12, '2026-10': 4}
+    assert manifest['months'] == {'2026-08': 8, '2026-09': 12, '2026-10': 4}
+    assert (tmp_path / 'history' / '2026-08' / 'product_id.npy').stat().st_mtime_ns == august
+    assert_month_matches(snapshot, '2026-09', 2026, 9)
+    assert_month_matches(snapshot, '2026-10', 2026, 10)
+    assert len(snapshot.history('2026-08', '2026-08')['product_id']) == 8
+
+
+def test_platform_win_rate_matches_the_rows(catalog, tmp_path):
+    record(STAMPS)
+    write_snapshot(db.session.connection(), str(tmp_path))
+
+    rates = Snapshot(str(tmp_path)).platform_win_rate()
+
+    rows = db.session.execute(
+        db.select(Product.category, PriceHistory.amazon_price, PriceHistory.flipkart_price)
+        .join(Product, Product.id == PriceHistory.product_id)
+    ).all()
+    for category, rate in rates.items():
+        prices = [(amazon, flipkart) for row_category, amazon, flipkart in rows if row_category == category]
+        assert rate['amazon'] == sum(amazon < flipkart for amazon, flipkart in prices) / len(prices)
+        assert rate['flipkart'] == sum(flipkart < amazon for amazon, flipkart in prices) / len(prices)
+    assert set(rates) == {row[0] for row in rows}
@@ -0,0 +1,20 @@
+import logging
+
+from app import create_app
+
+
+def test_outdated_schema_is_logged(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING):
+        create_app(overrides={'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "empty.db"}'})
+
+    assert any(
+        record.levelno == logging.WARNING and 'run python migrations.py' in record.getMessage()
+        for record in caplog.records
+    )
+
+
+def test_current_schema_is_quiet(app, caplog):
+    with caplog.at_level(logging.WARNING):
+        create_app(overrides={'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI']})
+
+    assert not [record for record in caplog.records if 'migrations.py' in record.getMessage()]
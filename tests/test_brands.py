@@ -0,0 +1,57 @@
+import pytest
+
+from brands import BrandMatcher, brand_matcher, load_brand_table
+from import_csv import extract_brand
+
+
+@pytest.mark.parametrize('title, brand', [
+    ('Moto G85 5G', 'Motorola'),
+    ('Apple MacBook Air M2', 'Apple'),
+    ('MacBook Air M2', 'Apple'),
+    ('Boult Audio Z40 Earbuds', 'Boult'),
+    ('ASUS VivoBook 15', 'ASUS'),
+    ('VivoBook 15 by ASUS', 'ASUS'),
+    ('Samsung Galaxy M05', 'Samsung'),
+    ('Case for iphone 15', 'Apple'),
+    ('Generic USB-C Cable', None),
+    ('', None),
+])
+def test_find(title, brand):
+    assert brand_matcher().find(title) == brand
+
+
+@pytest.mark.parametrize('title, brand', [
+    ('Nothing Phone 2a', 'Nothing'),
+    ('Something Nothing Case', None),
+    ('Noise ColorFit Pro 5', 'Noise'),
+    ('Wireless Earbuds with Noise Cancellation', None),
+    ('Sony WH-1000XM5 Noise Cancelling', 'Sony'),
+    ('Legion Pro 7i', 'Lenovo'),
+])
+def test_leading_aliases_only_match_at_the_start(title, brand):
+    assert brand_matcher().find(title) == brand
+
+
+def test_first_word_fallback_when_no_alias_leads():
+    assert extract_brand('Something Nothing Case') == 'Something'
+    assert extract_brand('Nothing Phone 2a') == 'Nothing'
+
+
+def test_longest_alias_wins_at_the_same_position():
+    matcher = BrandMatcher({'Turtle': 'Turtle', 'Turtle Beach': 'Turtle Beach', 'Beach': 'Beach'})
+    assert matcher.find('Turtle Beach Stealth 600') == 'Turtle Beach'
+    assert matcher.find('Turtle Stealth') == 'Turtle'
+    assert matcher.find('Stealth Beach') == 'Beach'
+
+
+def test_leading_multiword_alias():
+    matcher = BrandMatcher({'Open Box': 'OpenBox', 'Box': 'Box'}, leading={'Open Box'})
+    assert matcher.find('Open Box Speaker') == 'OpenBox'
+    assert matcher.find('Speaker Open Box') == 'Box'
+
+
+def test_brand_table(tmp_path):
+    table = tmp_path / 'brands.csv'
+    table.write_text('alias,brand,leading\nMoto,Motorola\nNothing,Nothing,yes\n,Orphan\nBlank,\n', encoding='utf-8')
+
+    assert load_brand_table(str(table)) == ({'Moto': 'Motorola', 'Nothing': 'Nothing'}, {'Nothing'})
@@ -0,0 +1,63 @@
+from cache import ResponseCache, response_cache
+from catalog import bump_catalog_version, current_catalog_version
+from models import Product, db
+
+
+def test_repeated_get_is_served_from_the_cache(client, catalog):
+    first = client.get('/api/products', query_string={'category': 'Phones', 'limit': 5})
+    hits = response_cache.stats()['hits']
+    # Argument order and empty arguments do not change the key.
+    second = client.get('/api/products', query_string={'limit': 5, 'search': '', 'category': 'Phones'})
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert second.get_data() == first.get_data()
+    assert second.headers['X-Next-Cursor'] == first.headers['X-Next-Cursor']
+    assert response_cache.stats()['hits'] == hits + 1
+
+
+def test_if_none_match_returns_304(client, catalog):
+    etag = client.get('/api/categories').headers['ETag']
+
+    response = client.get('/api/categories', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_writes_invalidate_cached_responses(client, catalog):
+    url = '/api/products?search=iPhone 15&fields=productName,amazonPrice'
+    etag = client.get(url).headers['ETag']
+
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'iPhone 15'))
+    product.amazon_price = 123
+    db.session.commit()
+    response = client.get(url, headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [row['amazonPrice'] for row in response.get_json()] == [123]
+
+    # Core bulk writers bump the version themselves.
+    version = current_catalog_version()
+    bump_catalog_version()
+    db.session.commit()
+    assert current_catalog_version() == version + 1
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+
+
+def test_eviction_is_least_recently_used():
+    cache = ResponseCache(max_bytes=10, max_entries=2)
+    cache.put('a', 1, b'aaa', {})
+    cache.put('b', 1, b'bbb', {})
+    cache.get('a', 1)
+    cache.put('c', 1, b'ccc', {})
+
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) is not None
+    # An entry from an older catalog version is a miss.
+    assert cache.get('c', 2) is None
+    cache.put('d', 1, b'dddddddd', {})
+    assert cache.stats()['entries'] == 1 and cache.stats()['bytes'] == 8
@@ -0,0 +1,60 @@
+import pytest
+
+from coupons import Coupon, coupon_columns, effective_price, parse_coupon, stored_coupon
+from models import Product, db
+
+
+@pytest.mark.parametrize('text, coupon', [
+    ('10% off on SBI CC (up to ₹1000)', Coupon('percent', 10.0, 1000.0)),
+    ('7.5% instant discount, max Rs. 1,500', Coupon('percent', 7.5, 1500.0)),
+    ('₹500 off on orders above ₹5,000', Coupon('flat', 500.0, None, 5000.0)),
+    ('Flat Rs 250 cashback on minimum order value of INR 999', Coupon('flat', 250.0, None, 999.0)),
+    ('5% cashback on Axis CC + ₹500 SuperCoins', Coupon('percent', 5.0)),
+    ('₹500 SuperCoins on prepaid orders', None),
+    ('No cost EMI available', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_coupon(text, coupon):
+    assert parse_coupon(text) == coupon
+
+
+@pytest.mark.parametrize('price, coupon, expected', [
+    (6249, Coupon('percent', 10.0, 1000.0), 5624.1),
+    (20000, Coupon('percent', 10.0, 1000.0), 19000.0),
+    (4999, Coupon('flat', 500.0, None, 5000.0), 4999),
+    (5000, Coupon('flat', 500.0, None, 5000.0), 4500.0),
+    (300, Coupon('flat', 500.0), 0.0),
+    (1299.99, None, 1299.99),
+])
+def test_effective_price(price, coupon, expected):
+    assert effective_price(price, coupon) == expected
+
+
+def test_coupon_columns_round_trip():
+    coupon = Coupon('percent', 10.0, 1500.0, None)
+    columns = coupon_columns('flipkart', coupon)
+
+    assert columns == {
+        'flipkart_coupon_type': 'percent', 'flipkart_coupon_amount': 10.0,
+        'flipkart_coupon_cap': 1500.0, 'flipkart_coupon_min_order': None,
+    }
+    assert stored_coupon(columns, 'flipkart') == coupon
+    assert stored_coupon(coupon_columns('amazon', None), 'amazon') is None
+
+
+def test_import_stores_parsed_coupons_and_effective_prices(catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'Samsung Galaxy M05'))
+
+    assert stored_coupon(product.__dict__, 'amazon') == parse_coupon(product.amazon_coupon)
+    assert product.amazon_effective_price == effective_price(product.amazon_price, parse_coupon(product.amazon_coupon))
+    assert product.effective_price == min(product.amazon_effective_price, product.flipkart_effective_price)
+
+
+def test_orm_coupon_edits_reprice(catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'Samsung Galaxy M05'))
+    product.flipkart_coupon = '₹1,000 off'
+    db.session.commit()
+
+    assert product.flipkart_coupon_type == 'flat'
+    assert product.flipkart_effective_price == product.flipkart_price - 1000
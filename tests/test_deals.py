@@ -0,0 +1,129 @@
+import csv
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import ROOT, import_feed
+from deals import recompute_deals, rescore_deals
+from history import record_price_history
+from import_csv import DEFAULT_CSV
+from models import DealScore, Product, db
+
+
+def add_product(name, category, amazon_price, flipkart_price, flipkart_coupon=None, closing_prices=()):
+    product = Product(
+        category=category, product_name=name, brand='Testbrand',
+        amazon_price=amazon_price, amazon_url=f'https://www.amazon.in/dp/{name}',
+        flipkart_price=flipkart_price, flipkart_url=f'https://www.flipkart.com/p/{name}',
+        flipkart_coupon=flipkart_coupon
+    )
+    db.session.add(product)
+    db.session.flush()
+    now = datetime.utcnow()
+    record_price_history(db.session.connection(), [
+        {'product_id': product.id, 'amazon_price': price, 'flipkart_price': price + 100,
+         'recorded_at': now - timedelta(days=day)}
+        for day, price in enumerate(closing_prices, start=1)
+    ], source='test')
+    return product
+
+
+@pytest.fixture
+def deals_catalog(app):
+    # Expected scores, 100 x (0.4 median + 0.2 low + 0.2 gap + 0.2 coupon):
+    #   below-median  best 900 vs a 30-day median and low of 1000, gap 10%  -> 8.0
+    #   coupon        gap 10%, coupon takes 100 off the 1800 best price      -> 3.11
+    #   flat          no history, same price on both platforms               -> 0.0
+    #   above-median  best 500 vs a 30-day median and low of 400             -> -15.0
+    products = {
+        'below-median': add_product('below-median', 'Phones', 900, 1000, closing_prices=[1000] * 5),
+        'coupon': add_product('coupon', 'Phones', 2000, 1800, flipkart_coupon='10% off (up to ₹100)'),
+        'flat': add_product('flat', 'Phones', 1000, 1000),
+        'above-median': add_product('above-median', 'Audio', 500, 500, closing_prices=[400, 400, 400]),
+    }
+    db.session.commit()
+    return {name: product.id for name, product in products.items()}
+
+
+def scores():
+    return dict(db.session.execute(db.select(DealScore.product_id, DealScore.score)).all())
+
+
+def test_recompute_scores_each_signal(deals_catalog):
+    assert recompute_deals(db.session.connection()) == 4
+    ids = deals_catalog
+
+    assert scores() == {ids['below-median']: 8.0, ids['coupon']: 3.11, ids['flat']: 0.0, ids['above-median']: -15.0}
+    below = db.session.get(DealScore, ids['below-median'])
+    assert (below.low_30d, below.median_30d, below.platform_gap) == (1000, 1000, 10.0)
+    coupon = db.session.get(DealScore, ids['coupon'])
+    assert (coupon.effective_price, coupon.coupon_savings, coupon.median_30d) == (1700, 100, None)
+
+
+def test_only_the_top_k_per_category_are_kept(deals_catalog):
+    assert recompute_deals(db.session.connection(), top_k=1) == 2
+    assert set(scores()) == {deals_catalog['below-median'], deals_catalog['above-median']}
+
+
+def reprice(product_id, amazon_price, flipkart_price):
+    product = db.session.get(Product, product_id)
+    product.amazon_price, product.flipkart_price = amazon_price, flipkart_price
+    db.session.flush()
+
+
+@pytest.mark.parametrize('name, prices, stored', [
+    # Rises to 10.0 on a 50% gap and displaces the coupon deal.
+    ('flat', (500, 1000), ['flat', 'below-median']),
+    # Falls to -12.0 below the unstored flat product: Phones is rescored in full.
+    ('below-median', (1200, 1200), ['coupon', 'flat']),
+])
+def test_rescore_matches_a_full_recompute(deals_catalog, name, prices, stored):
+    connection = db.session.connection()
+    recompute_deals(connection, top_k=2)
+    reprice(deals_catalog[name], *prices)
+
+    assert rescore_deals(connection, db.select(Product.id).where(Product.id == deals_catalog[name]), top_k=2) == 1
+
+    rescored = scores()
+    phones = db.session.scalars(
+        db.select(DealScore.product_id).where(DealScore.category == 'Phones').order_by(DealScore.score.desc())
+    ).all()
+    assert phones == [deals_catalog[key] for key in stored]
+    recompute_deals(connection, top_k=2)
+    assert scores() == rescored
+
+
+def test_deals_endpoint_orders_by_score(client, deals_catalog):
+    recompute_deals(db.session.connection())
+    db.session.commit()
+    ids = deals_catalog
+
+    rows = client.get('/api/deals').get_json()
+    assert [row['id'] for row in rows] == [ids['below-median'], ids['coupon'], ids['flat'], ids['above-median']]
+    assert rows[0]['dealScore'] == 8.0 and rows[0]['productName'] == 'below-median'
+    assert [row['id'] for row in client.get('/api/deals', query_string={'category': 'Phones', 'limit': 2}).get_json()] == \
+        [ids['below-median'], ids['coupon']]
+    assert [row['id'] for row in client.get('/api/deals', query_string={'category': 'Audio'}).get_json()] == \
+        [ids['above-median']]
+
+
+def test_import_rescores_changed_products(client, catalog, tmp_path):
+    with open(os.path.join(ROOT, DEFAULT_CSV), encoding='utf-8', newline='') as fh:
+        rows = list(csv.DictReader(fh))
+    row = next(row for row in rows if row['Product_Name'] == 'iPhone 15')
+    # Half the Flipkart price on Amazon: a 50% platform gap tops the category.
+    row['Amazon_Price'] = str(float(row['Flipkart_Price'].replace(',', '')) / 2)
+    feed = tmp_path / 'feed.csv'
+    with open(feed, 'w', encoding='utf-8', newline='') as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    import_feed(str(feed))
+
+    top = client.get('/api/deals', query_string={'category': 'Phones', 'limit': 1}).get_json()[0]
+    assert top['productName'] == 'iPhone 15'
+    stored = scores()
+    recompute_deals(db.session.connection())
+    assert scores() == stored
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from conftest import ROOT
+from history import record_price_history
+from models import PriceHistory, Product, db
+
+
+def export(client, **args):
+    response = client.get('/api/export', query_string=args)
+    assert response.status_code == 200
+    return response
+
+
+def product_count(*where):
+    return db.session.scalar(db.select(db.func.count(Product.id)).where(*where))
+
+
+def test_products_as_ndjson(client, catalog):
+    response = export(client, format='ndjson', category='Phones', min_price=10000, fields='productName,bestPrice')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=products.ndjson'
+    assert len(rows) == product_count(Product.category == 'Phones', Product.best_price >= 10000)
+    assert set(rows[0]) == {'id', 'productName', 'bestPrice'}
+    assert all(row['bestPrice'] >= 10000 for row in rows)
+    assert [row['id'] for row in rows] == sorted(row['id'] for row in rows)
+
+
+def test_products_as_csv(client, catalog):
+    response = export(client, format='csv', category='Laptops')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=products.csv'
+    assert rows[0] == list(Product.API_FIELDS)
+    assert len(rows) - 1 == product_count(Product.category == 'Laptops')
+    assert {row[rows[0].index('category')] for row in rows[1:]} == {'Laptops'}
+
+
+def add_history(days):
+    products = db.session.scalars(db.select(Product).order_by(Product.id).limit(3)).all()
+    now = datetime.utcnow().replace(microsecond=0)
+    record_price_history(db.session.connection(), [
+        {'product_id': product.id, 'amazon_price': product.amazon_price, 'flipkart_price': product.flipkart_price,
+         'recorded_at': now - timedelta(days=day)}
+        for product in products for day in range(days)
+    ], source='test')
+    db.session.commit()
+    return products, now
+
+
+def test_history_as_ndjson_with_a_date_range(client, catalog):
+    products, now = add_history(10)
+    start = now - timedelta(days=4)
+
+    response = export(client, type='history', format='ndjson', **{'from': start.isoformat()})
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.headers['Content-Disposition'] == 'attachment; filename=history.ndjson'
+    assert len(rows) == db.session.scalar(
+        db.select(db.func.count(PriceHistory.id)).where(PriceHistory.recorded_at >= start)
+    ) == 15
+    assert {row['source'] for row in rows} == {'test'}
+    assert min(row['recordedAt'] for row in rows) == start.isoformat()
+
+
+def test_history_as_csv_follows_product_filters(client, catalog):
+    products, _ = add_history(2)
+    category = products[0].category
+
+    response = export(client, type='history', format='csv', category=category)
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+    assert response.mimetype == 'text/csv'
+    assert list(rows[0]) == ['id', 'productId', 'amazonPrice', 'flipkartPrice', 'recordedAt', 'source']
+    assert len(rows) == 2 * sum(product.category == category for product in products)
+    assert {int(row['productId']) for row in rows} == {product.id for product in products if product.category == category}
+
+
+def test_bad_arguments_are_rejected(client, catalog):
+    assert client.get('/api/export', query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/api/export', query_string={'type': 'history', 'from': 'yesterday'}).status_code == 400
+
+
+def test_export_imports_without_the_app():
+    # app imports routes, which imports export: the CLI must not import app at module level.
+    code = 'import sys, export; assert "app" not in sys.modules'
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
@@ -0,0 +1,102 @@
+import csv
+import os
+from collections import Counter
+
+import pytest
+
+from conftest import ROOT, import_feed
+from facets import facet_counts, facet_key, grouped_counts, product_change_deltas
+from import_csv import DEFAULT_CSV
+from models import FacetCount, Product, db
+
+
+def stored_facets():
+    table = FacetCount.__table__
+    rows = db.session.execute(db.select(table.c.category, table.c.brand, table.c.price_bucket, table.c.product_count))
+    return Counter({(category, brand, bucket): count for category, brand, bucket, count in rows})
+
+
+def assert_facets_match_products():
+    assert stored_facets() == grouped_counts(db.session.connection(), db.true())
+
+
+def product_named(name):
+    return db.session.scalar(db.select(Product).where(Product.product_name == name))
+
+
+def test_import_fills_facets(catalog):
+    assert sum(stored_facets().values()) == db.session.scalar(db.select(db.func.count(Product.id)))
+    assert_facets_match_products()
+
+
+def test_orm_writes_apply_deltas(catalog):
+    moved = product_named('iPhone 15')
+    moved.amazon_price = moved.flipkart_price = 500
+    product_named('Samsung Galaxy M05').brand = 'Relabelled'
+    db.session.delete(product_named('Nothing Phone 2a'))
+    db.session.add(Product(
+        category='Audio', product_name='Test Buds', brand='Testbrand',
+        amazon_price=1500, amazon_url='https://www.amazon.in/dp/TEST',
+        flipkart_price=1400, flipkart_url='https://www.flipkart.com/p/test'
+    ))
+    db.session.commit()
+
+    assert stored_facets()[('Audio', 'Testbrand', 1000)] == 1
+    assert_facets_match_products()
+
+
+def test_reimport_applies_deltas_for_changes_and_removals(catalog, tmp_path):
+    with open(os.path.join(ROOT, DEFAULT_CSV), encoding='utf-8', newline='') as fh:
+        rows = list(csv.DictReader(fh))
+    for row in rows[:40]:
+        row['Amazon_Price'] = str(float(row['Amazon_Price'].replace(',', '')) * 3)
+    feed = tmp_path / 'feed.csv'
+    with open(feed, 'w', encoding='utf-8', newline='') as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows[:-20])
+
+    stats = import_feed(str(feed))
+
+    assert stats['updated'] and stats['removed']
+    assert_facets_match_products()
+
+
+def test_facets_endpoint_agrees_with_live_counts(client, catalog):
+    args = {'category': 'Phones', 'min_price': 10000}
+    aggregated = client.get('/api/facets', query_string=args).get_json()
+    # An effective price bound cannot be answered from the aggregates.
+    live = client.get('/api/facets', query_string={**args, 'min_effective_price': 0}).get_json()
+
+    assert aggregated == live
+    brands = {row['value']: row['count'] for row in aggregated['brands']}
+    assert brands == dict(db.session.execute(
+        db.select(Product.brand, db.func.count())
+        .where(Product.category == 'Phones', Product.best_price >= 10000)
+        .group_by(Product.brand)
+    ).all())
+
+
+@pytest.mark.parametrize('bound', ['min_price', 'max_price'])
+def test_price_bounds_on_a_bucket_boundary_include_it(client, catalog, bound):
+    product_named('iPhone 15').amazon_price = 5000
+    db.session.commit()
+    args = {bound: 5000}
+
+    listed = client.get('/api/products', query_string={**args, 'limit': 200, 'fields': 'id'}).get_json()
+    facets = client.get('/api/facets', query_string=args).get_json()
+
+    assert sum(row['count'] for row in facets['categories']) == len(listed)
+    assert (facet_counts(**args) is None) == (bound == 'max_price')
+
+
+def test_product_change_deltas():
+    old = {'category': 'Phones', 'brand': 'Apple', 'amazon_price': 1500, 'flipkart_price': 1200}
+    new = dict(old, flipkart_price=800)
+    gone = dict(old, brand=None, amazon_price=60000)
+
+    deltas = product_change_deltas([(old, old), (old, new), (None, new), (gone, None)])
+
+    assert facet_key(*old.values()) == ('Phones', 'Apple', 1000)
+    assert +deltas == Counter({('Phones', 'Apple', 0): 2})
+    assert -deltas == Counter({('Phones', 'Apple', 1000): 1, ('Phones', '', 1000): 1})
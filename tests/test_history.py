@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from history import compact_history, record_price_history
+from models import PriceHistory, PriceRollup, Product, db
+
+
+def history_response(client, product_id, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(f'/api/products/{product_id}/history', query_string={'points': 1000}, headers=headers)
+
+
+def test_compaction_invalidates_cached_history(client, catalog):
+    product_id = db.session.scalar(db.select(Product.id).order_by(Product.id))
+    now = datetime.utcnow()
+    record_price_history(db.session.connection(), [
+        {'product_id': product_id, 'amazon_price': 1000 + day, 'flipkart_price': 1100, 'recorded_at': now - timedelta(days=day)}
+        for day in range(1, 500, 7)
+    ], source='test')
+    db.session.commit()
+
+    before = history_response(client, product_id)
+    assert before.status_code == 200
+    assert history_response(client, product_id, before.headers['ETag']).status_code == 304
+
+    stats = compact_history(db.session.connection())
+    db.session.commit()
+
+    assert stats['raw'] and stats['hourly']
+    assert db.session.scalar(db.select(db.func.count()).select_from(PriceHistory).where(
+        PriceHistory.recorded_at < now - timedelta(days=90)
+    )) == 0
+    assert db.session.scalar(db.select(db.func.count()).select_from(PriceRollup).where(
+        PriceRollup.resolution == 'day', PriceRollup.product_id == product_id
+    ))
+    after = history_response(client, product_id, before.headers['ETag'])
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
+
+
+def test_compaction_without_deletes_keeps_the_version(client, catalog):
+    product_id = db.session.scalar(db.select(Product.id).order_by(Product.id))
+    etag = history_response(client, product_id).headers['ETag']
+
+    assert compact_history(db.session.connection()) == {'raw': 0, 'hourly': 0}
+    db.session.commit()
+
+    assert history_response(client, product_id, etag).status_code == 304
+
+
+def test_ranges_after_compaction_are_served_from_daily_rollups(client, catalog):
+    product_id = db.session.scalar(db.select(Product.id).order_by(Product.id))
+    now = datetime.utcnow()
+    record_price_history(db.session.connection(), [
+        {'product_id': product_id, 'amazon_price': 1000 + day, 'flipkart_price': 1100, 'recorded_at': now - timedelta(days=day)}
+        for day in range(380, 700, 5)
+    ], source='test')
+    compact_history(db.session.connection())
+    db.session.commit()
+    start = (now - timedelta(days=450)).isoformat()
+
+    body = client.get(f'/api/products/{product_id}/history', query_string={'from': start}).get_json()
+
+    assert not db.session.scalar(db.select(db.func.count()).select_from(PriceRollup).where(
+        PriceRollup.resolution == 'hour', PriceRollup.product_id == product_id
+    ))
+    assert body['resolution'] == 'day'
+    assert len(body['series']['amazon']) == len(range(380, 451, 5))
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from http_cache import HTTPCache, parse_host_ttls
+from scrape_engine import ResourcePool
+from scraper import AmazonScraper, PriceComparisonScraper, shared_http_cache
+
+PAGE = 'https://www.amazon.in/dp/B0TEST'
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeSession:
+    # Answers from a queue of responses and records the headers sent.
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.sent.append(headers or {})
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HTTPCache(path=str(tmp_path / 'http_cache.sqlite'), ttl=900)
+    yield cache
+    cache.close()
+
+
+def page(body, etag='"v1"'):
+    return FakeResponse(200, body, {'ETag': etag, 'Last-Modified': 'Mon, 12 Oct 2026 10:00:00 GMT'})
+
+
+def test_fresh_entry_is_served_without_a_request(cache):
+    session = FakeSession(page(b'<html>one</html>'))
+
+    assert cache.fetch(session, PAGE, 5) == (200, b'<html>one</html>')
+    # Canonical key: the fragment and host case do not matter.
+    assert cache.fetch(session, 'https://WWW.amazon.in/dp/B0TEST#reviews', 5) == (200, b'<html>one</html>')
+    assert len(session.sent) == 1
+    assert cache.snapshot()['hits'] == 1
+
+
+def test_stale_entry_is_revalidated(cache):
+    cache.ttl = 0
+    session = FakeSession(page(b'<html>one</html>'), FakeResponse(304), page(b'<html>two</html>', '"v2"'))
+    cache.fetch(session, PAGE, 5)
+
+    assert cache.fetch(session, PAGE, 5) == (200, b'<html>one</html>')
+    assert session.sent[1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 12 Oct 2026 10:00:00 GMT'}
+    assert cache.fetch(session, PAGE, 5) == (200, b'<html>two</html>')
+    assert cache.lookup(PAGE).etag == '"v2"'
+    assert cache.snapshot()['revalidated'] == 1
+
+
+def test_only_200_responses_are_stored(cache):
+    session = FakeSession(FakeResponse(503, b'busy'), page(b'<html>one</html>'))
+
+    assert cache.fetch(session, PAGE, 5) == (503, None)
+    assert cache.lookup(PAGE) is None
+    assert cache.fetch(session, PAGE, 5) == (200, b'<html>one</html>')
+
+
+def test_discard_forces_a_new_fetch(cache):
+    session = FakeSession(page(b'captcha'), page(b'<html>one</html>'))
+    cache.fetch(session, PAGE, 5)
+    cache.discard(PAGE)
+
+    assert cache.fetch(session, PAGE, 5) == (200, b'<html>one</html>')
+    assert session.sent == [{}, {}]
+
+
+def test_least_recently_used_pages_are_evicted(cache):
+    # Random bytes do not compress, so each page takes about 1 KB.
+    cache.max_bytes = 2500
+    urls = [f'https://www.flipkart.com/p/itm{n}' for n in range(3)]
+    cache.store(urls[0], {}, os.urandom(1000), now=1)
+    cache.store(urls[1], {}, os.urandom(1000), now=2)
+    cache.touch(urls[0])
+    cache.store(urls[2], {}, os.urandom(1000), now=3)
+
+    assert [cache.lookup(url) is not None for url in urls] == [True, False, True]
+    assert cache.snapshot()['evicted'] == 1
+
+
+def test_host_ttls():
+    cache = HTTPCache(ttl=900, host_ttls=parse_host_ttls(' www.Amazon.in=600, www.flipkart.com=1800,'))
+
+    assert cache.host_ttls == {'www.amazon.in': 600, 'www.flipkart.com': 1800}
+    assert cache.host_ttl(PAGE) == 600
+    assert cache.host_ttl('https://example.com/') == 900
+
+
+def test_scrapers_share_the_cache_unless_given_none(cache):
+    session = FakeSession(FakeResponse(200, b'<html></html>'))
+    pool = ResourcePool(lambda: session, size=1)
+
+    with AmazonScraper(session_pool=pool) as scraper:
+        assert scraper.cache is shared_http_cache()
+    with AmazonScraper(session_pool=pool, cache=cache) as scraper:
+        assert scraper.cache is cache
+    with AmazonScraper(session_pool=pool, cache=None) as scraper:
+        assert scraper.cache is None
+        assert scraper.fetch_static(PAGE) is not None
+    with PriceComparisonScraper(cache=None) as scraper:
+        assert scraper.amazon_scraper.cache is None and scraper.flipkart_scraper.cache is None
+
+    assert cache.lookup(PAGE) is None
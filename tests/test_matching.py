@@ -0,0 +1,75 @@
+from matching import CatalogMatcher, block_keys, listing_key
+from models import Product, db
+
+
+def test_listing_key_normalizes_titles():
+    key = listing_key('Samsung Galaxy M05 (Mint Green, 4GB RAM, 64 GB Storage)')
+
+    assert key.brand == 'samsung'
+    assert key.tokens == ('galaxy', 'm05')
+    assert key.sizes == {'4gb', '64gb'}
+    assert key.colours == {'mint', 'green'}
+    assert block_keys(key) == [('samsung', 'm05')]
+
+
+def test_listing_key_falls_back_to_the_given_brand():
+    assert listing_key('Galaxy M05', brand='Samsung').brand == 'samsung'
+    assert listing_key('Redmi 13 5G', brand='Xiaomi').brand == 'redmi'
+
+
+def test_blocks_without_identifiers_use_every_token():
+    key = listing_key('Apple AirPods Pro')
+    assert block_keys(key) == [('apple', 'airpods'), ('apple', 'pro')]
+
+
+def matcher():
+    return CatalogMatcher().add_many([
+        (1, 'Samsung Galaxy M05', 'Samsung'),
+        (2, 'Samsung Galaxy M15 5G', 'Samsung'),
+        (3, 'Redmi 13', 'Redmi'),
+        (4, 'Redmi 13 5G', 'Redmi'),
+        (5, 'Apple iPhone 15 128GB', 'Apple'),
+        (6, 'Apple iPhone 15 256GB', 'Apple'),
+    ])
+
+
+def test_match_picks_the_closest_product():
+    catalog = matcher()
+
+    assert catalog.match('Samsung Galaxy M05 (Mint Green, 64 GB) (4 GB RAM)').product_id == 1
+    assert catalog.match('Redmi 13 5G (Hawaiian Blue, 128 GB)').product_id == 4
+    assert catalog.match('Redmi 13 (Black Diamond, 128 GB)').product_id == 3
+
+
+def test_sizes_and_brands_must_agree():
+    catalog = matcher()
+
+    assert catalog.match('Apple iPhone 15 (256 GB) - Black').product_id == 6
+    assert catalog.match('Apple iPhone 15 (512 GB) - Black') is None
+    assert catalog.match('Realme Galaxy M05') is None
+
+
+def test_titles_without_a_known_brand_search_every_brand():
+    assert matcher().match('Galaxy M15 5G Blue Topaz').product_id == 2
+
+
+def test_oversized_blocks_are_dropped():
+    catalog = CatalogMatcher(max_block_size=2).add_many(
+        [(1, 'Acme Widget Alpha', 'Acme'), (2, 'Acme Widget Beta', 'Acme'), (3, 'Acme Widget Gamma', 'Acme')]
+    )
+    catalog.prepare()
+
+    assert ('acme', 'widget') not in catalog.blocks
+    assert ('acme', 'beta') in catalog.blocks
+    assert catalog.match('Acme Widget Beta').product_id == 2
+
+
+def test_from_connection_indexes_the_catalog(catalog):
+    with db.engine.connect() as connection:
+        catalog_matcher = CatalogMatcher.from_connection(connection, chunk_size=20)
+
+    products = db.session.execute(db.select(Product.id, Product.product_name)).all()
+    assert len(catalog_matcher.product_ids) == len(products)
+    found = catalog_matcher.match('Samsung Galaxy M05 (Mint Green, 4GB RAM, 64 GB Storage)')
+    assert found is not None
+    assert db.session.get(Product, found.product_id).product_name == 'Samsung Galaxy M05'
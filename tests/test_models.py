@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+from models import PRODUCT_DEPENDENTS, PriceHistory, PriceWatch, Product, db, delete_product_dependents
+from snapshots import take_snapshot
+
+
+def dependent_rows(product_id):
+    return {
+        table.name: db.session.scalar(db.select(db.func.count()).select_from(table).where(table.c.product_id == product_id))
+        for table in PRODUCT_DEPENDENTS
+    }
+
+
+def product_with_dependents(name):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == name))
+    db.session.add(PriceHistory(product_id=product.id, amazon_price=product.amazon_price,
+                                flipkart_price=product.flipkart_price, recorded_at=datetime.utcnow()))
+    db.session.add(PriceWatch(product_id=product.id, platform='amazon', drop_percent=5,
+                              reference_price=product.amazon_price, trigger_price=product.amazon_price * 0.95))
+    take_snapshot(db.session.connection())
+    db.session.commit()
+    assert all(dependent_rows(product.id).values())
+    return product
+
+
+@pytest.mark.parametrize('loaded', [False, True])
+def test_orm_delete_removes_dependents(catalog, loaded):
+    product = product_with_dependents('iPhone 15')
+    product_id = product.id
+    if loaded:
+        assert product.price_history
+
+    db.session.delete(product)
+    db.session.commit()
+
+    assert not any(dependent_rows(product_id).values())
+
+
+def test_bulk_delete_removes_dependents(catalog):
+    product_id = product_with_dependents('iPhone 15').id
+
+    delete_product_dependents(db.session.connection(), db.select(Product.id).where(Product.id == product_id))
+    db.session.commit()
+
+    assert not any(dependent_rows(product_id).values())
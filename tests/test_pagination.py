@@ -0,0 +1,62 @@
+import base64
+import json
+
+import pytest
+
+from models import Product, db
+from routes import SORT_KEYS
+
+
+def page_through(client, **args):
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/api/products', query_string={**args, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids.extend(row['id'] for row in response.get_json())
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids, pages
+
+
+def encoded(value):
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+@pytest.mark.parametrize('sort', sorted(SORT_KEYS))
+def test_cursor_pages_return_every_product_once(client, catalog, sort):
+    ids, pages = page_through(client, sort=sort, limit=7, fields='id')
+    single_page = [row['id'] for row in client.get(
+        '/api/products', query_string={'sort': sort, 'limit': 200, 'fields': 'id'}
+    ).get_json()]
+
+    assert pages > 1
+    assert len(ids) == len(set(ids))
+    assert set(ids) == set(db.session.scalars(db.select(Product.id)))
+    assert ids == single_page
+
+
+def test_cursor_pages_respect_filters(client, catalog):
+    ids, _ = page_through(client, sort='best-low', limit=5, fields='id', category='Phones')
+    expected = set(db.session.scalars(db.select(Product.id).where(Product.category == 'Phones')))
+    assert expected and sorted(ids) == sorted(expected)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    encoded('not json'),
+    encoded('{"id": 1}'),
+    encoded('[1]'),
+    encoded('[{"name": "x"}, 1]'),
+])
+def test_malformed_cursor_is_rejected(client, catalog, cursor):
+    response = client.get('/api/products', query_string={'sort': 'name', 'cursor': cursor})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_cursor_from_another_sort_is_rejected(client, catalog):
+    cursor = client.get('/api/products', query_string={'sort': 'brand', 'limit': 5}).headers['X-Next-Cursor']
+    assert len(json.loads(base64.urlsafe_b64decode(cursor))) == 3
+    response = client.get('/api/products', query_string={'sort': 'name', 'cursor': cursor})
+    assert response.status_code == 400
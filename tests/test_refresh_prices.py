@@ -0,0 +1,45 @@
+import asyncio
+
+import refresh_prices
+from models import PriceWatch, Product, db
+
+
+class DiscountScraper:
+    # Every listing comes back 10% cheaper on Amazon. Fetches run on worker
+    # threads, so the prices are read up front.
+    prices = {}
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get_price_comparison(self, amazon_url, flipkart_url):
+        return {'amazon_price': round(self.prices[amazon_url] * 0.9, 2), 'flipkart_price': None}
+
+    def close(self):
+        pass
+
+
+def test_checkpoints_include_the_alerts_of_their_batch(app, catalog, tmp_path, monkeypatch):
+    watched = db.session.execute(db.select(Product.id, Product.amazon_price).order_by(Product.id).limit(3)).all()
+    db.session.add_all(
+        PriceWatch(product_id=product_id, platform='amazon', drop_percent=5, reference_price=price,
+                   trigger_price=round(price * 0.95, 2))
+        for product_id, price in watched
+    )
+    db.session.commit()
+
+    DiscountScraper.prices = dict(db.session.execute(db.select(Product.amazon_url, Product.amazon_price)).all())
+    saved = []
+    save_checkpoint = refresh_prices.save_checkpoint
+
+    def record_checkpoint(path, last_id, totals):
+        saved.append(dict(totals))
+        save_checkpoint(path, last_id, totals)
+
+    monkeypatch.setattr(refresh_prices, 'PriceComparisonScraper', DiscountScraper)
+    monkeypatch.setattr(refresh_prices, 'save_checkpoint', record_checkpoint)
+    totals = asyncio.run(refresh_prices.refresh_prices(str(tmp_path / 'checkpoint.json'), batch_size=50, rate=0))
+
+    assert totals['alerts'] == 3
+    assert saved[0]['alerts'] == 3
+    assert saved[-1] == totals
@@ -0,0 +1,85 @@
+import pytest
+
+from facets import grouped_counts
+from models import FacetCount, Product, db
+from restore_from_attachment import CatalogIndex, apply_restore, plan_restore
+
+
+def restore_row(product_name, amazon_price, flipkart_price, amazon_url='', flipkart_url=''):
+    return {'category': 'Phones', 'product_name': product_name, 'brand': '', 'amazon_price': amazon_price,
+            'amazon_url': amazon_url, 'flipkart_price': flipkart_price, 'flipkart_url': flipkart_url}
+
+
+def test_sync_skips_new_rows_without_both_prices(catalog):
+    kept = db.session.scalar(db.select(Product).where(Product.product_name == 'iPhone 15'))
+    rows = [
+        restore_row('iPhone 15', kept.amazon_price - 1000, None, kept.amazon_url, kept.flipkart_url),
+        restore_row('Pixelphone 9', 51999, 52999, 'https://www.amazon.in/dp/PIXEL9', 'https://www.flipkart.com/p/pixel9'),
+        restore_row('Halfphone 1', 9999, None, 'https://www.amazon.in/dp/HALF1', 'https://www.flipkart.com/p/half1'),
+    ]
+
+    plan = plan_restore(rows, CatalogIndex(db.session.connection()), sync=True)
+    assert plan['incomplete'] == 1
+    assert [row['product_name'] for _, row in plan['creates']] == ['Pixelphone 9']
+
+    stats = apply_restore(plan)
+    db.session.commit()
+
+    assert (stats['updated'], stats['created']) == (1, 1)
+    names = set(db.session.scalars(db.select(Product.product_name)))
+    assert names == {'iPhone 15', 'Pixelphone 9'}
+    assert db.session.scalar(db.select(db.func.min(Product.best_price))) > 0
+    table = FacetCount.__table__
+    assert sum(db.session.scalars(db.select(table.c.product_count))) == 2
+    assert sum(grouped_counts(db.session.connection(), db.true()).values()) == 2
+
+
+def test_updates_keep_prices_missing_from_the_row(catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'iPhone 15'))
+    flipkart_price = product.flipkart_price
+
+    plan = plan_restore(
+        [restore_row('iPhone 15', 55555, None, product.amazon_url, product.flipkart_url)],
+        CatalogIndex(db.session.connection())
+    )
+    apply_restore(plan)
+    db.session.commit()
+    db.session.refresh(product)
+
+    assert (product.amazon_price, product.flipkart_price) == (55555, flipkart_price)
+
+
+def resolve(row):
+    return CatalogIndex(db.session.connection()).resolve_all([row])[0]
+
+
+def test_listing_urls_are_tried_before_either_url(catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'Samsung Galaxy M05'))
+    variant = Product(category='Phones', product_name='Samsung Galaxy M05 128GB', brand='Samsung',
+                      amazon_price=8999, amazon_url=product.amazon_url,
+                      flipkart_price=9499, flipkart_url='https://www.flipkart.com/samsung-m05-128-gb/p/itm128')
+    db.session.add(variant)
+    db.session.commit()
+
+    assert resolve(restore_row('', None, None, variant.amazon_url, variant.flipkart_url)) == (variant.id, 'listing')
+    assert resolve(restore_row('', None, None, variant.amazon_url)) == (product.id, 'amazon_url')
+
+
+@pytest.mark.parametrize('amazon_url, flipkart_url, product_name, expected', [
+    ('{amazon_url}', 'https://www.flipkart.com/p/elsewhere', '', 'amazon_url'),
+    ('https://WWW.AMAZON.IN/dp/elsewhere', '{flipkart_url}#reviews', '', 'flipkart_url'),
+    ('https://www.amazon.in/dp/elsewhere', '', '  samsung GALAXY m05 ', 'name'),
+    ('', '', 'Galaxy M05 (Mint Green, 4GB RAM, 64 GB Storage)', 'matcher'),
+])
+def test_rows_resolve_by_each_lookup(catalog, amazon_url, flipkart_url, product_name, expected):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'Samsung Galaxy M05'))
+    urls = {'amazon_url': product.amazon_url, 'flipkart_url': product.flipkart_url}
+
+    row = restore_row(product_name, None, None, amazon_url.format(**urls), flipkart_url.format(**urls))
+
+    assert resolve(row) == (product.id, expected)
+
+
+def test_names_of_another_brand_are_not_matched(catalog):
+    assert resolve(restore_row('Redmi Galaxy M05', None, None)) == (None, None)
+    assert resolve(restore_row('Totally Unknown Gadget', None, None)) == (None, None)
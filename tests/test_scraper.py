@@ -0,0 +1,34 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from scraper import AmazonScraper, FlipkartScraper, parse_price
+
+
+@pytest.mark.parametrize('text, price', [
+    ('₹1,299.50', 1299.5),
+    ('₹6,249.', 6249.0),
+    ('Rs. 15,999', 15999.0),
+    ('MRP: ₹ 799.99 (incl. taxes)', 799.99),
+    ('', None),
+    ('Currently unavailable', None),
+])
+def test_parse_price_keeps_paise(text, price):
+    assert parse_price(text) == price
+
+
+def test_search_results_keep_decimal_prices():
+    amazon = BeautifulSoup("""
+        <div data-component-type="s-search-result">
+          <h2><a href="/dp/B01"><span>Boat Airdopes 141</span></a></h2>
+          <span class="a-price"><span class="a-offscreen">₹1,099.50</span></span>
+        </div>""", 'html.parser')
+    flipkart = BeautifulSoup("""
+        <div class="_1AtVbE">
+          <a class="_1fQZEK" href="/p/itm1"><div class="_4rR01T">Boat Airdopes 141</div></a>
+          <div class="_30jeq3">₹1,049.90</div>
+        </div>""", 'html.parser')
+
+    with AmazonScraper(cache=None) as scraper:
+        assert scraper.parse_search_results(amazon, 5)[0]['price'] == 1099.5
+    with FlipkartScraper(cache=None) as scraper:
+        assert scraper.parse_search_results(flipkart, 5)[0]['price'] == 1049.9
@@ -0,0 +1,59 @@
+from models import Product, db
+from search_index import build_match_query, rebuild_search_index
+
+
+def listing_names(client, term):
+    response = client.get('/api/products', query_string={'search': term, 'fields': 'productName', 'limit': 200})
+    assert response.status_code == 200
+    return [row['productName'] for row in response.get_json()]
+
+
+def search_names(client, term):
+    response = client.get('/api/search', query_string={'q': term})
+    assert response.status_code == 200
+    return [row['productName'] for row in response.get_json()]
+
+
+def test_match_query_quotes_every_token_as_a_prefix():
+    assert build_match_query('Sams "gal* OR') == '{product_name brand} : ("sams"* "gal"* "or"*)'
+    assert build_match_query('iphone', ('product_name',)) == '{product_name} : ("iphone"*)'
+    assert build_match_query('  -- ') is None
+
+
+def test_word_prefixes_match_every_token(client, catalog):
+    names = listing_names(client, 'sams gal')
+    assert names and all('Samsung Galaxy' in name for name in names)
+    assert search_names(client, 'sams gal')[0].startswith('Samsung Galaxy')
+
+
+def test_prefix_matches_do_not_reach_inside_words(client, catalog):
+    names = listing_names(client, 'phone')
+    assert 'Nothing Phone 2a' in names
+    assert 'iPhone 15' not in names
+
+
+def test_substring_fallback_when_no_word_matches(client, catalog):
+    expected = set(db.session.scalars(db.select(Product.product_name).where(Product.product_name.ilike('%alaxy%'))))
+    assert expected
+    assert set(listing_names(client, 'alaxy')) == expected
+    assert set(search_names(client, 'alaxy')) <= expected
+
+
+def test_listing_matches_names_and_search_matches_brands(client, catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'iPhone 15'))
+    product.brand = 'Quokkatronic'
+    db.session.commit()
+
+    assert listing_names(client, 'quokkatron') == []
+    assert search_names(client, 'quokkatron') == ['iPhone 15']
+
+
+def test_index_follows_renames_and_rebuilds(client, catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'iPhone 15'))
+    product.product_name = 'Pixelated Widget'
+    db.session.commit()
+    assert listing_names(client, 'pixel widg') == ['Pixelated Widget']
+    assert listing_names(client, 'iphone') == []
+
+    assert rebuild_search_index(db.engine)
+    assert search_names(client, 'pixelated') == ['Pixelated Widget']
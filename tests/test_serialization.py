@@ -0,0 +1,55 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+import serialization
+from models import Product, db
+from serialization import json_array_response, rows_to_dicts
+
+ROWS = [
+    {'name': 'Redmi Note 13 – 5G', 'price': 1299.5, 'updatedAt': datetime(2026, 10, 17, 5, 30, 1), 'on': date(2026, 10, 1)},
+    {'name': None, 'price': 0, 'updatedAt': None, 'on': None},
+]
+
+
+@pytest.mark.parametrize('encoder', ['orjson', 'stdlib'])
+def test_json_array_response_encodes_rows(app, monkeypatch, encoder):
+    if encoder == 'stdlib':
+        monkeypatch.setattr(serialization, 'orjson', None)
+    elif serialization.orjson is None:
+        pytest.skip('orjson is not installed')
+
+    response = json_array_response(ROWS, headers={'X-Total-Count': '2'})
+
+    assert response.mimetype == 'application/json'
+    assert response.headers['X-Total-Count'] == '2'
+    assert json.loads(response.get_data()) == [
+        {'name': 'Redmi Note 13 – 5G', 'price': 1299.5, 'updatedAt': '2026-10-17T05:30:01', 'on': '2026-10-01'},
+        {'name': None, 'price': 0, 'updatedAt': None, 'on': None},
+    ]
+    assert json_array_response([]).get_data() == b'[]'
+
+
+def test_rows_to_dicts_drops_trailing_sort_keys():
+    assert rows_to_dicts(['id', 'name'], [(1, 'a', 'sort-key'), (2, 'b', 'sort-key')]) == [
+        {'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}
+    ]
+
+
+def test_listing_serializes_the_selected_fields(client, catalog):
+    product = db.session.scalar(db.select(Product).where(Product.product_name == 'iPhone 15'))
+
+    rows = client.get('/api/products', query_string={'search': 'iPhone 15', 'fields': 'productName,updatedAt'}).get_json()
+
+    assert rows == [{'id': product.id, 'productName': 'iPhone 15', 'updatedAt': product.updated_at.isoformat()}]
+
+
+def test_compare_computes_the_price_difference(client, catalog):
+    products = db.session.scalars(db.select(Product).order_by(Product.id).limit(2)).all()
+
+    rows = client.post('/api/compare', json={'productIds': [product.id for product in products]}).get_json()
+
+    assert {row['id']: row['priceDifference'] for row in rows} == {
+        product.id: abs(product.amazon_price - product.flipkart_price) for product in products
+    }
@@ -0,0 +1,95 @@
+from collections import Counter
+
+from deals import recompute_deals
+from facets import grouped_counts
+from models import DealScore, FacetCount, Product, db
+from snapshots import SNAPSHOT_COLUMNS, find_snapshot, rollback_diff, rollback_to, take_snapshot
+
+EDITED = ('iPhone 15', 'Samsung Galaxy M05', 'Nothing Phone 2a')
+
+
+def product_named(name):
+    return db.session.scalar(db.select(Product).where(Product.product_name == name))
+
+
+def price_states():
+    products = Product.__table__
+    rows = db.session.execute(db.select(products.c.id, *[products.c[name] for name in SNAPSHOT_COLUMNS]))
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def take(name):
+    take_snapshot(db.session.connection(), name)
+    db.session.commit()
+
+
+def rollback(name, product_ids=None):
+    connection = db.session.connection()
+    stats = rollback_to(connection, find_snapshot(connection, name), product_ids)
+    db.session.commit()
+    return stats
+
+
+def edit_prices():
+    # One product changes before a later snapshot and again after it; the
+    # others only after the latest snapshot.
+    phone = product_named(EDITED[0])
+    phone.amazon_price = phone.flipkart_price = 500
+    db.session.commit()
+    take('mid-sale')
+
+    phone.flipkart_price = 99000
+    budget = product_named(EDITED[1])
+    budget.amazon_price *= 4
+    budget.flipkart_coupon = '₹1,000 off'
+    product_named(EDITED[2]).amazon_coupon = '10% off on SBI CC (up to ₹1000)'
+    db.session.commit()
+
+
+def deal_rows():
+    table = DealScore.__table__
+    columns = [column for column in table.c if column.name != 'computed_at']
+    return db.session.execute(db.select(*columns).order_by(table.c.product_id)).all()
+
+
+def test_rollback_restores_snapshot_prices(catalog):
+    before = price_states()
+    take('before-sale')
+    edit_prices()
+
+    connection = db.session.connection()
+    count, _ = rollback_diff(connection, find_snapshot(connection, 'before-sale').id)
+    stats = rollback('before-sale')
+
+    assert count == stats['restored'] == len(EDITED)
+    assert price_states() == before
+
+    rollback(stats['undo_snapshot'])
+    edited = {product_named(name).id for name in EDITED}
+    assert {product_id for product_id, state in price_states().items() if state != before[product_id]} == edited
+
+
+def test_rollback_of_some_products(catalog):
+    before = price_states()
+    take('before-sale')
+    edit_prices()
+    phone = product_named(EDITED[0]).id
+
+    assert rollback('before-sale', [phone])['restored'] == 1
+    assert price_states()[phone] == before[phone]
+    assert product_named(EDITED[1]).flipkart_coupon == '₹1,000 off'
+
+
+def test_rollback_keeps_facets_and_deals_consistent(catalog):
+    take('before-sale')
+    edit_prices()
+    rollback('before-sale')
+
+    table = FacetCount.__table__
+    facets = db.session.execute(db.select(table.c.category, table.c.brand, table.c.price_bucket, table.c.product_count))
+    assert Counter({(category, brand, bucket): count for category, brand, bucket, count in facets}) == \
+        grouped_counts(db.session.connection(), db.true())
+
+    scored = deal_rows()
+    recompute_deals(db.session.connection())
+    assert scored and scored == deal_rows()
@@ -0,0 +1,10 @@
+"""Production entry point.
+
+  PRICEPULSE_ENV=production gunicorn --workers 4 --threads 8 wsgi:app
+
+Settings come from the environment (see config.py): pool sizes, SQLite
+pragmas and an optional READ_REPLICA_URL for API reads.
+"""
+from app import create_app
+
+app = create_app()